@@ -0,0 +1,70 @@
+"""
+Embedding batcher throughput benchmark.
+
+`--texts` chunks of the HTML fixtures are embedded by as many concurrent
+callers, one text each, through an EmbeddingBatcher with `max_batch` set to
+each batch size in turn, the way concurrent searches share the model in the
+server. Batch size 1 is one forward pass per text. For reference the same texts
+are also embedded by calling the model directly in slices of the batch size, so
+the difference is what queueing and dispatch cost.
+
+    python python-backend/benchmarks/embedding_batcher.py
+    python python-backend/benchmarks/embedding_batcher.py --batch-sizes 1,8,32,128 --texts 512 --threads 4
+    python python-backend/benchmarks/embedding_batcher.py --embeddings hash   # no model download, measures only the batcher
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.retrieval import HashEmbeddings, load_chunks
+from utils.embedding_batcher import EMBEDDING_MAX_WAIT, EMBEDDING_THREADS, EmbeddingBatcher
+
+
+async def run_batcher(embed_fn, texts: list[str], batch_size: int, max_wait: float, threads: int) -> dict:
+    batcher = EmbeddingBatcher(embed_fn, max_batch=batch_size, max_wait=max_wait, threads=threads)
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(batcher.embed([text]) for text in texts))
+        elapsed = time.perf_counter() - started
+        return {"texts_per_second": len(texts) / elapsed, "mean_batch_size": batcher.stats()["mean_batch_size"]}
+    finally:
+        await batcher.stop()
+
+
+def run_direct(embed_fn, texts: list[str], batch_size: int) -> float:
+    started = time.perf_counter()
+    for start in range(0, len(texts), batch_size):
+        embed_fn(texts[start:start + batch_size])
+    return len(texts) / (time.perf_counter() - started)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Measure embedding batcher texts/s per batch size.")
+    parser.add_argument("--embeddings", choices=["e5", "hash"], default="e5")
+    parser.add_argument("--texts", type=int, default=512, help="texts embedded per batch size")
+    parser.add_argument("--batch-sizes", default="1,8,32,128")
+    parser.add_argument("--max-wait-ms", type=float, default=EMBEDDING_MAX_WAIT * 1000)
+    parser.add_argument("--threads", type=int, default=EMBEDDING_THREADS, help="torch threads, 0 keeps the torch default")
+    args = parser.parse_args()
+
+    from utils.C4AI_web_search import get_embedding_model, split_documents
+
+    embed_fn = get_embedding_model().embed_documents if args.embeddings == "e5" else HashEmbeddings().embed_documents
+    chunks = [chunk.page_content for chunk in load_chunks(split_documents)]
+    texts = [chunks[i % len(chunks)] for i in range(args.texts)]
+    # The first forward pass pays for lazy initialisation inside the model
+    embed_fn(texts[:8])
+
+    print(f"{'batch':>6}{'batcher texts/s':>18}{'mean batch':>12}{'direct texts/s':>18}")
+    for batch_size in [int(size) for size in args.batch_sizes.split(",")]:
+        batched = await run_batcher(embed_fn, texts, batch_size, args.max_wait_ms / 1000, args.threads)
+        direct = run_direct(embed_fn, texts, batch_size)
+        print(f"{batch_size:>6}{batched['texts_per_second']:>18.1f}{batched['mean_batch_size']:>12.1f}{direct:>18.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
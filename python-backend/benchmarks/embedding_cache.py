@@ -0,0 +1,111 @@
+"""
+Embedding cache throughput and event loop stall benchmark.
+
+The cache is filled with `--entries` random vectors first, so the index it
+saves every EMBEDDING_CACHE_SAVE_EVERY inserts is as large as in a long-running
+server. Then, for each batch size, `--texts` texts are looked up cold (all
+misses, the embedding model is a stand-in that answers at once, so only the
+cache's own cost is measured) and warm (all hits), reporting texts/s. A ticker
+task on the event loop records the longest stall while a lookup waits for the
+cache lock held by an insert in a worker thread.
+
+    python python-backend/benchmarks/embedding_cache.py
+    python python-backend/benchmarks/embedding_cache.py --entries 50000 --texts 4096 --batch-sizes 1,8,32,128
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from utils.embedding_cache import EmbeddingCache
+
+TICK_INTERVAL = 0.001
+
+
+class StallMonitor:
+    """Longest time the event loop failed to run a 1 ms ticker"""
+
+    def __init__(self):
+        self.longest = 0.0
+        self._task: asyncio.Task | None = None
+
+    async def _tick(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + TICK_INTERVAL
+            await asyncio.sleep(TICK_INTERVAL)
+            self.longest = max(self.longest, loop.time() - expected)
+
+    def __enter__(self):
+        self._task = asyncio.create_task(self._tick())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+
+def fake_embed_fn(dim: int, seed: int):
+    rng = np.random.default_rng(seed)
+
+    async def embed(texts: list[str]) -> list[list[float]]:
+        return rng.standard_normal((len(texts), dim), dtype=np.float32).tolist()
+    return embed
+
+
+async def fill(cache: EmbeddingCache, entries: int, dim: int):
+    embed = fake_embed_fn(dim, seed=1)
+    for start in range(0, entries, 1024):
+        await cache.embed_documents([f"filler {i}" for i in range(start, min(entries, start + 1024))], embed)
+
+
+async def run_batches(cache: EmbeddingCache, texts: list[str], batch_size: int, dim: int) -> tuple[float, float]:
+    """texts/s and the longest event loop stall, with lookups from concurrent requests"""
+    embed = fake_embed_fn(dim, seed=batch_size)
+    batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+    # Several searches embed at once in the server, interleave a few streams of batches
+    streams = [batches[i::4] for i in range(4)]
+
+    async def stream(batches: list[list[str]]):
+        for batch in batches:
+            await cache.embed_documents(batch, embed)
+
+    with StallMonitor() as monitor:
+        started = time.perf_counter()
+        await asyncio.gather(*(stream(batches) for batches in streams))
+        elapsed = time.perf_counter() - started
+    return len(texts) / elapsed, monitor.longest
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Measure embedding cache texts/s and event loop stalls.")
+    parser.add_argument("--entries", type=int, default=50000, help="vectors in the cache before measuring")
+    parser.add_argument("--texts", type=int, default=4096, help="texts looked up per batch size and phase")
+    parser.add_argument("--batch-sizes", default="1,8,32,128")
+    parser.add_argument("--dim", type=int, default=384)
+    args = parser.parse_args()
+
+    # Log lines per lookup would dominate the small batches
+    sys.stderr = open(os.devnull, "w")
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = EmbeddingCache("benchmark-model", directory=directory, max_entries=args.entries + 4 * args.texts)
+        started = time.perf_counter()
+        await fill(cache, args.entries, args.dim)
+        print(f"Filled {args.entries} entries in {time.perf_counter() - started:.1f}s")
+
+        print(f"{'batch':>6}{'cold texts/s':>16}{'cold stall ms':>16}{'warm texts/s':>16}{'warm stall ms':>16}")
+        for batch_size in [int(size) for size in args.batch_sizes.split(",")]:
+            texts = [f"batch {batch_size} text {i}" for i in range(args.texts)]
+            cold, cold_stall = await run_batches(cache, texts, batch_size, args.dim)
+            warm, warm_stall = await run_batches(cache, texts, batch_size, args.dim)
+            print(f"{batch_size:>6}{cold:>16.0f}{cold_stall * 1000:>16.1f}{warm:>16.0f}{warm_stall * 1000:>16.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
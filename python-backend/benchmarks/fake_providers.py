@@ -0,0 +1,287 @@
+"""
+Local stand-ins for the streaming provider APIs, used by the benchmarks.
+
+One server answers in the wire formats of
+  - OpenAI-compatible chat completions (OpenRouter, Groq):  POST /v1/chat/completions, /openai/v1/chat/completions
+  - Ollama:                                                  POST /api/chat, /api/generate, GET /api/ps, /api/tags
+  - Gemini:                                                  POST /v1beta/models/{model}:streamGenerateContent
+and serves the HTML pages in benchmarks/fixtures/ under /fixtures/ for web search runs.
+
+    python python-backend/benchmarks/fake_providers.py --port 9100 --tokens-per-second 50 --first-token-latency 0.2
+
+With --prompt-tokens-per-second the first token also waits for the prompt to be
+"processed" at that rate, like a local model prefilling on CPU, so longer
+prompts show up as a later first token.
+
+The Ollama stand-in keeps models "loaded" like the real server: a request for a
+model that is not resident waits --ollama-load-latency seconds, models stay for
+their keep_alive, and with --ollama-memory-gb the least recently used ones are
+dropped to fit. GET /fake/ollama/stats counts the loads and unloads.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import re
+import time
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+WORDS = ("the quick brown fox jumps over the lazy dog while streaming tokens arrive at a steady "
+         "rate so that the backend can be measured end to end").split()
+
+
+class StreamSettings:
+    def __init__(self, tokens_per_second: float = 50.0, first_token_latency: float = 0.2, tokens: int = 200,
+                 prompt_tokens_per_second: float = 0.0):
+        self.tokens_per_second = tokens_per_second
+        self.first_token_latency = first_token_latency
+        self.tokens = tokens
+        # 0 makes the first token latency independent of the prompt
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+
+
+settings = StreamSettings()
+
+DURATION_PATTERN = re.compile(r"(-?\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def keep_alive_seconds(value) -> float:
+    """Ollama keep_alive (seconds or a duration like "5m", negative for ever) in seconds"""
+    if value is None:
+        return 300.0
+    if isinstance(value, str):
+        match = DURATION_PATTERN.fullmatch(value.strip())
+        if not match:
+            raise ValueError(f"invalid keep_alive: {value!r}")
+        value = float(match.group(1)) * DURATION_UNITS[match.group(2)]
+    return math.inf if value < 0 else float(value)
+
+
+class FakeOllama:
+    """Which models the fake Ollama server holds in memory, loaded on demand and expired by keep_alive"""
+
+    def __init__(self, models: dict[str, int], memory: int = 0, load_latency: float = 1.0):
+        self.models = models
+        self.memory = memory
+        self.load_latency = load_latency
+        # name -> [size, expires at (monotonic), last used]
+        self.resident: dict[str, list] = {}
+        self.loads = 0
+        self.unloads = 0
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def key(model: str) -> str:
+        return model if ":" in model else f"{model}:latest"
+
+    def size(self, model: str) -> int:
+        return self.models.get(self.key(model), 2 * 2**30)
+
+    def expire(self):
+        now = time.monotonic()
+        for name in [name for name, (_size, expires_at, _used) in self.resident.items() if expires_at <= now]:
+            del self.resident[name]
+            self.unloads += 1
+
+    async def use(self, model: str, keep_alive):
+        """Load `model` if needed (at most one load at a time, like a single GPU) and renew its keep_alive"""
+        name = self.key(model)
+        seconds = keep_alive_seconds(keep_alive)
+        async with self._lock:
+            self.expire()
+            if seconds == 0:
+                if self.resident.pop(name, None) is not None:
+                    self.unloads += 1
+                return
+            if name not in self.resident:
+                while self.memory and self.resident and sum(entry[0] for entry in self.resident.values()) + self.size(name) > self.memory:
+                    del self.resident[min(self.resident, key=lambda other: self.resident[other][2])]
+                    self.unloads += 1
+                await asyncio.sleep(self.load_latency)
+                self.loads += 1
+            now = time.monotonic()
+            self.resident[name] = [self.size(name), now + seconds, now]
+
+    def ps(self) -> list[dict]:
+        self.expire()
+        wall_offset = time.time() - time.monotonic()
+        return [
+            {
+                "name": name,
+                "model": name,
+                "size": size,
+                "size_vram": 0,
+                "expires_at": (time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(expires_at + wall_offset))
+                               if expires_at != math.inf else "2318-01-01T00:00:00Z"),
+            }
+            for name, (size, expires_at, _used) in self.resident.items()
+        ]
+
+
+fake_ollama = FakeOllama({"fake-ollama-model:latest": 2 * 2**30})
+
+
+def prompt_tokens(body: dict) -> int:
+    """Rough token count (4 characters each) of the message texts in an OpenAI, Ollama or Gemini request"""
+    characters = sum(len(message.get("content") or "") for message in body.get("messages", []))
+    characters += sum(len(part.get("text", "")) for content in body.get("contents", []) for part in content.get("parts", []))
+    return characters // 4
+
+
+async def generate_tokens(body: dict):
+    """Yield `settings.tokens` words after the first token latency, at the configured rate"""
+    prefill = prompt_tokens(body) / settings.prompt_tokens_per_second if settings.prompt_tokens_per_second > 0 else 0.0
+    await asyncio.sleep(settings.first_token_latency + prefill)
+    interval = 1.0 / settings.tokens_per_second if settings.tokens_per_second > 0 else 0.0
+    next_at = time.perf_counter()
+    for i in range(settings.tokens):
+        yield WORDS[i % len(WORDS)] + " "
+        next_at += interval
+        # Sleep to an absolute schedule so timer slack does not lower the rate
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def openai_chat(request: Request):
+    body = await request.json()
+    model = body.get("model", "fake")
+
+    def chunk(delta: dict, finish_reason=None) -> str:
+        data = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(data)}\n\n"
+
+    async def events():
+        async for token in generate_tokens(body):
+            yield chunk({"role": "assistant", "content": token})
+        yield chunk({}, "stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+async def ollama_chat(request: Request):
+    body = await request.json()
+    model = body.get("model", "fake")
+    created_at = "2025-01-01T00:00:00Z"
+
+    async def lines():
+        await fake_ollama.use(model, body.get("keep_alive"))
+        async for token in generate_tokens(body):
+            yield json.dumps({"model": model, "created_at": created_at,
+                              "message": {"role": "assistant", "content": token}, "done": False}) + "\n"
+        yield json.dumps({"model": model, "created_at": created_at, "message": {"role": "assistant", "content": ""},
+                          "done": True, "done_reason": "stop", "eval_count": settings.tokens}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+async def ollama_generate(request: Request):
+    # Only the load / unload form (no prompt) is used by the backend
+    body = await request.json()
+    model = body.get("model", "fake")
+    await fake_ollama.use(model, body.get("keep_alive"))
+    done_reason = "unload" if keep_alive_seconds(body.get("keep_alive")) == 0 else "load"
+    return JSONResponse({"model": model, "created_at": "2025-01-01T00:00:00Z", "response": "", "done": True,
+                         "done_reason": done_reason})
+
+
+async def ollama_ps(request: Request):
+    return JSONResponse({"models": fake_ollama.ps()})
+
+
+async def ollama_tags(request: Request):
+    return JSONResponse({"models": [{"name": name, "model": name, "size": size} for name, size in fake_ollama.models.items()]})
+
+
+async def fake_ollama_stats(request: Request):
+    return JSONResponse({"loads": fake_ollama.loads, "unloads": fake_ollama.unloads, "resident": list(fake_ollama.resident)})
+
+
+async def gemini_stream(request: Request):
+    body = await request.json()
+    model = request.path_params["model"]
+
+    def chunk(text: str, finish_reason=None) -> str:
+        candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+        if finish_reason:
+            candidate["finishReason"] = finish_reason
+        return f"data: {json.dumps({'candidates': [candidate], 'modelVersion': model})}\r\n\r\n"
+
+    async def events():
+        async for token in generate_tokens(body):
+            yield chunk(token)
+        yield chunk("", "STOP")
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+async def fixture(request: Request):
+    path = os.path.join(FIXTURES_DIR, os.path.basename(request.path_params["name"]))
+    if not os.path.isfile(path):
+        return PlainTextResponse("Not found", status_code=404)
+    return FileResponse(path, media_type="text/html")
+
+
+def fixture_names() -> list[str]:
+    return sorted(name for name in os.listdir(FIXTURES_DIR) if name.endswith(".html"))
+
+
+app = Starlette(routes=[
+    Route("/v1/chat/completions", openai_chat, methods=["POST"]),
+    Route("/openai/v1/chat/completions", openai_chat, methods=["POST"]),
+    Route("/api/chat", ollama_chat, methods=["POST"]),
+    Route("/api/generate", ollama_generate, methods=["POST"]),
+    Route("/api/ps", ollama_ps),
+    Route("/api/tags", ollama_tags),
+    Route("/fake/ollama/stats", fake_ollama_stats),
+    Route("/v1beta/models/{model}:streamGenerateContent", gemini_stream, methods=["POST"]),
+    Route("/fixtures/{name}", fixture),
+])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake streaming LLM providers for benchmarking.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--tokens-per-second", type=float, default=settings.tokens_per_second)
+    parser.add_argument("--first-token-latency", type=float, default=settings.first_token_latency, help="seconds")
+    parser.add_argument("--tokens", type=int, default=settings.tokens, help="tokens per answer")
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=settings.prompt_tokens_per_second,
+                        help="prompt processing rate added to the first token latency, 0 to disable")
+    parser.add_argument("--ollama-models", default="fake-ollama-model=2",
+                        help="installed Ollama models and their sizes in GB, e.g. small=1,medium=2,large=4")
+    parser.add_argument("--ollama-memory-gb", type=float, default=0.0, help="memory the fake Ollama fits models in, 0 for unlimited")
+    parser.add_argument("--ollama-load-latency", type=float, default=0.0, help="seconds to load a model that is not resident")
+    args = parser.parse_args()
+
+    settings.tokens_per_second = args.tokens_per_second
+    settings.first_token_latency = args.first_token_latency
+    settings.tokens = args.tokens
+    settings.prompt_tokens_per_second = args.prompt_tokens_per_second
+    fake_ollama.models = {
+        FakeOllama.key(name.strip()): int(float(size) * 2**30)
+        for name, _, size in (item.partition("=") for item in args.ollama_models.split(",") if item.strip())
+    }
+    fake_ollama.memory = int(args.ollama_memory_gb * 2**30)
+    fake_ollama.load_latency = args.ollama_load_latency
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
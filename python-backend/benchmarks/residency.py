@@ -0,0 +1,127 @@
+"""
+Ollama residency benchmark against the fake Ollama server.
+
+Starts fake_providers.py with a few installed models of given sizes, a load
+latency and a memory limit, starts the backend with the residency settings, and
+sends Ollama chats for a sequence of models one after the other. Reports the
+time to first token of every request (cold ones pay the load), the loads and
+unloads the fake server saw, and /api/ollama/residency at the end. Exits non-zero
+if the loaded models ever exceed the backend's memory budget.
+
+    python python-backend/benchmarks/residency.py
+    python python-backend/benchmarks/residency.py --budget-gb 0 --keep-alive 5s --gap 6   # unmanaged, models expire between requests
+    python python-backend/benchmarks/residency.py --preload small,medium --sequence small,medium,small,large,small
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from benchmarks.run import BENCHMARKS_DIR, wait_ready
+
+
+async def first_token(client: httpx.AsyncClient, model: str) -> float:
+    payload = {
+        "conversation": [{"role": "user", "content": "Say something."}],
+        "model": {"name": model, "provider": "ollama", "key": ""},
+    }
+    started = time.perf_counter()
+    async with client.stream("POST", "/api/chat", json=payload) as response:
+        response.raise_for_status()
+        ttft = None
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            data = json.loads(line[len("data: "):])
+            if "error" in data:
+                raise RuntimeError(data["error"])
+            if data.get("content") and ttft is None:
+                ttft = time.perf_counter() - started
+    if ttft is None:
+        raise RuntimeError("no tokens")
+    return ttft
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Measure Ollama model residency against the fake Ollama server.")
+    parser.add_argument("--models", default="small=1,medium=2,large=3", help="installed models and sizes in GB")
+    parser.add_argument("--sequence", default="small,medium,small,large,small,medium,small,large", help="models to chat with, in order")
+    parser.add_argument("--ollama-memory-gb", type=float, default=8.0, help="memory of the fake Ollama server")
+    parser.add_argument("--budget-gb", type=float, default=4.0, help="OLLAMA_MEMORY_BUDGET_GB of the backend, 0 for none")
+    parser.add_argument("--keep-alive", default="30m", help="OLLAMA_KEEP_ALIVE of the backend")
+    parser.add_argument("--preload", default="", help="OLLAMA_PRELOAD_MODELS of the backend")
+    parser.add_argument("--load-latency", type=float, default=1.0, help="seconds the fake server takes to load a model")
+    parser.add_argument("--gap", type=float, default=0.0, help="seconds between requests")
+    parser.add_argument("--fake-port", type=int, default=9100)
+    parser.add_argument("--server-port", type=int, default=8100)
+    args = parser.parse_args()
+
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    server_url = f"http://127.0.0.1:{args.server_port}"
+    env = {
+        **os.environ,
+        "OLLAMA_HOST": fake_url,
+        "RESPONSE_CACHE_TTL": "0",
+        "OLLAMA_MEMORY_BUDGET_GB": str(args.budget_gb),
+        "OLLAMA_KEEP_ALIVE": args.keep_alive,
+        "OLLAMA_PRELOAD_MODELS": args.preload,
+    }
+    fake_cmd = [sys.executable, os.path.join(BENCHMARKS_DIR, "fake_providers.py"), "--port", str(args.fake_port),
+                "--first-token-latency", "0.05", "--tokens", "5", "--tokens-per-second", "0",
+                "--ollama-models", args.models, "--ollama-memory-gb", str(args.ollama_memory_gb),
+                "--ollama-load-latency", str(args.load_latency)]
+    server_cmd = [sys.executable, os.path.join(BENCHMARKS_DIR, "serve.py"), "--port", str(args.server_port)]
+
+    fake = subprocess.Popen(fake_cmd, env=env)
+    backend = subprocess.Popen(server_cmd, env=env)
+    over_budget = []
+    try:
+        await wait_ready(f"{fake_url}/api/ps", fake)
+        await wait_ready(f"{server_url}/api/stats", backend)
+
+        async with httpx.AsyncClient(timeout=None) as client, httpx.AsyncClient(base_url=server_url, timeout=None) as backend_client:
+            preload = [model for model in args.preload.split(",") if model]
+            while preload:
+                # Preloading runs in the background after startup
+                resident = (await client.get(f"{fake_url}/fake/ollama/stats")).json()["resident"]
+                if all(f"{model}:latest" in resident for model in preload):
+                    break
+                await asyncio.sleep(0.2)
+
+            print(f"{'#':>3}  {'model':<12}{'ttft s':>8}  resident after")
+            budget = args.budget_gb * 2**30
+            for i, model in enumerate(model for model in args.sequence.split(",") if model):
+                ttft = await first_token(backend_client, model)
+                ps = (await client.get(f"{fake_url}/api/ps")).json()["models"]
+                used = sum(item["size"] for item in ps)
+                if budget and used > budget:
+                    over_budget.append(i)
+                print(f"{i:>3}  {model:<12}{ttft:>8.3f}  {', '.join(item['name'] for item in ps)} ({used / 2**30:.1f} GB)")
+                await asyncio.sleep(args.gap)
+
+            fake_stats = (await client.get(f"{fake_url}/fake/ollama/stats")).json()
+            residency = (await client.get(f"{server_url}/api/ollama/residency")).json()
+    finally:
+        for process in (backend, fake):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    print(f"\nFake Ollama: {fake_stats['loads']} loads, {fake_stats['unloads']} unloads")
+    print("Backend residency:", json.dumps(residency, indent=2))
+    if over_budget:
+        print(f"Loaded models exceeded the {args.budget_gb} GB budget after requests {over_budget}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
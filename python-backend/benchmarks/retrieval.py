@@ -0,0 +1,142 @@
+"""
+Offline retrieval quality and latency benchmark on the HTML fixtures.
+
+The fixture pages are extracted and split the way web search does it, embedded
+once, and every query in fixtures/retrieval_queries.json is answered by
+  - dense:   cosine top k (the previous retrieval)
+  - hybrid:  dense + BM25 reciprocal rank fusion, top k
+  - hybrid+mmr: fusion, then MMR de-duplication under the token budget
+  - compressed: hybrid+mmr chunks cut down to their best sentences (what web search uses)
+A query counts as a hit when its expected text appears in the context handed to
+the prompt; "ratio" is the share of the retrieved tokens that context keeps.
+
+    python python-backend/benchmarks/retrieval.py
+    python python-backend/benchmarks/retrieval.py --embeddings hash   # no model download, lexical-ish vectors
+    python python-backend/benchmarks/retrieval.py --k 5 --compression-tokens 300
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from langchain_core.documents import Document
+
+from utils.context_compression import CONTEXT_COMPRESSION_TOKENS, compress_context
+from utils.context_window import approx_tokens
+from utils.hybrid_retrieval import hybrid_search, terms
+from utils.page_fetcher import extract_markdown
+from utils.vector_index import VectorIndex
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+DUPLICATE_SIMILARITY = 0.9
+HASH_DIMENSIONS = 512
+
+
+def hash_embed(texts: list[str]) -> list[np.ndarray]:
+    """Hashed bag-of-words vectors, a model-free stand-in for the e5 embeddings"""
+    vectors = []
+    for text in texts:
+        vector = np.zeros(HASH_DIMENSIONS, dtype=np.float32)
+        for term in terms(text):
+            vector[int(hashlib.md5(term.encode()).hexdigest(), 16) % HASH_DIMENSIONS] += 1.0
+        vectors.append(vector)
+    return vectors
+
+
+class HashEmbeddings:
+    """hash_embed behind the embed_documents interface of the e5 model, for the web search stack"""
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [vector.tolist() for vector in hash_embed(texts)]
+
+
+def fixture_names() -> list[str]:
+    return sorted(name for name in os.listdir(FIXTURES_DIR) if name.endswith(".html"))
+
+
+def load_chunks(split_documents) -> list[Document]:
+    documents = []
+    for name in fixture_names():
+        with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+            markdown = extract_markdown(f.read())
+        documents.append(Document(metadata={"id": name, "source": name}, page_content=markdown))
+    return split_documents(documents)
+
+
+def duplicate_pairs(index: VectorIndex, picked: list[Document]) -> int:
+    rows = [index.documents.index(document) for document in picked]
+    matrix = index.matrix[rows]
+    similarity = matrix @ matrix.T
+    return int(np.count_nonzero(np.triu(similarity >= DUPLICATE_SIMILARITY, k=1)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare dense, hybrid and hybrid+MMR retrieval on the fixtures.")
+    parser.add_argument("--embeddings", choices=["e5", "hash"], default="e5")
+    parser.add_argument("--k", type=int, default=3, help="chunks picked per query (the fixtures are small)")
+    parser.add_argument("--compression-tokens", type=int, default=CONTEXT_COMPRESSION_TOKENS, help="token budget of the compressed context")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per query and method")
+    args = parser.parse_args()
+
+    from utils.C4AI_web_search import EMBEDDING_MODEL, split_documents
+
+    if args.embeddings == "e5":
+        from utils.get_embedding_function import hf_local_embeddings
+
+        model = hf_local_embeddings(EMBEDDING_MODEL)
+        embed_documents, embed_query = model.embed_documents, lambda text: model.embed_documents([text])[0]
+    else:
+        embed_documents, embed_query = hash_embed, lambda text: hash_embed([text])[0]
+
+    chunks = load_chunks(split_documents)
+    index = VectorIndex()
+    index.add(chunks, embed_documents([chunk.page_content for chunk in chunks]))
+
+    with open(os.path.join(FIXTURES_DIR, "retrieval_queries.json"), encoding="utf-8") as f:
+        queries = json.load(f)
+
+    def compressed(query, embedding):
+        picked = [document for document, _score in hybrid_search(index, query, embedding, k=args.k)]
+        return compress_context(picked, query, embedding, index.vectors(picked), args.compression_tokens), picked
+
+    def chunks_only(search):
+        def method(query, embedding):
+            picked = [document for document, _score in search(query, embedding)]
+            return "\n".join(document.page_content for document in picked), picked
+        return method
+
+    methods = {
+        "dense": chunks_only(lambda query, embedding: index.search(embedding, k=args.k)),
+        "hybrid": chunks_only(lambda query, embedding: hybrid_search(index, query, embedding, k=args.k, token_budget=10**9,
+                                                                     mmr_lambda=1.0, duplicate_similarity=2.0)),
+        "hybrid+mmr": chunks_only(lambda query, embedding: hybrid_search(index, query, embedding, k=args.k)),
+        "compressed": compressed,
+    }
+
+    print(f"{len(chunks)} chunks from {len(fixture_names())} pages, {len(queries)} queries, k={args.k}\n")
+    print(f"{'method':<12}{'hit rate':>10}{'dup pairs':>11}{'tokens':>9}{'ratio':>8}{'ms/query':>10}")
+    embeddings = [embed_query(item["query"]) for item in queries]
+    for name, method in methods.items():
+        hits = duplicates = tokens = 0
+        ratio = seconds = 0.0
+        for item, embedding in zip(queries, embeddings):
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                context, picked = method(item["query"], embedding)
+            seconds += (time.perf_counter() - started) / args.repeat
+
+            hits += item["expected"].lower() in context.lower()
+            duplicates += duplicate_pairs(index, picked)
+            tokens += approx_tokens(context)
+            ratio += approx_tokens(context) / max(sum(approx_tokens(document.page_content) for document in picked), 1)
+
+        n = len(queries)
+        print(f"{name:<12}{hits / n:>10.2f}{duplicates / n:>11.2f}{tokens / n:>9.0f}{ratio / n:>8.2f}{1000 * seconds / n:>10.3f}")
+
+if __name__ == "__main__":
+    main()
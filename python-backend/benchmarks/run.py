@@ -0,0 +1,349 @@
+"""
+End-to-end load test of /api/chat against local fake providers.
+
+Starts fake_providers.py and the backend (serve.py) as subprocesses, drives N
+concurrent SSE clients through /api/chat for each provider and concurrency
+level, and reports time-to-first-token percentiles, per-stream and aggregate
+tokens/s, the backend's CPU and RSS, and for web search the share of the
+retrieved context tokens that compression kept.
+
+    python python-backend/benchmarks/run.py --providers openrouter,ollama --concurrency 1,8,32
+    python python-backend/benchmarks/run.py --web-search --save-baseline main
+    python python-backend/benchmarks/run.py --web-search --compare main
+
+To see what context compression does to the first token of a CPU-bound model:
+
+    python python-backend/benchmarks/run.py --providers ollama --web-search --prompt-tokens-per-second 200 --compression-tokens 0 --save-baseline uncompressed
+    python python-backend/benchmarks/run.py --providers ollama --web-search --prompt-tokens-per-second 200 --compare uncompressed
+
+To see what search prefetch saves, send the draft question to /api/search/prefetch
+a given number of seconds (the user still typing) before each chat:
+
+    python python-backend/benchmarks/run.py --web-search --save-baseline no-prefetch
+    python python-backend/benchmarks/run.py --web-search --prefetch-lead 2 --compare no-prefetch
+
+Baselines are JSON files in benchmarks/results/, committed so later changes
+have a recorded number to compare against.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from utils.context_window import approx_tokens
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_DIR = os.path.join(BENCHMARKS_DIR, "results")
+
+PROVIDER_MODELS = {
+    "openrouter": "fake/openrouter-model",
+    "groq": "fake-groq-model",
+    "ollama": "fake-ollama-model",
+    "gemini": "gemini-fake",
+}
+QUESTION = "Explain how streaming responses are delivered to the browser."
+# What the input box holds a moment before the question is sent
+DRAFT_QUESTION = QUESTION.rsplit(" ", 1)[0]
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    """Nearest-rank percentile, None for no samples"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class ProcessSampler:
+    """Samples CPU time and RSS of a process from /proc (psutil when available)"""
+
+    def __init__(self, pid: int, interval: float = 0.25):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss = 0
+        self._task: asyncio.Task | None = None
+        self._cpu_start = 0.0
+        self._wall_start = 0.0
+        try:
+            import psutil
+            self._process = psutil.Process(pid)
+        except ImportError:
+            self._process = None
+
+    def cpu_seconds(self) -> float:
+        if self._process is not None:
+            times = self._process.cpu_times()
+            return times.user + times.system
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+    def rss_bytes(self) -> int:
+        if self._process is not None:
+            return self._process.memory_info().rss
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    async def _sample(self):
+        while True:
+            self.peak_rss = max(self.peak_rss, self.rss_bytes())
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self.peak_rss = self.rss_bytes()
+        self._cpu_start = self.cpu_seconds()
+        self._wall_start = time.perf_counter()
+        self._task = asyncio.create_task(self._sample())
+
+    async def stop(self) -> dict:
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        wall = time.perf_counter() - self._wall_start
+        cpu = self.cpu_seconds() - self._cpu_start
+        return {"cpu_percent": 100 * cpu / wall if wall else 0.0, "peak_rss_mb": self.peak_rss / 2**20}
+
+
+async def run_chat(client: httpx.AsyncClient, provider: str, web_search: bool, prefetch_lead: float | None = None) -> dict:
+    payload = {
+        "conversation": [{"role": "user", "content": QUESTION}],
+        "model": {"name": PROVIDER_MODELS[provider], "provider": provider, "key": "benchmark"},
+        "web_search": web_search,
+    }
+    if web_search and prefetch_lead is not None:
+        payload["session_id"] = uuid.uuid4().hex
+        response = await client.post("/api/search/prefetch", json={"prompt": DRAFT_QUESTION, "session_id": payload["session_id"]})
+        response.raise_for_status()
+        await asyncio.sleep(prefetch_lead)
+    started = time.perf_counter()
+    first_token = None
+    text = []
+    error = None
+
+    async with client.stream("POST", "/api/chat", json=payload) as response:
+        if response.status_code != 200:
+            return {"error": f"HTTP {response.status_code}"}
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            data = json.loads(line[len("data: "):])
+            if "error" in data:
+                error = data["error"]
+                break
+            if data.get("content"):
+                if first_token is None:
+                    first_token = time.perf_counter()
+                text.append(data["content"])
+
+    finished = time.perf_counter()
+    if error or first_token is None:
+        return {"error": error or "no tokens"}
+
+    tokens = approx_tokens("".join(text))
+    generation = finished - first_token
+    return {
+        "ttft": first_token - started,
+        "total": finished - started,
+        "tokens": tokens,
+        "tokens_per_second": tokens / generation if generation > 0 else None,
+    }
+
+
+async def histogram_totals(client: httpx.AsyncClient, name: str) -> tuple[float, float]:
+    """Sum and count of one of the backend's histograms"""
+    response = await client.get("/metrics")
+    values = dict(line.split(" ", 1) for line in response.text.splitlines() if line and not line.startswith("#"))
+    name = f"chat_backend_{name}"
+    return float(values.get(f"{name}_sum", 0)), float(values.get(f"{name}_count", 0))
+
+
+async def run_scenario(base_url: str, provider: str, concurrency: int, requests: int, web_search: bool, sampler: ProcessSampler,
+                       prefetch_lead: float | None = None) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+        ratio_sum, ratio_count = await histogram_totals(client, "context_compression_ratio")
+        saved_sum, saved_count = await histogram_totals(client, "search_prefetch_saved_seconds")
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                try:
+                    return await run_chat(client, provider, web_search, prefetch_lead)
+                except httpx.HTTPError as e:
+                    return {"error": str(e)}
+
+        sampler.start()
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(requests)))
+        wall = time.perf_counter() - started
+        resources = await sampler.stop()
+        ratio_sum_after, ratio_count_after = await histogram_totals(client, "context_compression_ratio")
+        saved_sum_after, saved_count_after = await histogram_totals(client, "search_prefetch_saved_seconds")
+
+    ok = [result for result in results if "error" not in result]
+    ttfts = [result["ttft"] for result in ok]
+    rates = [result["tokens_per_second"] for result in ok if result["tokens_per_second"]]
+    return {
+        "requests": requests,
+        "errors": len(results) - len(ok),
+        "ttft_p50": percentile(ttfts, 50),
+        "ttft_p95": percentile(ttfts, 95),
+        "ttft_p99": percentile(ttfts, 99),
+        "total_p50": percentile([result["total"] for result in ok], 50),
+        "total_p95": percentile([result["total"] for result in ok], 95),
+        "stream_tokens_per_second_p50": percentile(rates, 50),
+        "aggregate_tokens_per_second": sum(result["tokens"] for result in ok) / wall if wall else 0.0,
+        "compression_ratio": ((ratio_sum_after - ratio_sum) / (ratio_count_after - ratio_count)
+                              if ratio_count_after > ratio_count else None),
+        "prefetch_hit_rate": (saved_count_after - saved_count) / requests if web_search and prefetch_lead is not None else None,
+        "prefetch_saved_seconds": ((saved_sum_after - saved_sum) / (saved_count_after - saved_count)
+                                   if saved_count_after > saved_count else None),
+        **resources,
+    }
+
+
+async def wait_ready(url: str, process: subprocess.Popen, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {process.returncode}")
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def format_value(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+def print_table(results: dict, baseline: dict | None = None):
+    columns = ["errors", "ttft_p50", "ttft_p95", "ttft_p99", "total_p95",
+               "stream_tokens_per_second_p50", "aggregate_tokens_per_second", "compression_ratio",
+               "prefetch_hit_rate", "prefetch_saved_seconds", "cpu_percent", "peak_rss_mb"]
+    print("scenario".ljust(32) + "".join(column[:14].rjust(16) for column in columns))
+    for scenario, metrics in results.items():
+        row = scenario.ljust(32)
+        for column in columns:
+            cell = format_value(metrics.get(column))
+            previous = (baseline or {}).get(scenario, {}).get(column)
+            if previous and metrics.get(column) is not None:
+                cell += f" ({100 * (metrics[column] - previous) / previous:+.0f}%)"
+            row += cell.rjust(16)
+        print(row)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test /api/chat against fake providers.")
+    parser.add_argument("--providers", default="openrouter,groq,ollama,gemini")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=0, help="requests per scenario, default 4x concurrency")
+    parser.add_argument("--web-search", action="store_true", help="also run every scenario with web_search on the HTML fixtures")
+    parser.add_argument("--prefetch-lead", type=float, help="prefetch the draft question this many seconds before each web search chat")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--first-token-latency", type=float, default=0.2, help="seconds")
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=0.0,
+                        help="prompt processing rate of the fake providers, makes the first token wait on prompt length")
+    parser.add_argument("--compression-tokens", type=int, help="CONTEXT_COMPRESSION_TOKENS for the backend, 0 turns compression off")
+    parser.add_argument("--embeddings", choices=["e5", "hash"], default="e5", help="web search embeddings, hash needs no model download")
+    parser.add_argument("--keep-limits", action="store_true", help="keep the default admission limits (Ollama runs one at a time)")
+    parser.add_argument("--fake-port", type=int, default=9100)
+    parser.add_argument("--server-port", type=int, default=8100)
+    parser.add_argument("--save-baseline", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    args = parser.parse_args()
+
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    server_url = f"http://127.0.0.1:{args.server_port}"
+    providers = [provider.strip() for provider in args.providers.split(",") if provider.strip()]
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    scratch = tempfile.mkdtemp(prefix="chat-bench-")
+    env = {
+        **os.environ,
+        "OLLAMA_HOST": fake_url,
+        "OPENROUTER_BASE_URL": f"{fake_url}/v1",
+        "GROQ_BASE_URL": fake_url,
+        "GEMINI_BASE_URL": fake_url,
+        # Every request must reach the provider, and pages start uncached
+        "RESPONSE_CACHE_TTL": "0",
+        "PAGE_CACHE_DIR": os.path.join(scratch, "page-cache"),
+        "EMBEDDING_CACHE_DIR": os.path.join(scratch, "embedding-cache"),
+    }
+    if args.compression_tokens is not None:
+        env["CONTEXT_COMPRESSION_TOKENS"] = str(args.compression_tokens)
+    if not args.keep_limits:
+        top = max(levels)
+        env["ADMISSION_LIMITS"] = ",".join(f"{name}={top}" for name in ["chat", *(f"provider:{p}" for p in providers)])
+        env["ADMISSION_MAX_QUEUE"] = str(max(32, top * 4))
+
+    fake_cmd = [sys.executable, os.path.join(BENCHMARKS_DIR, "fake_providers.py"), "--port", str(args.fake_port),
+                "--tokens-per-second", str(args.tokens_per_second), "--first-token-latency", str(args.first_token_latency),
+                "--tokens", str(args.tokens), "--prompt-tokens-per-second", str(args.prompt_tokens_per_second)]
+    server_cmd = [sys.executable, os.path.join(BENCHMARKS_DIR, "serve.py"), "--port", str(args.server_port),
+                  "--fixtures-url", fake_url]
+    if args.web_search:
+        server_cmd += ["--web-search", "--embeddings", args.embeddings]
+
+    fake = subprocess.Popen(fake_cmd, env=env)
+    backend = subprocess.Popen(server_cmd, env=env)
+    results = {}
+    try:
+        await wait_ready(f"{fake_url}/fixtures/", fake)
+        await wait_ready(f"{server_url}/api/stats", backend)
+        sampler = ProcessSampler(backend.pid)
+
+        for web_search in ([False, True] if args.web_search else [False]):
+            for provider in providers:
+                # Warm-up request: pooled clients, and the embedding model for web search
+                await run_scenario(server_url, provider, 1, 1, web_search, sampler)
+                for level in levels:
+                    scenario = f"{provider}/c{level}" + ("/web" if web_search else "")
+                    print(f"Running {scenario}...", file=sys.stderr)
+                    results[scenario] = await run_scenario(server_url, provider, level, args.requests or level * 4, web_search, sampler,
+                                                           args.prefetch_lead)
+    finally:
+        for process in (backend, fake):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    baseline = None
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json")) as f:
+            baseline = json.load(f)["results"]
+    print_table(results, baseline)
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save_baseline}.json")
+        with open(path, "w") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+        print(f"Saved baseline to {path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
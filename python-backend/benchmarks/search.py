@@ -0,0 +1,152 @@
+"""
+Cold vs. warm web search latency on the HTML fixtures.
+
+Every query in fixtures/retrieval_queries.json is searched, with the search
+engines replaced by one returning the fixture pages served from a local HTTP
+server:
+  - cold: a new Python process per query that imports the search stack and runs
+          one search, what the per-query `C4AI_web_search.py` subprocess cost
+  - warm: search_service in this process, loaded once with ready(), then queried
+Page and embedding caches are effectively off in both modes (a page cache of 0
+bytes, an embedding cache of one entry) so the difference is the loading alone;
+--caches keeps them on for the warm runs, as in a long-running server.
+
+    python python-backend/benchmarks/search.py
+    python python-backend/benchmarks/search.py --embeddings hash   # no model download
+    python python-backend/benchmarks/search.py --queries 3 --caches
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.retrieval import FIXTURES_DIR, HashEmbeddings, fixture_names
+
+NO_CACHES = {"PAGE_CACHE_MAX_BYTES": "0", "EMBEDDING_CACHE_MAX_ENTRIES": "1"}
+
+
+def configure(module, fixtures_url: str, embeddings: str):
+    """Point the search stack at the fixtures, and at the hash embeddings if asked"""
+    from utils.search_engines import SearchEngine
+
+    urls = [f"{fixtures_url}/{name}" for name in fixture_names()]
+    module.get_search_engines().engines = [SearchEngine("fixtures", lambda search_term, num_results: urls[:num_results])]
+    if embeddings == "hash":
+        module.get_embedding_model = lambda model_name=module.EMBEDDING_MODEL: HashEmbeddings()
+
+
+def one_shot(query: str, fixtures_url: str, embeddings: str):
+    """Body of a cold run: import, search once, exit"""
+    import utils.C4AI_web_search as module
+
+    configure(module, fixtures_url, embeddings)
+    context, _sources = asyncio.run(module.web_search(query))
+    if not context:
+        sys.exit(1)
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_fixtures() -> tuple[ThreadingHTTPServer, str]:
+    handler = functools.partial(FixtureHandler, directory=FIXTURES_DIR)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, f"http://127.0.0.1:{httpd.server_address[1]}"
+
+
+def cold(queries: list[str], fixtures_url: str, embeddings: str, env: dict) -> list[float]:
+    latencies = []
+    for query in queries:
+        with tempfile.TemporaryDirectory() as scratch:
+            run_env = {**env, "PAGE_CACHE_DIR": os.path.join(scratch, "pages"), "EMBEDDING_CACHE_DIR": os.path.join(scratch, "embeddings")}
+            started = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--one-shot", query, "--fixtures-url", fixtures_url, "--embeddings", embeddings],
+                env=run_env, capture_output=True, text=True,
+            )
+            latencies.append(time.perf_counter() - started)
+            if result.returncode != 0:
+                raise RuntimeError(f"Cold search for {query!r} failed:\n{result.stderr[-2000:]}")
+    return latencies
+
+
+async def warm(queries: list[str], fixtures_url: str, embeddings: str) -> tuple[float, list[float]]:
+    from utils.search_service import search_service
+
+    module = await search_service.load_module()
+    configure(module, fixtures_url, embeddings)
+    started = time.perf_counter()
+    await search_service.ready()
+    load_seconds = time.perf_counter() - started
+
+    latencies = []
+    try:
+        for query in queries:
+            started = time.perf_counter()
+            result = await search_service.search(query)
+            latencies.append(time.perf_counter() - started)
+            if not result or not result[0]:
+                raise RuntimeError(f"Warm search for {query!r} returned no context")
+    finally:
+        await search_service.stop()
+    return load_seconds, latencies
+
+
+def summary(latencies: list[float]) -> str:
+    ordered = sorted(latencies)
+    return f"mean {sum(ordered) / len(ordered):6.2f}s  p50 {ordered[len(ordered) // 2]:6.2f}s  max {ordered[-1]:6.2f}s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold vs. warm web search latency on the fixtures.")
+    parser.add_argument("--embeddings", choices=["e5", "hash"], default="e5")
+    parser.add_argument("--queries", type=int, default=0, help="number of fixture queries to run, 0 for all")
+    parser.add_argument("--caches", action="store_true", help="keep the page and embedding caches on for warm runs")
+    parser.add_argument("--one-shot", metavar="QUERY", help=argparse.SUPPRESS)
+    parser.add_argument("--fixtures-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.one_shot is not None:
+        one_shot(args.one_shot, args.fixtures_url, args.embeddings)
+        return
+
+    with open(os.path.join(FIXTURES_DIR, "retrieval_queries.json"), encoding="utf-8") as f:
+        queries = [item["query"] for item in json.load(f)]
+    if args.queries:
+        queries = queries[:args.queries]
+
+    scratch = tempfile.mkdtemp(prefix="search-bench-")
+    env = {**os.environ, **NO_CACHES}
+    if not args.caches:
+        os.environ.update(NO_CACHES)
+    os.environ["PAGE_CACHE_DIR"] = os.path.join(scratch, "pages")
+    os.environ["EMBEDDING_CACHE_DIR"] = os.path.join(scratch, "embeddings")
+
+    httpd, fixtures_url = serve_fixtures()
+    try:
+        print(f"{len(queries)} queries on {len(fixture_names())} fixture pages, {args.embeddings} embeddings", file=sys.stderr)
+        cold_latencies = cold(queries, fixtures_url, args.embeddings, env)
+        load_seconds, warm_latencies = asyncio.run(warm(queries, fixtures_url, args.embeddings))
+    finally:
+        httpd.shutdown()
+
+    print(f"cold (process per query)  {summary(cold_latencies)}")
+    print(f"warm (search service)     {summary(warm_latencies)}  after a one-time load of {load_seconds:.2f}s"
+          + (" (caches on)" if args.caches else ""))
+    print(f"speedup                   {sum(cold_latencies) / sum(warm_latencies):.1f}x per query")
+
+
+if __name__ == "__main__":
+    main()
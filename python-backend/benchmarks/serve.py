@@ -0,0 +1,51 @@
+"""
+Run the backend for benchmarking, with web search pointed at the local HTML fixtures.
+
+The search engines are replaced by one that returns the fixture pages served by
+fake_providers.py, so `web_search` runs exercise fetching, splitting, embedding
+and retrieval without touching the internet. Provider base URLs come from the
+environment (OLLAMA_HOST, OPENROUTER_BASE_URL, GROQ_BASE_URL, GEMINI_BASE_URL).
+
+    python python-backend/benchmarks/serve.py --port 8100 --fixtures-url http://127.0.0.1:9100
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_providers import fixture_names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the chat backend against local fixtures.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--fixtures-url", default="http://127.0.0.1:9100", help="base URL of fake_providers.py")
+    parser.add_argument("--web-search", action="store_true", help="load the web search stack with the fixture engine")
+    parser.add_argument("--embeddings", choices=["e5", "hash"], default="e5", help="hash: no model download, see retrieval.py")
+    args = parser.parse_args()
+
+    import uvicorn
+    import server
+
+    if args.web_search:
+        import utils.C4AI_web_search as web_search
+        from utils.search_engines import SearchEngine
+
+        if args.embeddings == "hash":
+            from benchmarks.retrieval import HashEmbeddings
+            web_search.get_embedding_model = lambda model_name=web_search.EMBEDDING_MODEL: HashEmbeddings()
+
+        urls = [f"{args.fixtures_url}/fixtures/{name}" for name in fixture_names()]
+
+        def fixture_search(search_term: str, num_results: int) -> list[str]:
+            return urls[:num_results]
+
+        web_search.get_search_engines().engines = [SearchEngine("fixtures", fixture_search)]
+
+    uvicorn.run(server.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+SSE output stage benchmark: tokens/s and time to first byte of a fast provider.
+
+A fake provider yields `--tokens` deltas at each of the `--rates` (tokens/s, 0
+meaning as fast as the event loop allows) after `--first-token-latency`
+seconds. The deltas go through
+  - per-token sleep: one frame per delta plus the fixed 10 ms sleep the
+    provider loops used to have
+  - coalesced:       coalesce_deltas with the configured flush interval and size
+and the report shows, per rate, the time until the first frame, the delivered
+tokens/s and how many SSE frames it took.
+
+    python python-backend/benchmarks/sse.py
+    python python-backend/benchmarks/sse.py --tokens 2000 --rates 0,200,1000,5000 --flush-interval-ms 30
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.sse import SSE_FLUSH_INTERVAL, SSE_MAX_CHUNK_BYTES, coalesce_deltas, format_chunk
+
+MODEL = "fake-model"
+
+
+async def fake_provider(tokens: int, rate: float, first_token_latency: float):
+    loop = asyncio.get_running_loop()
+    started = loop.time() + first_token_latency
+    await asyncio.sleep(first_token_latency)
+    for i in range(tokens):
+        if rate > 0:
+            # Paced against the start, like a model decoding at a steady rate
+            delay = started + i / rate - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        else:
+            await asyncio.sleep(0)
+        yield f" tok{i}"
+
+
+async def per_token_sleep(deltas):
+    async for delta in deltas:
+        yield await format_chunk(delta, MODEL)
+        await asyncio.sleep(0.01)
+
+
+async def coalesced(deltas, flush_interval: float, max_bytes: int):
+    async for piece in coalesce_deltas(deltas, flush_interval=flush_interval, max_bytes=max_bytes):
+        yield await format_chunk(piece, MODEL)
+
+
+async def measure(frames, tokens: int) -> tuple[float, float, int]:
+    """Seconds to the first frame, tokens/s over the whole stream and the number of frames"""
+    started = time.perf_counter()
+    first_byte = None
+    count = 0
+    async for _frame in frames:
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        count += 1
+    return first_byte, tokens / (time.perf_counter() - started), count
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Measure SSE tokens/s and time to first byte.")
+    parser.add_argument("--tokens", type=int, default=500)
+    parser.add_argument("--rates", default="0,100,500,2000", help="comma separated provider tokens/s, 0 for unpaced")
+    parser.add_argument("--first-token-latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--flush-interval-ms", type=float, default=SSE_FLUSH_INTERVAL * 1000)
+    parser.add_argument("--max-bytes", type=int, default=SSE_MAX_CHUNK_BYTES)
+    args = parser.parse_args()
+
+    flush_interval = args.flush_interval_ms / 1000
+    stages = [
+        ("per-token sleep", per_token_sleep),
+        (f"coalesced ({args.flush_interval_ms:.0f} ms, {args.max_bytes} B)", lambda deltas: coalesced(deltas, flush_interval, args.max_bytes)),
+    ]
+
+    print(f"{args.tokens} tokens, first token after {args.first_token_latency * 1000:.0f} ms")
+    print(f"{'provider tok/s':>14}  {'stage':<30}{'ttfb ms':>10}{'tok/s':>10}{'frames':>8}")
+    for rate in [float(rate) for rate in args.rates.split(",")]:
+        for name, stage in stages:
+            first_byte, tokens_per_second, frames = await measure(
+                stage(fake_provider(args.tokens, rate, args.first_token_latency)), args.tokens)
+            label = f"{rate:.0f}" if rate > 0 else "unpaced"
+            print(f"{label:>14}  {name:<30}{first_byte * 1000:>10.1f}{tokens_per_second:>10.0f}{frames:>8}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
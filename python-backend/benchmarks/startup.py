@@ -0,0 +1,118 @@
+"""
+Backend startup benchmark.
+
+Reports the `python -X importtime` breakdown of `import server` by top-level
+package, the time until the backend answers /api/stats, and optionally how long
+POST /api/warmup takes for chosen components.
+
+    python python-backend/benchmarks/startup.py
+    python python-backend/benchmarks/startup.py --warmup search,ollama --save-baseline main
+    python python-backend/benchmarks/startup.py --compare main
+
+Baselines are stored next to the load test ones as startup-<name>.json.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from benchmarks.run import BASELINE_DIR, BENCHMARKS_DIR, wait_ready
+
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+
+
+def import_breakdown(module: str = "server") -> tuple[float, dict[str, float]]:
+    """Total import seconds of `module` and cumulative seconds per top-level package it pulled in"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    packages: dict[str, float] = {}
+    total = 0.0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _self, cumulative, name = line[len("import time:"):].split("|")
+        if name.startswith("  "):
+            # Nested import, already counted in its parent's cumulative time
+            continue
+        seconds = int(cumulative) / 1e6
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0.0) + seconds
+        if name.strip() == module:
+            total = seconds
+    return total, packages
+
+
+async def time_to_ready(port: int, warmup: list[str]) -> dict:
+    started = time.perf_counter()
+    backend = subprocess.Popen([sys.executable, os.path.join(BENCHMARKS_DIR, "serve.py"), "--port", str(port)])
+    try:
+        url = f"http://127.0.0.1:{port}"
+        await wait_ready(f"{url}/api/stats", backend)
+        timings = {"time_to_ready": time.perf_counter() - started}
+
+        if warmup:
+            async with httpx.AsyncClient(base_url=url, timeout=None) as client:
+                warmup_started = time.perf_counter()
+                response = await client.post("/api/warmup", json={"components": warmup})
+                response.raise_for_status()
+                timings["warmup"] = time.perf_counter() - warmup_started
+                timings.update({f"warmup_{name}": seconds for name, seconds in response.json()["loaded"].items()})
+        return timings
+    finally:
+        backend.terminate()
+        try:
+            backend.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            backend.kill()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Measure backend import time and time to ready.")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--warmup", default="", help="components to warm up after startup, e.g. search,ollama or all")
+    parser.add_argument("--top", type=int, default=15, help="packages to list in the import breakdown")
+    parser.add_argument("--save-baseline", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    args = parser.parse_args()
+
+    import_total, packages = import_breakdown()
+    results = {"import_server": import_total, **await time_to_ready(args.port, [c for c in args.warmup.split(",") if c])}
+
+    baseline = {}
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"startup-{args.compare}.json")) as f:
+            baseline = json.load(f)["results"]
+
+    print("Slowest imports (cumulative seconds):")
+    for package, seconds in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {package:<32}{seconds:8.3f}")
+    print()
+    for name, seconds in results.items():
+        line = f"{name:<34}{seconds:8.3f}s"
+        if baseline.get(name):
+            line += f"  ({100 * (seconds - baseline[name]) / baseline[name]:+.0f}%)"
+        print(line)
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"startup-{args.save_baseline}.json")
+        with open(path, "w") as f:
+            json.dump({"settings": vars(args), "results": results, "imports": packages}, f, indent=2)
+        print(f"Saved baseline to {path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,148 @@
+"""
+Retrieval engine benchmark: the per-request VectorIndex vs. the Chroma path it replaced.
+
+10 pages built from the HTML fixture paragraphs are split the way web search
+does it and cut to `--chunks` chunks (200 by default). For each query in
+fixtures/retrieval_queries.json both engines index the chunks from scratch and
+return the top k, as one search did:
+  - chroma:       persistent Chroma collection in a fresh directory,
+                  add_documents, similarity_search_with_score, rmtree
+  - vector index: VectorIndex.add and VectorIndex.search in memory
+Embeddings are computed once up front and served from a lookup table, so only
+the engines are timed. The report shows per-search latency and how many of the
+top k chunks the two engines agree on. Chroma needs langchain-chroma, without
+it only the VectorIndex is measured.
+
+    python python-backend/benchmarks/vector_index.py
+    python python-backend/benchmarks/vector_index.py --embeddings hash --repeat 5
+"""
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from langchain_core.documents import Document
+
+from benchmarks.retrieval import FIXTURES_DIR, fixture_names, hash_embed
+from utils.page_fetcher import extract_markdown
+from utils.vector_index import VectorIndex
+
+PAGES = 10
+
+
+class TableEmbeddings:
+    """Precomputed embeddings by text, so neither engine pays for the model"""
+
+    def __init__(self, table: dict[str, list[float]]):
+        self.table = table
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.table[text] for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.table[text]
+
+
+def build_chunks(count: int) -> list[Document]:
+    """`count` chunks from PAGES long pages, each made of the fixture paragraphs in random order"""
+    from utils.C4AI_web_search import text_splitter
+
+    paragraphs = []
+    for name in fixture_names():
+        with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+            paragraphs += extract_markdown(f.read()).split("\n\n")
+
+    rng = np.random.default_rng(0)
+    chunks = []
+    for page in range(PAGES):
+        # A crawled page is several times longer than a fixture
+        order = np.concatenate([rng.permutation(len(paragraphs)) for _ in range(3)])
+        markdown = "\n\n".join(paragraphs[i] for i in order)
+        for i, text in enumerate(text_splitter.split_text(markdown)):
+            chunks.append(Document(page_content=text, metadata={"source": f"page-{page}", "id": f"page-{page}#{i}"}))
+    if len(chunks) < count:
+        raise SystemExit(f"The fixtures only give {len(chunks)} chunks, asked for {count}")
+    picked = rng.choice(len(chunks), size=count, replace=False)
+    return [chunks[i] for i in sorted(picked)]
+
+
+def embed_all(texts: list[str], embeddings: str) -> dict[str, list[float]]:
+    if embeddings == "hash":
+        vectors = hash_embed(texts)
+    else:
+        from utils.get_embedding_function import hf_local_embeddings
+        vectors = hf_local_embeddings("intfloat/e5-small-v2").embed_documents(texts)
+    # Normalized, so Chroma's L2 distance ranks like the index's cosine similarity
+    return dict(zip(texts, VectorIndex.normalize(vectors).tolist()))
+
+
+def vector_index_search(chunks: list[Document], embeddings: TableEmbeddings, query: str, k: int) -> list[str]:
+    index = VectorIndex()
+    index.add(chunks, embeddings.embed_documents([chunk.page_content for chunk in chunks]))
+    return [document.metadata["id"] for document, _score in index.search(embeddings.embed_query(query), k=k)]
+
+
+def chroma_search(chunks: list[Document], embeddings: TableEmbeddings, query: str, k: int) -> list[str]:
+    from langchain_chroma import Chroma
+
+    directory = tempfile.mkdtemp(prefix="chroma-bench-")
+    try:
+        db = Chroma(persist_directory=directory, embedding_function=embeddings, collection_name="web-search-llm")
+        db.add_documents(chunks, ids=[chunk.metadata["id"] for chunk in chunks])
+        results = db.similarity_search_with_score(query, k=k)
+        return [document.metadata["id"] for document, _score in results]
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def timed(search, chunks, embeddings, queries: list[str], k: int, repeat: int) -> tuple[list[float], dict[str, list[str]]]:
+    latencies, results = [], {}
+    for _ in range(repeat):
+        for query in queries:
+            started = time.perf_counter()
+            results[query] = search(chunks, embeddings, query, k)
+            latencies.append(time.perf_counter() - started)
+    return latencies, results
+
+
+def summary(latencies: list[float]) -> str:
+    ordered = sorted(latencies)
+    return f"mean {1000 * sum(ordered) / len(ordered):9.2f} ms  p50 {1000 * ordered[len(ordered) // 2]:9.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare VectorIndex with the Chroma retrieval path.")
+    parser.add_argument("--chunks", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the queries")
+    parser.add_argument("--embeddings", choices=["e5", "hash"], default="e5")
+    args = parser.parse_args()
+
+    with open(os.path.join(FIXTURES_DIR, "retrieval_queries.json"), encoding="utf-8") as f:
+        queries = [item["query"] for item in json.load(f)]
+    chunks = build_chunks(args.chunks)
+    embeddings = TableEmbeddings(embed_all([chunk.page_content for chunk in chunks] + queries, args.embeddings))
+
+    print(f"{len(chunks)} chunks from {PAGES} pages, {len(queries)} queries x {args.repeat}, top {args.k}, {args.embeddings} embeddings")
+    index_latencies, index_results = timed(vector_index_search, chunks, embeddings, queries, args.k, args.repeat)
+    print(f"  vector index  {summary(index_latencies)}")
+
+    if importlib.util.find_spec("langchain_chroma") is None:
+        print("  chroma        skipped, langchain-chroma is not installed")
+        return
+
+    chroma_latencies, chroma_results = timed(chroma_search, chunks, embeddings, queries, args.k, args.repeat)
+    agreement = sum(len(set(index_results[query]) & set(chroma_results[query])) for query in queries) / (args.k * len(queries))
+    print(f"  chroma        {summary(chroma_latencies)}")
+    print(f"  speedup {sum(chroma_latencies) / sum(index_latencies):.0f}x, top {args.k} agreement {agreement:.0%}")
+
+
+if __name__ == "__main__":
+    main()
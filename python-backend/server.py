@@ -1,27 +1,68 @@
 import asyncio
-import os
-process_env = os.environ.copy()
-process_env["PYTHONIOENCODING"] = "utf-8"
-import subprocess
 import sys
 sys.dont_write_bytecode = True
 
 #server
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List
-import json
 from utils.prompts import base_prompt, prompt_with_context
-from utils.model_list import get_gemini_models_list, get_groq_models_list
+from utils.model_catalog import model_catalog
+from utils.context_window import fit_conversation
 from contextlib import asynccontextmanager
-from utils.schemas import ModelResponse, ModelRequest, ModelID, ChatRequest, Message, RequestState
+from utils.schemas import ModelResponse, ModelRequest, ModelID, ChatRequest, Message, RequestState, WarmupRequest, SearchPrefetchRequest
 from utils.query_func import chat_ollama, chat_huggingface, chat_openrouter, chat_groq, chat_gemini
+from utils.client_pool import client_pool
+from utils.search_service import search_service
+from utils.request_registry import request_registry
+from utils.admission import admission, AdmissionRejected, AdmissionTimeout
+from utils.sse import format_chunk, format_event, format_error
+from utils.response_cache import response_cache
+from utils.metrics import metrics, current_timings, record_stage, span
+from utils.warmup import PRELOAD, warm_up
+from utils.ollama_residency import OLLAMA_PRELOAD_MODELS, ollama_residency
+from utils.search_prefetch import search_prefetcher
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await search_service.start()
+    preload = None
+    if PRELOAD:
+        # Serve requests right away, preloaded components become warm in the background
+        preload = asyncio.create_task(preload_components(PRELOAD.split(",")))
+    preload_models = None
+    if OLLAMA_PRELOAD_MODELS:
+        preload_models = asyncio.create_task(preload_ollama_models(OLLAMA_PRELOAD_MODELS.split(",")))
+    yield
+    # Cleanup on shutdown
+    for task in (preload, preload_models):
+        if task is not None:
+            task.cancel()
+    request_registry.cancel_all("server shutting down")
+    search_prefetcher.cancel_all()
+    await search_service.stop()
+    await client_pool.aclose()
+    print("Closed pooled provider clients")
+
+async def preload_components(components: list[str]):
+    try:
+        print(f"Preloaded components: {await warm_up(components)}")
+    except Exception as e:
+        print(f"Error preloading components: {e}", file=sys.stderr)
+
+async def preload_ollama_models(models: list[str]):
+    try:
+        print(f"Preloaded Ollama models: {await ollama_residency.preload(models)}")
+    except Exception as e:
+        print(f"Error preloading Ollama models: {e}", file=sys.stderr)
+
 app = FastAPI(
     title="LLM Chat API",
     description="API for interacting with various LLM models with streaming support",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -32,26 +73,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Initialize request state storage on startup
-    app.state.active_requests = set()
-    print("Initialized active_requests set")
-    yield
-    # Cleanup on shutdown
-    app.state.active_requests.clear()
-    print("Cleared active_requests set")
-
-app.lifespan = lifespan
-
-async def format_chunk(content: str, model: str) -> str:
-    """Format a chunk for SSE streaming"""
-    data = {
-        "content": content,
-        "model": model
-    }
-    return f"data: {json.dumps(data)}\n\n"
-
 # def format_conversation_with_prompt(conversation: List[Message], web_search_bool: bool = False) -> List[Message]:
 #     # Format the last user message with the base prompt and return the updated conversation
 #     if not conversation:
@@ -85,91 +106,6 @@ async def format_chunk(content: str, model: str) -> str:
     
 #     return history + [formatted_message] , sources
 
-async def run_web_search_and_get_context_async(prompt: str) -> str | None:
-    
-    script_name = "C4AI_web_search.py" # Make sure this filename is correct
-    script_path = os.path.join(os.getcwd(), "python-backend", "utils", script_name)
-
-    if not os.path.exists(script_path):
-        print(f"Error: The script '{script_path}' was not found.", file=sys.stderr)
-        return None
-
-    # Command arguments for asyncio.create_subprocess_exec
-    # The program itself (sys.executable) is the first argument here
-    command_args = [script_path, prompt]
-
-    print(f"Running command async: {sys.executable} {' '.join(command_args)}", file=sys.stderr)
-
-    process = None # Initialize process variable
-    try:
-        # Start the subprocess asynchronously
-        process = await asyncio.create_subprocess_exec(
-            sys.executable,             # Program to execute
-            *command_args,              # Arguments to the program
-            stdout=asyncio.subprocess.PIPE, # Capture stdout
-            stderr=asyncio.subprocess.PIPE, # Capture stderr
-            env=process_env             # Pass the modified environment
-        )
-
-        # Wait for the subprocess to complete and read stdout/stderr
-        # Set a timeout for the communication
-        timeout_seconds = 300
-        try:
-            stdout_data, stderr_data = await asyncio.wait_for(
-                process.communicate(), timeout=timeout_seconds
-            )
-        except asyncio.TimeoutError:
-            print(f"Error: Subprocess timed out after {timeout_seconds} seconds.", file=sys.stderr)
-            # Attempt to kill the process if it timed out
-            if process.returncode is None: # Check if it's still running
-                try:
-                    process.kill()
-                    await process.wait() # Ensure it's terminated
-                    print("Subprocess killed due to timeout.", file=sys.stderr)
-                except ProcessLookupError:
-                    print("Subprocess already finished before kill attempt.", file=sys.stderr) # Process finished between timeout and kill
-                except Exception as kill_err:
-                    print(f"Error trying to kill timed-out process: {kill_err}", file=sys.stderr)
-            return None # Return None on timeout
-
-        # Decode the output (assuming utf-8, handle potential errors)
-        stdout_str = stdout_data.decode('utf-8', errors='ignore').strip()
-        stderr_str = stderr_data.decode('utf-8', errors='ignore').strip()
-
-        # Check the return code AFTER communication is complete
-        if process.returncode == 0:
-            # Success! Print stderr if there was any (for debugging)
-            if stderr_str:
-                print("--- Subprocess stderr (async run) ---", file=sys.stderr)
-                print(stderr_str, file=sys.stderr)
-                print("--- End subprocess stderr (async run) ---", file=sys.stderr)
-            # Return the captured stdout
-            return stdout_str
-        else:
-            # The subprocess failed
-            print(f"Error: Subprocess failed with return code {process.returncode}", file=sys.stderr)
-            print(f"--- Subprocess stdout (if any) ---", file=sys.stderr)
-            print(stdout_str, file=sys.stderr) # Print captured stdout on failure
-            print(f"--- Subprocess stderr ---", file=sys.stderr)
-            print(stderr_str, file=sys.stderr) # Print captured stderr on failure
-            print(f"--- End subprocess error output ---", file=sys.stderr)
-            return None
-
-    except FileNotFoundError:
-        # This error happens if sys.executable itself is invalid
-        print(f"Error: Python interpreter '{sys.executable}' not found.", file=sys.stderr)
-        return None
-    except Exception as e:
-        # Catch other potential errors during process creation or communication
-        print(f"An unexpected error occurred during async subprocess execution: {e}", file=sys.stderr)
-        # Ensure process is cleaned up if it exists and hasn't finished
-        if process and process.returncode is None:
-             try:
-                 process.kill()
-                 await process.wait()
-             except Exception: pass # Ignore errors during cleanup after another error
-        return None
-
 def filter_conversation(conversation: List[Message]) -> List[Message]:
     # Filter out empty or invalid messages from the conversation
     def is_valid_content(content: str) -> bool:
@@ -191,7 +127,7 @@ async def get_gemini_models(request: ModelRequest):
     try:
 
         # Get available models
-        models = get_gemini_models_list(api_key=request.api_key)
+        models = await model_catalog.gemini(api_key=request.api_key)
         
         response = ModelResponse(
             data=[ModelID(id=model) for model in models]
@@ -206,7 +142,7 @@ async def get_groq_models(request: ModelRequest):
     try:
         
         # Get available models
-        models = get_groq_models_list(api_key=request.api_key)
+        models = await model_catalog.groq(api_key=request.api_key)
                
         response = ModelResponse(
             data=[ModelID(id=model.get('id')) for model in models]
@@ -216,30 +152,182 @@ async def get_groq_models(request: ModelRequest):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.get("/api/ollama/models")
+async def get_ollama_models():
+    try:
+
+        # Get locally installed models
+        models = await model_catalog.ollama()
+
+        response = ModelResponse(
+            data=[ModelID(id=model) for model in models]
+        )
+
+        return response
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/ollama/residency")
+async def get_ollama_residency():
+    try:
+        # Loaded models, their memory and keep-alive, and the residency counters
+        return await ollama_residency.state()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def collect_stats() -> dict:
+    return {
+        "clients": client_pool.stats(),
+        "search": search_service.stats(),
+        "model_catalog": model_catalog.stats(),
+        "active_requests": len(request_registry),
+        "admission": admission.stats(),
+        "response_cache": response_cache.stats(),
+        "ollama_residency": ollama_residency.stats(),
+        "search_prefetch": search_prefetcher.stats(),
+    }
+
+metrics.register_stats("stats", collect_stats)
+
+@app.get("/api/stats")
+async def get_stats():
+    return collect_stats()
+
+@app.post("/api/warmup")
+async def warmup(request: WarmupRequest):
+    try:
+        return {"loaded": await warm_up(request.components)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/search/prefetch")
+async def prefetch_search(request: SearchPrefetchRequest):
+    # Called by the UI while the user is typing, /api/chat picks the result up
+    async def search(prompt: str):
+        async with admission.limiter("prefetch").acquire():
+            return await search_service.search(prompt, time_budget=request.search_time_budget)
+
+    return search_prefetcher.start(request.prompt, search, request.session_id)
+
+@app.get("/metrics")
+async def get_metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+SUPPORTED_PROVIDERS = {"ollama", "huggingface", "openrouter", "groq", "gemini"}
 
 @app.post("/api/chat")
-async def chat(request: ChatRequest, background_tasks: BackgroundTasks):
-    # Add request to active requests
-    request_id = id(request)
-    
-    # Ensure active_requests exists
-    if not hasattr(app.state, 'active_requests'):
-        app.state.active_requests = set()
-    
-    app.state.active_requests.add(request_id)
-    print(f"Added request {request_id} to active_requests")
-    
-    # Add cleanup task
-    async def cleanup():
-        if hasattr(app.state, 'active_requests'):
-            app.state.active_requests.remove(request_id)
-            print(f"Removed request {request_id} from active_requests")
-    
-    background_tasks.add_task(cleanup)
+async def chat(request: ChatRequest, http_request: Request):
+    provider = request.model.provider.lower()
+    if provider not in SUPPORTED_PROVIDERS:
+        raise HTTPException(status_code=400, detail=f"Unsupported provider: {provider}")
 
     # Filter out empty messages before any processing
     request.conversation = filter_conversation(request.conversation)
+    if not request.conversation:
+        raise HTTPException(status_code=400, detail="Conversation is empty")
+
+    # Slots are only taken once the prompt is ready, but an overloaded server answers 429 immediately
+    try:
+        for name in (f"provider:{provider}", "chat"):
+            admission.limiter(name).check()
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+
+    # The id goes out in the headers, the body registers the request when it starts
+    state = request_registry.create()
+    return StreamingResponse(
+        chat_events(request, state, http_request),
+        media_type="text/event-stream",
+        headers={"X-Request-ID": state.request_id},
+    )
+
+@app.post("/api/chat/{request_id}/cancel")
+async def cancel_chat(request_id: str):
+    if not request_registry.cancel(request_id, "cancelled by client"):
+        raise HTTPException(status_code=404, detail=f"Unknown request: {request_id}")
+    return {"request_id": request_id, "cancelled": True}
 
+async def chat_events(request: ChatRequest, state: RequestState, http_request: Request):
+    model = request.model.name
+    provider = request.model.provider.lower()
+    tickets = []
+    try:
+        # Registered here so that the finally below is sure to release it
+        request_registry.register(http_request, state)
+        print(f"Registered request {state.request_id}")
+        yield format_event(model, request_id=state.request_id)
+
+        # Repeated questions are answered from the cache without queueing for the provider
+        with span("chat.cache_lookup", state.timings):
+            cache_keys, query_embedding = await response_cache_keys(request)
+            cached, tier = response_cache.lookup(*cache_keys, query_embedding)
+        if cached is not None:
+            print(f"Response cache: {tier} hit")
+            yield format_event(model, sources=cached.sources, cached=tier)
+            for piece in cached.pieces:
+                yield await format_chunk(piece, model)
+            if request.timings:
+                yield timings_event(model, state)
+            return
+
+        # Search and prompt building hold no slot, a chat waiting for a busy provider
+        # must not keep other providers' chats out while it searches
+        await prepare_chat(request, state)
+        if state.sources:
+            yield format_event(model, sources=state.sources)
+
+        # The provider slot first, then a chat slot, telling the client where it stands
+        with span("chat.queue", state.timings):
+            for name in (f"provider:{provider}", "chat"):
+                ticket = admission.limiter(name).enqueue()
+                tickets.append(ticket)
+                async for position in ticket.limiter.wait(ticket, stop=state.cancelled):
+                    yield format_event(model, queue_position=position, queue=ticket.limiter.name)
+                if state.is_disconnected():
+                    print(f"Request {state.request_id} stopped while queued: {state.cancel_reason}")
+                    return
+
+        frames = await handle_chat_request(request, state, provider)
+        async for frame in frames:
+            yield frame
+
+        if state.completed:
+            response_cache.put(*cache_keys, state.response, state.sources, query_embedding)
+        if request.timings:
+            yield timings_event(model, state)
+
+    except AdmissionRejected as e:
+        yield format_error(str(e), status=429)
+    except AdmissionTimeout as e:
+        yield format_error(str(e), status=503)
+    except asyncio.CancelledError:
+        if not state.is_disconnected():
+            raise
+        print(f"Request {state.request_id} stopped: {state.cancel_reason}")
+    finally:
+        for ticket in tickets:
+            ticket.limiter.release(ticket)
+        record_stage("chat.total", state.timings.elapsed())
+        state.finish()
+
+def timings_event(model: str, state: RequestState) -> str:
+    return format_event(model, timings={**state.timings.as_dict(), "chat.total": round(state.timings.elapsed(), 4)})
+
+async def response_cache_keys(request: ChatRequest):
+    """Exact key and semantic scope of the request, plus the question embedding when the semantic tier is requested"""
+    provider = request.model.provider.lower()
+    keys = response_cache.keys(provider, request.model.name, request.model.key, request.conversation, request.web_search)
+
+    query_embedding = None
+    if request.semantic_cache and response_cache.enabled:
+        embedding_batcher = await search_service.embedding_batcher()
+        async with admission.limiter("embedding").acquire():
+            [query_embedding] = await embedding_batcher.embed([request.conversation[-1].content])
+
+    return keys, query_embedding
+
+async def prepare_chat(request: ChatRequest, state: RequestState):
     print(f"Provider: {request.model.provider}")
     print(f"Model Name: {request.model.name}")
     print(f"Web Search: {request.web_search}")
@@ -247,16 +335,18 @@ async def chat(request: ChatRequest, background_tasks: BackgroundTasks):
     history = request.conversation[:-1]
     last_message = request.conversation[-1]
         
+    sources = []
     if request.web_search:
-        web_search_results = await run_web_search_and_get_context_async(last_message.content)
+        # Tracked so a disconnect or cancel aborts the search immediately
+        search_task = state.track(asyncio.create_task(run_web_search(request, state, last_message.content)))
+        with span("chat.search", state.timings):
+            search_result = await search_task
+        web_search_results, sources = search_result or ("", [])
     else:
         web_search_results = ""
-        # sources = []
 
-    # sources = []
     system_prompt = web_search_results
     print(web_search_results)
-    # sources = sources + sources
 
     if system_prompt:
         formatted_prompt = prompt_with_context(context=web_search_results, query=last_message.content)
@@ -270,10 +360,23 @@ async def chat(request: ChatRequest, background_tasks: BackgroundTasks):
     
     request.conversation = history + [formatted_message]
 
-    # Create request state
-    state = RequestState(request_id, app)
-
-    return await handle_chat_request(request, state, request.model.provider.lower())
+    # Keep long chats within the model's context window
+    with span("chat.context", state.timings):
+        request.conversation, context_stats = fit_conversation(request.conversation, request.model.provider.lower(), request.model.name)
+    print(f"Context: sending ~{context_stats['tokens']} tokens in {context_stats['messages']} message(s), "
+          f"dropped {context_stats['dropped']} (budget {context_stats['budget']})")
+
+    state.sources = sources
+
+async def run_web_search(request: ChatRequest, state: RequestState, prompt: str):
+    # Runs in its own task, the search pipeline's spans are added to this request
+    current_timings.set(state.timings)
+    # A search started from the draft of this question may already be done
+    prefetched = await search_prefetcher.take(prompt, request.session_id)
+    if prefetched is not None:
+        return prefetched
+    async with admission.limiter("search").acquire():
+        return await search_service.search(prompt, time_budget=request.search_time_budget)
 
 async def handle_chat_request(chat_request: ChatRequest, state: RequestState, provider: str):
     if provider == "ollama":
@@ -0,0 +1,120 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def article(text: str) -> bytes:
+    """An HTML page whose extracted text passes the fetcher's minimum length"""
+    return f"<html><body><article>{f'<p>{text}</p>' * 12}</article></body></html>".encode("utf-8")
+
+
+class FixtureServer:
+    """
+    Local HTTP stand-in serving a readable article per path, counting requests
+    and connections. `responses` overrides a path with (status, content type, body),
+    `validators` sends ETag / Last-Modified headers for a path and answers matching
+    conditional requests with 304, `delays` holds a path's answer for some seconds
+    and `streams` sends a path's answer as (content type, chunks, seconds between
+    chunks) with chunked encoding. POST bodies are recorded in `posts` as (path,
+    decoded JSON).
+    """
+
+    def __init__(self):
+        self.requests: Counter[str] = Counter()
+        self.not_modified: Counter[str] = Counter()
+        self.responses: dict[str, tuple[int, str, bytes]] = {}
+        self.validators: dict[str, dict[str, str]] = {}
+        self.delays: dict[str, float] = {}
+        self.streams: dict[str, tuple[str, list[bytes], float]] = {}
+        self.posts: list[tuple[str, object]] = []
+        self.connections = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                server.connections += 1
+
+            def do_GET(self):
+                self.respond()
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                server.posts.append((self.path, json.loads(body) if body else None))
+                self.respond()
+
+            def respond(self):
+                server.requests[self.path] += 1
+                time.sleep(server.delays.get(self.path, 0))
+                validators = server.validators.get(self.path, {})
+                if self.not_modified_since(validators):
+                    server.not_modified[self.path] += 1
+                    self.send_response(304)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                if self.path in server.streams:
+                    self.stream(*server.streams[self.path])
+                    return
+
+                default = (200, "text/html; charset=utf-8", article(f"This fixture article lives at {self.path} and is long enough to pass text extraction."))
+                status, content_type, body = server.responses.get(self.path, default)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in validators.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def stream(self, content_type: str, chunks: list[bytes], interval: float):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i, chunk in enumerate(chunks):
+                    if i:
+                        time.sleep(interval)
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+            def not_modified_since(self, validators: dict[str, str]) -> bool:
+                etag = validators.get("ETag")
+                last_modified = validators.get("Last-Modified")
+                return bool(
+                    (etag and self.headers.get("If-None-Match") == etag)
+                    or (last_modified and self.headers.get("If-Modified-Since") == last_modified)
+                )
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture
+def fixture_server():
+    server = FixtureServer()
+    yield server
+    server.close()
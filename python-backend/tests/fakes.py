@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+
+class FakeStream:
+    """
+    Provider stream stand-in: `tokens` deltas, `interval` seconds apart after a
+    `first_token_latency` wait. `closed_at` is set when the stream is closed or
+    abandoned, the moment its upstream resources would be released.
+    """
+
+    def __init__(self, tokens: int = 20, interval: float = 0.01, first_token_latency: float = 0.0, text: str = "token "):
+        self.tokens = tokens
+        self.interval = interval
+        self.first_token_latency = first_token_latency
+        self.text = text
+        self.sent = 0
+        self.closed_at: float | None = None
+
+    async def deltas(self):
+        try:
+            await asyncio.sleep(self.first_token_latency)
+            for i in range(self.tokens):
+                if i:
+                    await asyncio.sleep(self.interval)
+                self.sent += 1
+                yield self.text
+        finally:
+            self.closed_at = time.perf_counter()
+
+
+class FakeSearch:
+    """
+    Web search stand-in answering (context, sources) after `delay` seconds,
+    raising instead when `fail` is set. Records the prompts it was called with
+    and the ones that were cancelled.
+    """
+
+    def __init__(self, delay: float = 0.05, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.calls: list[str] = []
+        self.cancelled: list[str] = []
+
+    async def __call__(self, prompt: str) -> tuple[str, list[str]]:
+        self.calls.append(prompt)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(prompt)
+            raise
+        if self.fail:
+            raise RuntimeError("search failed")
+        return f"context for {prompt}", [f"https://example.com/{len(self.calls)}"]
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from fakes import FakeStream
+from utils.admission import ConcurrencyLimiter
+from utils.query_func import stream_deltas
+from utils.schemas import ChatRequest, Message, ModelInfo, RequestState
+
+
+def chat_request() -> ChatRequest:
+    return ChatRequest(
+        model=ModelInfo(provider="ollama", name="fake-model", key=""),
+        conversation=[Message(role="user", content="hello")],
+    )
+
+
+def test_disconnect_closes_the_upstream_stream_within_milliseconds():
+    async def main():
+        # A slow model: the next delta would only come a minute later
+        stream = FakeStream(tokens=3, interval=60)
+        state = RequestState("request")
+        frames = stream_deltas(stream.deltas(), chat_request(), state)
+
+        first = await frames.__anext__()
+        consumer = asyncio.create_task(anext(frames, None))
+        await asyncio.sleep(0.05)
+
+        disconnected_at = time.perf_counter()
+        state.cancel("client disconnected")
+        assert await asyncio.wait_for(consumer, timeout=1) is None
+        return first, stream, stream.closed_at - disconnected_at, state
+
+    first, stream, released_after, state = asyncio.run(main())
+
+    assert '"content": "token "' in first
+    assert stream.sent == 1
+    assert released_after < 0.05
+    assert not state.completed
+
+
+def test_disconnect_leaves_the_queue_within_milliseconds():
+    async def main():
+        limiter = ConcurrencyLimiter("provider:fake", 1, queue_timeout=60)
+        holder = limiter.enqueue()
+        state = RequestState("request")
+        ticket = limiter.enqueue()
+
+        async def queued():
+            return [position async for position in limiter.wait(ticket, stop=state.cancelled)]
+
+        waiter = asyncio.create_task(queued())
+        await asyncio.sleep(0.05)
+        disconnected_at = time.perf_counter()
+        state.cancel("client disconnected")
+        positions = await asyncio.wait_for(waiter, timeout=1)
+        left_after = time.perf_counter() - disconnected_at
+
+        stats = limiter.stats()
+        limiter.release(holder)
+        return positions, left_after, stats, limiter.stats()
+
+    positions, left_after, queued_stats, final_stats = asyncio.run(main())
+
+    assert positions == [1]
+    assert left_after < 0.05
+    assert queued_stats["waiting"] == 0
+    # The released slot is not handed to the request that went away
+    assert final_stats["active"] == 0
+
+
+def test_task_tracked_after_cancel_is_cancelled():
+    async def main():
+        state = RequestState("request")
+        state.cancel("cancelled by client")
+        task = state.track(asyncio.create_task(asyncio.sleep(60)))
+        await asyncio.gather(task, return_exceptions=True)
+        return task
+
+    assert asyncio.run(main()).cancelled()
@@ -0,0 +1,63 @@
+import asyncio
+
+import httpx
+
+from utils.client_pool import ClientPool
+
+
+def http_client_factory(transport):
+    client = httpx.AsyncClient(transport=transport)
+    return client, client.aclose
+
+
+async def get(pool: ClientPool, url: str, api_key: str = "key"):
+    async with pool.lease("stand-in", api_key, url, http_client_factory) as client:
+        response = await client.get(f"{url}/v1/models")
+        response.raise_for_status()
+
+
+def test_repeated_requests_reuse_one_connection(fixture_server):
+    async def main():
+        pool = ClientPool()
+        for _ in range(50):
+            await get(pool, fixture_server.url)
+        stats = pool.stats()
+        await pool.aclose()
+        return stats
+
+    stats = asyncio.run(main())
+
+    assert stats["requests"] == 50
+    assert stats["clients_created"] == 1
+    assert stats["connections_opened"] == 1
+    assert fixture_server.connections == 1
+
+
+def test_connect_count_stays_flat_under_concurrent_rounds(fixture_server):
+    async def main():
+        pool = ClientPool()
+        opened = []
+        for _ in range(5):
+            await asyncio.gather(*(get(pool, fixture_server.url) for _ in range(8)))
+            opened.append(pool.stats()["connections_opened"])
+        await pool.aclose()
+        return opened
+
+    opened = asyncio.run(main())
+
+    # The first round opens up to one connection per concurrent request, later rounds reuse them
+    assert opened[0] <= 8
+    assert opened[-1] == opened[0]
+    assert fixture_server.connections == opened[0]
+
+
+def test_client_per_request_connects_every_time(fixture_server):
+    async def main():
+        for _ in range(10):
+            pool = ClientPool()
+            await get(pool, fixture_server.url)
+            await pool.aclose()
+
+    asyncio.run(main())
+
+    assert fixture_server.connections == 10
@@ -0,0 +1,36 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from utils.context_compression import compress_context
+from utils.vector_index import VectorIndex
+
+FILLER = "This sentence is about something else entirely and pads the page. "
+
+
+def chunk(source: str, start: int, text: str) -> Document:
+    return Document(page_content=text, metadata={"source": source, "start_index": start})
+
+
+def test_keeps_the_answering_sentences_with_the_retrieval_vectors():
+    chunks = [
+        chunk("https://a.example", 0, FILLER * 6 + "The Eiffel Tower is 330 metres tall. " + FILLER * 6),
+        chunk("https://b.example", 0, FILLER * 12),
+    ]
+    index = VectorIndex()
+    index.add(chunks, [[1.0, 0.0], [0.0, 1.0]])
+
+    context = compress_context(chunks, "How tall is the Eiffel Tower?", [1.0, 0.1], index.vectors(chunks), token_budget=40)
+
+    assert context.startswith("Source: https://a.example\n")
+    assert "The Eiffel Tower is 330 metres tall." in context
+    assert "https://b.example" not in context
+
+
+def test_vectors_follow_the_order_asked_for():
+    documents = [chunk("s", i, f"chunk {i}") for i in range(3)]
+    index = VectorIndex()
+    index.add(documents, np.eye(3))
+
+    vectors = index.vectors([documents[2], documents[0]])
+
+    assert vectors.tolist() == [[0.0, 0.0, 1.0], [1.0, 0.0, 0.0]]
@@ -0,0 +1,53 @@
+import asyncio
+
+from utils.embedding_batcher import EmbeddingBatcher
+
+
+class RecordingModel:
+    """Embedding model stand-in whose vector for a text is [len(text), index of the text]"""
+
+    def __init__(self, texts: list[str]):
+        self.texts = texts
+        self.batches: list[list[str]] = []
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.batches.append(list(texts))
+        return [[float(len(text)), float(self.texts.index(text))] for text in texts]
+
+
+def test_concurrent_callers_share_one_forward_pass():
+    callers = [["alpha"], ["beta", "gamma"], ["delta", "epsilon", "zeta"], ["eta"]]
+    model = RecordingModel([text for texts in callers for text in texts])
+
+    async def main():
+        batcher = EmbeddingBatcher(model.embed_documents, max_batch=64, max_wait=0.05)
+        try:
+            return await asyncio.gather(*(batcher.embed(texts) for texts in callers)), batcher.stats()
+        finally:
+            await batcher.stop()
+
+    results, stats = asyncio.run(main())
+
+    assert len(model.batches) == 1
+    assert sorted(model.batches[0]) == sorted(model.texts)
+    for texts, vectors in zip(callers, results):
+        assert vectors == [[float(len(text)), float(model.texts.index(text))] for text in texts]
+    assert stats["batches"] == 1
+    assert stats["texts"] == 7
+
+
+def test_batches_are_capped_at_max_batch():
+    texts = [f"text {i}" for i in range(10)]
+    model = RecordingModel(texts)
+
+    async def main():
+        batcher = EmbeddingBatcher(model.embed_documents, max_batch=4, max_wait=0.05)
+        try:
+            return await asyncio.gather(*(batcher.embed([text]) for text in texts))
+        finally:
+            await batcher.stop()
+
+    results = asyncio.run(main())
+
+    assert [len(batch) for batch in model.batches] == [4, 4, 2]
+    assert results == [[[float(len(text)), float(i)]] for i, text in enumerate(texts)]
@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+import numpy as np
+
+from utils import embedding_cache
+from utils.embedding_cache import EmbeddingCache
+
+
+class CountingEmbedder:
+    """Embedding model stand-in returning a vector derived from the text, counting texts embedded"""
+
+    def __init__(self, dim: int = 8):
+        self.dim = dim
+        self.embedded = 0
+
+    def vector(self, text: str) -> list[float]:
+        return np.random.default_rng(abs(hash(text)) % 2**32).standard_normal(self.dim).tolist()
+
+    async def __call__(self, texts: list[str]) -> list[list[float]]:
+        self.embedded += len(texts)
+        return [self.vector(text) for text in texts]
+
+
+def test_saved_index_is_reloaded(tmp_path, monkeypatch):
+    # Several chunks per save
+    monkeypatch.setattr(embedding_cache, "EMBEDDING_CACHE_INDEX_CHUNK", 3)
+    embedder = CountingEmbedder()
+    texts = [f"text {i}" for i in range(10)]
+
+    async def main():
+        cache = EmbeddingCache("model", directory=str(tmp_path), max_entries=16)
+        await cache.embed_documents(texts, embedder)
+        cache.save()
+
+        reopened = EmbeddingCache("model", directory=str(tmp_path), max_entries=16)
+        return await reopened.embed_documents(texts, embedder)
+
+    vectors = asyncio.run(main())
+
+    assert embedder.embedded == 10
+    for text, vector in zip(texts, vectors):
+        np.testing.assert_allclose(vector, embedder.vector(text), rtol=1e-2, atol=1e-2)
+    with open(tmp_path / "model.index.json", encoding="utf-8") as f:
+        assert len(json.load(f)["entries"]) == 10
+
+
+def test_slot_reused_after_the_last_save_is_not_served_for_the_evicted_text(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "EMBEDDING_CACHE_SAVE_EVERY", 1000)
+    embedder = CountingEmbedder()
+    texts = [f"text {i}" for i in range(4)]
+
+    async def main():
+        cache = EmbeddingCache("model", directory=str(tmp_path), max_entries=4)
+        await cache.embed_documents(texts, embedder)
+        cache.save()
+        # Evicts "text 0" and overwrites its slot, then the process dies before the next save
+        await cache.embed_documents(["text 4"], embedder)
+
+        reopened = EmbeddingCache("model", directory=str(tmp_path), max_entries=4)
+        return await reopened.embed_documents(texts, embedder), reopened.stats()
+
+    vectors, stats = asyncio.run(main())
+
+    np.testing.assert_allclose(vectors[0], embedder.vector("text 0"), rtol=1e-2, atol=1e-2)
+    assert stats["hits"] == 3
+    assert embedder.embedded == 6
@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from utils import model_list
+from utils.client_pool import ClientPool
+from utils.model_catalog import ModelCatalog
+
+MODELS_PATH = "/openai/v1/models"
+
+
+@pytest.fixture
+def groq(fixture_server, monkeypatch):
+    """The fixture server standing in for the Groq API, with a pool of its own"""
+    monkeypatch.setattr(model_list, "GROQ_BASE_URL", fixture_server.url)
+    monkeypatch.setattr(model_list, "client_pool", ClientPool())
+    return fixture_server
+
+
+def serve_models(server, *model_ids: str):
+    body = json.dumps({"data": [{"id": model_id} for model_id in model_ids]}).encode("utf-8")
+    server.responses[MODELS_PATH] = (200, "application/json", body)
+
+
+def serve_error(server, status: int):
+    server.responses[MODELS_PATH] = (status, "application/json", b'{"error": {"message": "upstream failure"}}')
+
+
+def test_failed_list_is_raised_not_cached_as_empty(groq):
+    serve_error(groq, 503)
+
+    async def main():
+        catalog = ModelCatalog()
+        with pytest.raises(httpx.HTTPStatusError):
+            await catalog.groq("key")
+
+        # The failure was not stored, the next call goes upstream again and gets the list
+        serve_models(groq, "llama-3.3-70b")
+        models = await catalog.groq("key")
+        again = await catalog.groq("key")
+        await model_list.client_pool.aclose()
+        return models, again
+
+    models, again = asyncio.run(main())
+
+    assert [model["id"] for model in models] == ["llama-3.3-70b"]
+    assert again == models
+    assert groq.requests[MODELS_PATH] == 2
+
+
+def test_concurrent_requests_share_one_upstream_call(groq):
+    serve_models(groq, "llama-3.3-70b", "gemma2-9b-it")
+
+    async def main():
+        catalog = ModelCatalog()
+        results = await asyncio.gather(*(catalog.groq("key") for _ in range(10)))
+        await catalog.groq("key")
+        await model_list.client_pool.aclose()
+        return results, catalog.stats()["remote"]
+
+    results, stats = asyncio.run(main())
+
+    assert all(result == results[0] for result in results)
+    assert groq.requests[MODELS_PATH] == 1
+    assert stats["loads"] == 1
+
+
+def test_api_keys_get_separate_lists(groq):
+    serve_models(groq, "llama-3.3-70b")
+
+    async def main():
+        catalog = ModelCatalog()
+        for api_key in ("first", "second", "first", "second"):
+            await catalog.groq(api_key)
+        await model_list.client_pool.aclose()
+
+    asyncio.run(main())
+
+    assert groq.requests[MODELS_PATH] == 2
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from utils import ollama_residency as residency_module
+from utils.client_pool import ClientPool
+from utils.ollama_residency import OllamaResidency
+
+GB = 2**30
+
+
+@pytest.fixture
+def ollama(fixture_server, monkeypatch):
+    """The fixture server standing in for Ollama, with a pool of its own"""
+    monkeypatch.setattr(residency_module, "client_pool", ClientPool())
+    serve(fixture_server, "/api/generate", {"done": True})
+    return fixture_server
+
+
+def serve(server, path: str, data: dict):
+    server.responses[path] = (200, "application/json", json.dumps(data).encode("utf-8"))
+
+
+def serve_models(server, resident: dict[str, int], installed: dict[str, int]):
+    serve(server, "/api/ps", {"models": [{"name": name, "model": name, "size": size} for name, size in resident.items()]})
+    serve(server, "/api/tags", {"models": [{"name": name, "model": name, "size": size} for name, size in installed.items()]})
+
+
+def unloaded(server) -> list[str]:
+    return [body["model"] for path, body in server.posts if path == "/api/generate" and body["keep_alive"] == 0]
+
+
+def run(main):
+    async def wrapper():
+        try:
+            return await main()
+        finally:
+            await residency_module.client_pool.aclose()
+    return asyncio.run(wrapper())
+
+
+def test_make_room_unloads_the_least_recently_used_idle_model(ollama):
+    serve_models(ollama, {"a:latest": 4 * GB, "b:latest": 4 * GB}, {"a:latest": 4 * GB, "b:latest": 4 * GB, "c:latest": 4 * GB})
+    residency = OllamaResidency(host=ollama.url, memory_budget=9 * GB, ps_ttl=0)
+    residency.last_used = {"a:latest": time.monotonic() - 60, "b:latest": time.monotonic()}
+
+    async def main():
+        async with residency.lease("c"):
+            pass
+
+    run(main)
+
+    assert unloaded(ollama) == ["a:latest"]
+    assert residency.stats()["evictions"] == 1
+    assert residency.stats()["misses"] == 1
+
+
+def test_models_in_use_are_never_evicted(ollama):
+    serve_models(ollama, {"a:latest": 4 * GB, "b:latest": 4 * GB}, {"a:latest": 4 * GB, "b:latest": 4 * GB, "c:latest": 4 * GB})
+    residency = OllamaResidency(host=ollama.url, memory_budget=9 * GB, ps_ttl=0)
+    residency.last_used = {"a:latest": time.monotonic() - 60, "b:latest": time.monotonic()}
+
+    async def main():
+        # a is streaming a chat, so b goes although it was used more recently
+        async with residency.lease("a"):
+            async with residency.lease("c"):
+                pass
+
+    run(main)
+
+    assert unloaded(ollama) == ["b:latest"]
+    assert residency.stats()["hits"] == 1
+
+
+def test_resident_model_within_budget_unloads_nothing(ollama):
+    serve_models(ollama, {"a:latest": 4 * GB}, {"a:latest": 4 * GB, "c:latest": 4 * GB})
+    residency = OllamaResidency(host=ollama.url, memory_budget=9 * GB, ps_ttl=0)
+
+    async def main():
+        async with residency.lease("a"):
+            pass
+        async with residency.lease("c"):
+            pass
+
+    run(main)
+
+    assert unloaded(ollama) == []
+    assert residency.stats()["hits"] == 1
+    assert residency.stats()["misses"] == 1
+
+
+def test_lease_sends_the_model_keep_alive(ollama):
+    serve_models(ollama, {}, {})
+    residency = OllamaResidency(host=ollama.url, keep_alive="30m", keep_alive_overrides="a=-1,b:7b=300,c=1.5", ps_ttl=0)
+
+    async def main():
+        keep_alives = []
+        for model in ("a", "a:latest", "b:7b", "b", "c"):
+            async with residency.lease(model) as keep_alive:
+                keep_alives.append(keep_alive)
+        return keep_alives
+
+    keep_alives = run(main)
+
+    # Plain numbers are seconds sent as numbers, "b" is b:latest and gets the default
+    assert keep_alives == [-1, -1, 300, "30m", 1.5]
+
+
+def test_hung_daemon_does_not_hold_the_lease(ollama):
+    serve_models(ollama, {}, {})
+    ollama.delays["/api/ps"] = 1.0
+    residency = OllamaResidency(host=ollama.url, request_timeout=0.1, ps_ttl=0)
+
+    async def main():
+        started = time.perf_counter()
+        async with residency.lease("a") as keep_alive:
+            pass
+        return keep_alive, time.perf_counter() - started
+
+    keep_alive, elapsed = run(main)
+
+    assert keep_alive == residency.default_keep_alive
+    assert elapsed < 0.5
+    assert residency.stats()["errors"] == 1
@@ -0,0 +1,145 @@
+import asyncio
+import time
+
+from conftest import article
+from utils.page_cache import PageCache
+from utils.page_fetcher import PageFetcher
+from utils.search_engines import url_identity
+
+
+async def load_pages(cache: PageCache, fetcher: PageFetcher, urls: list[str]) -> list[str]:
+    """The page cache lookup of web search: serve from cache, fetch and store on a miss"""
+    pages = []
+    for url in urls:
+        markdown = await cache.get(url_identity(url), url)
+        if markdown is None:
+            page = await fetcher.fetch(url)
+            await cache.put(url_identity(url), url, page.markdown, headers=page.headers)
+            markdown = page.markdown
+        pages.append(markdown)
+    return pages
+
+
+def test_distinct_paths_do_not_share_a_cache_entry(tmp_path, fixture_server):
+    urls = [f"{fixture_server.url}{path}" for path in ("/a-b", "/a_b", "/a/b", "/a.b")]
+
+    async def main():
+        cache, fetcher = PageCache(str(tmp_path)), PageFetcher()
+        try:
+            first = await load_pages(cache, fetcher, urls)
+            second = await load_pages(cache, fetcher, urls)
+        finally:
+            await fetcher.aclose()
+            await cache.aclose()
+        return first, second
+
+    first, second = asyncio.run(main())
+
+    assert fixture_server.requests == {"/a-b": 1, "/a_b": 1, "/a/b": 1, "/a.b": 1}
+    assert second == first
+    for path, markdown in zip(("/a-b", "/a_b", "/a/b", "/a.b"), first):
+        assert f"lives at {path} " in markdown
+
+
+def test_same_page_variants_are_fetched_once(tmp_path, fixture_server):
+    base = fixture_server.url
+    urls = [f"{base}/article", f"{base}/article/", f"{base}/article#comments"]
+
+    async def main():
+        cache, fetcher = PageCache(str(tmp_path)), PageFetcher()
+        try:
+            await load_pages(cache, fetcher, urls)
+        finally:
+            await fetcher.aclose()
+            await cache.aclose()
+        return cache.stats()
+
+    stats = asyncio.run(main())
+
+    assert fixture_server.requests == {"/article": 1}
+    assert stats["hits"] == 2
+
+
+def age(cache: PageCache, url: str, seconds: float):
+    cache._entries[url_identity(url)]["fetched_at"] -= seconds
+
+
+def test_expired_entry_without_validators_is_fetched_again(tmp_path, fixture_server):
+    url = f"{fixture_server.url}/article"
+
+    async def main():
+        cache, fetcher = PageCache(str(tmp_path), ttl=60), PageFetcher()
+        try:
+            await load_pages(cache, fetcher, [url])
+            await load_pages(cache, fetcher, [url])
+            age(cache, url, 120)
+            await load_pages(cache, fetcher, [url])
+        finally:
+            await fetcher.aclose()
+            await cache.aclose()
+        return cache.stats()
+
+    stats = asyncio.run(main())
+
+    assert fixture_server.requests == {"/article": 2}
+    assert fixture_server.not_modified == {}
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+
+def test_not_modified_renews_the_stored_timestamp(tmp_path, fixture_server):
+    url = f"{fixture_server.url}/article"
+    fixture_server.validators["/article"] = {"ETag": '"v1"', "Last-Modified": "Mon, 05 Oct 2026 10:00:00 GMT"}
+
+    async def main():
+        cache, fetcher = PageCache(str(tmp_path), ttl=60), PageFetcher()
+        try:
+            first = await load_pages(cache, fetcher, [url])
+            age(cache, url, 120)
+            renewed = await load_pages(cache, fetcher, [url])
+            fetched_at = cache._entries[url_identity(url)]["fetched_at"]
+            # Fresh again, served without asking the server
+            again = await load_pages(cache, fetcher, [url])
+        finally:
+            await fetcher.aclose()
+            await cache.aclose()
+        return first, renewed, again, fetched_at, cache.stats()
+
+    first, renewed, again, fetched_at, stats = asyncio.run(main())
+
+    assert renewed == again == first
+    assert time.time() - fetched_at < 5
+    assert fixture_server.requests == {"/article": 2}
+    assert fixture_server.not_modified == {"/article": 1}
+    assert stats["revalidated"] == 1
+    assert stats["hits"] == 2
+
+
+def test_changed_page_is_replaced_from_the_revalidation_response(tmp_path, fixture_server):
+    url = f"{fixture_server.url}/article"
+    fixture_server.validators["/article"] = {"ETag": '"v1"'}
+
+    async def main():
+        cache, fetcher = PageCache(str(tmp_path), ttl=60), PageFetcher()
+        try:
+            await load_pages(cache, fetcher, [url])
+            fixture_server.validators["/article"] = {"ETag": '"v2"'}
+            fixture_server.responses["/article"] = (200, "text/html; charset=utf-8", article("The article was rewritten since it was cached, this is the new text."))
+            age(cache, url, 120)
+            replaced = await load_pages(cache, fetcher, [url])
+            entry = dict(cache._entries[url_identity(url)])
+            again = await load_pages(cache, fetcher, [url])
+        finally:
+            await fetcher.aclose()
+            await cache.aclose()
+        return replaced, again, entry, cache.stats()
+
+    replaced, again, entry, stats = asyncio.run(main())
+
+    assert "this is the new text" in replaced[0]
+    assert again == replaced
+    assert entry["etag"] == '"v2"'
+    # The conditional GET brought the new page, the fetcher did not ask again
+    assert fixture_server.requests == {"/article": 2}
+    assert stats["replaced"] == 1
+    assert stats["hits"] == 2
@@ -0,0 +1,73 @@
+import asyncio
+
+import httpx
+
+from conftest import article
+from utils.page_fetcher import PageFetcher
+
+CHUNK = 64 * 1024
+
+
+class CountingBody:
+    """Response body of `size` bytes in chunks, counting how much the client pulled"""
+
+    def __init__(self, head: bytes, size: int):
+        self.head = head
+        self.size = size
+        self.pulled = 0
+
+    async def __aiter__(self):
+        yield self.head
+        self.pulled += len(self.head)
+        while self.pulled < self.size:
+            chunk = b" " * CHUNK
+            self.pulled += len(chunk)
+            yield chunk
+
+
+def fetch_with(body: CountingBody, content_type: str, **kwargs):
+    def handler(request):
+        return httpx.Response(200, headers={"Content-Type": content_type}, content=body)
+
+    async def main():
+        fetcher = PageFetcher(**kwargs)
+        fetcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await fetcher.fetch("http://stand-in/page"), fetcher.stats()
+        finally:
+            await fetcher.aclose()
+
+    return asyncio.run(main())
+
+
+def test_binary_is_rejected_from_the_headers():
+    body = CountingBody(b"%PDF-1.7", 20 * 1024 * 1024)
+
+    page, stats = fetch_with(body, "application/pdf")
+
+    assert page is None
+    assert stats["escalated"] == 1
+    assert body.pulled <= CHUNK
+
+
+def test_long_html_is_read_up_to_the_cap():
+    body = CountingBody(article("A readable paragraph at the top of a very long page."), 20 * 1024 * 1024)
+
+    page, _stats = fetch_with(body, "text/html; charset=utf-8", max_bytes=256 * 1024)
+
+    assert "A readable paragraph at the top" in page.markdown
+    assert body.pulled <= 256 * 1024 + CHUNK
+
+
+def test_html_from_a_server_is_extracted(fixture_server):
+    async def main():
+        fetcher = PageFetcher()
+        try:
+            return await fetcher.fetch(f"{fixture_server.url}/article")
+        finally:
+            await fetcher.aclose()
+
+    page = asyncio.run(main())
+
+    assert "lives at /article " in page.markdown
+    assert page.headers["content-type"].startswith("text/html")
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from starlette.requests import Request
+
+import server
+from utils.request_registry import request_registry
+from utils.schemas import ChatRequest, Message, ModelInfo
+
+
+def chat_request() -> ChatRequest:
+    return ChatRequest(
+        model=ModelInfo(provider="ollama", name="fake-model", key=""),
+        conversation=[Message(role="user", content="hello")],
+    )
+
+
+def http_request() -> Request:
+    async def receive():
+        # The client stays connected until the test is done with the body
+        await asyncio.Event().wait()
+
+    return Request({"type": "http", "method": "POST", "headers": []}, receive)
+
+
+def test_client_gone_before_the_body_starts_leaves_no_request_behind():
+    async def main():
+        response = await server.chat(chat_request(), http_request())
+        # The server never iterated the body, as when the client disconnects first
+        del response
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+
+    assert len(request_registry) == 0
+
+
+def test_request_is_live_while_its_body_streams():
+    async def main():
+        response = await server.chat(chat_request(), http_request())
+        request_id = response.headers["x-request-id"]
+        first = await response.body_iterator.__anext__()
+        live = request_registry.get(request_id) is not None
+        await response.body_iterator.aclose()
+        return first, live, request_registry.get(request_id)
+
+    first, live, after = asyncio.run(main())
+
+    assert '"request_id"' in first
+    assert live
+    assert after is None
+    assert len(request_registry) == 0
@@ -0,0 +1,30 @@
+from utils.response_cache import ResponseCache
+from utils.schemas import Message
+
+CONVERSATION = [Message(role="user", content="What is the capital of France?")]
+
+
+def test_answer_is_not_replayed_to_another_api_key():
+    cache = ResponseCache()
+    key, scope = cache.keys("openrouter", "paid-model", "first-key", CONVERSATION, False)
+    cache.put(key, scope, ["Paris."], [])
+
+    same_key = cache.lookup(*cache.keys("openrouter", "paid-model", "first-key", CONVERSATION, False))
+    other_key = cache.lookup(*cache.keys("openrouter", "paid-model", "second-key", CONVERSATION, False))
+
+    assert same_key[1] == "exact"
+    assert same_key[0].pieces == ["Paris."]
+    assert other_key == (None, None)
+
+
+def test_semantic_tier_is_scoped_to_the_api_key():
+    cache = ResponseCache(similarity=0.9)
+    key, scope = cache.keys("openrouter", "paid-model", "first-key", CONVERSATION, False)
+    cache.put(key, scope, ["Paris."], [], query_embedding=[1.0, 0.0])
+
+    question = [Message(role="user", content="Which city is the capital of France?")]
+    same_key = cache.lookup(*cache.keys("openrouter", "paid-model", "first-key", question, False), [1.0, 0.01])
+    other_key = cache.lookup(*cache.keys("openrouter", "paid-model", "second-key", question, False), [1.0, 0.01])
+
+    assert same_key[1] == "semantic"
+    assert other_key == (None, None)
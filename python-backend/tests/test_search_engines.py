@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+from utils.search_engines import HedgedSearch, SearchEngine
+
+
+def sleeping_engine(name: str, seconds: float) -> SearchEngine:
+    def search(search_term: str, num_results: int) -> list[str]:
+        time.sleep(seconds)
+        return [f"https://{name}.example/{i}" for i in range(num_results)]
+    return SearchEngine(name, search)
+
+
+def test_losing_engine_latency_is_recorded_only_once_its_call_completes():
+    fast, slow = sleeping_engine("fast", 0.01), sleeping_engine("slow", 0.3)
+    hedged = HedgedSearch([fast, slow], hedge_delay=0, merge_wait=0)
+
+    async def main():
+        urls = await hedged.search("query", 3)
+        after_search = slow.latency
+        await asyncio.sleep(0.5)
+        return urls, after_search
+
+    urls, after_search = asyncio.run(main())
+
+    assert urls[0].startswith("https://fast.example/")
+    assert slow.stats()["cancelled"] == 1
+    # Cancelled after about 10 ms, that is not a latency sample
+    assert after_search is None
+    assert 0.3 <= slow.latency < 0.45
+    assert fast.latency < 0.1
+
+
+def test_failed_late_call_is_not_a_latency_sample():
+    def failing(search_term: str, num_results: int) -> list[str]:
+        time.sleep(0.1)
+        raise RuntimeError("rate limited")
+
+    fast, slow = sleeping_engine("fast", 0.01), SearchEngine("failing", failing)
+    hedged = HedgedSearch([fast, slow], hedge_delay=0, merge_wait=0)
+
+    async def main():
+        await hedged.search("query", 3)
+        await asyncio.sleep(0.2)
+
+    asyncio.run(main())
+
+    assert slow.latency is None
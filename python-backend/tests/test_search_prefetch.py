@@ -0,0 +1,134 @@
+import asyncio
+
+from fakes import FakeSearch
+from utils.search_prefetch import SearchPrefetcher
+
+QUESTION = "What is the tallest building in the world"
+
+
+def test_same_query_is_a_hit_and_searches_once():
+    search = FakeSearch()
+
+    async def main():
+        prefetcher = SearchPrefetcher()
+        started = prefetcher.start(QUESTION, search, session_id="s")
+        # Case and spacing do not make a different query
+        result = await prefetcher.take("  what is the TALLEST building in the world ", session_id="s")
+        return started, result, prefetcher.stats()
+
+    started, result, stats = asyncio.run(main())
+
+    assert started["status"] == "started"
+    assert result == (f"context for {QUESTION}", ["https://example.com/1"])
+    assert search.calls == [QUESTION]
+    assert stats["hits"] == 1
+
+
+def test_similar_query_at_the_threshold_is_a_hit():
+    search = FakeSearch()
+
+    async def main():
+        # 6 of the 8 terms are shared, a Jaccard similarity of exactly 0.75
+        prefetcher = SearchPrefetcher(min_similarity=0.75)
+        prefetcher.start("tallest building in the world 2024", search)
+        similar = await prefetcher.take("what is the tallest building in the world 2024")
+        unrelated = await prefetcher.take("how tall is the eiffel tower")
+        return similar, unrelated, prefetcher.stats()
+
+    similar, unrelated, stats = asyncio.run(main())
+
+    assert similar[0] == "context for tallest building in the world 2024"
+    assert unrelated is None
+    assert stats["similar_hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_newer_draft_from_the_same_session_cancels_the_older_one():
+    search = FakeSearch(delay=1)
+
+    async def main():
+        prefetcher = SearchPrefetcher()
+        for prompt, session_id in (("What is the tallest build", "s"), ("Where is the Eiffel Tower located", "other"), (QUESTION, "s")):
+            prefetcher.start(prompt, search, session_id=session_id)
+            await asyncio.sleep(0.01)
+        cancelled, stats = list(search.cancelled), prefetcher.stats()
+        prefetcher.cancel_all()
+        return cancelled, stats
+
+    cancelled, stats = asyncio.run(main())
+
+    assert cancelled == ["What is the tallest build"]
+    assert stats["abandoned"] == 1
+    assert stats["running"] == 2
+
+
+def test_running_prefetches_are_capped_and_expire():
+    search = FakeSearch(delay=1)
+
+    async def main():
+        prefetcher = SearchPrefetcher(max_running=2, ttl=0.05)
+        for i, prompt in enumerate(("first draft question", "second draft question", "third draft question")):
+            prefetcher.start(prompt, search, session_id=str(i))
+            await asyncio.sleep(0.01)
+        capped = list(search.cancelled)
+
+        # Unclaimed and still running past the TTL, the next call sweeps them
+        await asyncio.sleep(0.1)
+        prefetcher.start("fourth draft question", search)
+        await asyncio.sleep(0.01)
+        stats = prefetcher.stats()
+        prefetcher.cancel_all()
+        return capped, stats
+
+    capped, stats = asyncio.run(main())
+
+    assert capped == ["first draft question"]
+    assert stats["abandoned"] == 1
+    assert stats["expired"] == 2
+    assert search.cancelled[:3] == ["first draft question", "second draft question", "third draft question"]
+
+
+def test_failed_prefetch_is_a_miss():
+    failing, empty = FakeSearch(fail=True), FakeSearch()
+
+    async def no_result(prompt: str):
+        await empty(prompt)
+        return None
+
+    async def main():
+        prefetcher = SearchPrefetcher()
+        prefetcher.start(QUESTION, failing)
+        failed = await prefetcher.take(QUESTION)
+        prefetcher.start("Where is the Eiffel Tower located", no_result)
+        nothing = await prefetcher.take("Where is the Eiffel Tower located")
+        return failed, nothing, prefetcher.stats()
+
+    failed, nothing, stats = asyncio.run(main())
+
+    assert failed is None
+    assert nothing is None
+    assert stats["misses"] == 2
+    assert stats["hits"] == 0
+
+
+def test_cancelled_chat_does_not_cancel_a_shared_prefetch():
+    search = FakeSearch(delay=0.1)
+
+    async def main():
+        prefetcher = SearchPrefetcher()
+        prefetcher.start(QUESTION, search)
+        leaving = asyncio.create_task(prefetcher.take(QUESTION))
+        staying = asyncio.create_task(prefetcher.take(QUESTION))
+        await asyncio.sleep(0.02)
+
+        # The first chat's client disconnects while both wait
+        leaving.cancel()
+        await asyncio.gather(leaving, return_exceptions=True)
+        return leaving.cancelled(), await staying, prefetcher.stats()
+
+    leaving_cancelled, result, stats = asyncio.run(main())
+
+    assert leaving_cancelled
+    assert result == (f"context for {QUESTION}", ["https://example.com/1"])
+    assert search.cancelled == []
+    assert stats["hits"] == 1
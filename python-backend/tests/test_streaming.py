@@ -0,0 +1,113 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from fakes import FakeStream
+from utils import query_func
+from utils.client_pool import ClientPool
+from utils.query_func import stream_deltas
+from utils.schemas import ChatRequest, Message, ModelInfo, RequestState
+
+
+def chat_request() -> ChatRequest:
+    return ChatRequest(
+        model=ModelInfo(provider="groq", name="fake-model", key=""),
+        conversation=[Message(role="user", content="hello")],
+    )
+
+
+async def consume(stream: FakeStream) -> tuple[str, float]:
+    """The streamed text and when the last frame arrived"""
+    frames = [frame async for frame in stream_deltas(stream.deltas(), chat_request(), RequestState("request"))]
+    return "".join(frames), time.perf_counter()
+
+
+def test_parallel_streams_finish_in_about_the_time_of_the_slowest():
+    # 20 tokens each, from 0.1 s to 0.4 s per stream
+    streams = [FakeStream(tokens=20, interval=0.005 * (1 + i % 4), first_token_latency=0.01) for i in range(16)]
+    slowest = max(stream.first_token_latency + stream.interval * (stream.tokens - 1) for stream in streams)
+
+    async def main():
+        started = time.perf_counter()
+        results = await asyncio.gather(*(consume(stream) for stream in streams))
+        return started, results
+
+    started, results = asyncio.run(main())
+    elapsed = max(finished for _text, finished in results) - started
+
+    assert all(text.count("token") == 20 for text, _finished in results)
+    assert elapsed < 1.5 * slowest
+    assert elapsed < 0.25 * sum(stream.interval * stream.tokens for stream in streams)
+
+
+def test_slow_upstream_does_not_hold_back_fast_streams():
+    slow = FakeStream(tokens=3, interval=0.3)
+    fast = [FakeStream(tokens=20, interval=0.002) for _ in range(4)]
+
+    async def main():
+        started = time.perf_counter()
+        slow_task = asyncio.create_task(consume(slow))
+        fast_results = await asyncio.gather(*(consume(stream) for stream in fast))
+        await slow_task
+        return [finished - started for _text, finished in fast_results]
+
+    fast_elapsed = asyncio.run(main())
+
+    assert max(fast_elapsed) < 0.2
+
+
+def openai_chunks(tokens: list[str]) -> list[bytes]:
+    """An OpenAI-compatible chat completion stream, one SSE event per token"""
+    def event(delta: dict, finish_reason=None) -> bytes:
+        data = {
+            "id": "chatcmpl-fixture",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "fake-model",
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(data)}\n\n".encode("utf-8")
+
+    return [*(event({"role": "assistant", "content": token}) for token in tokens), event({}, "stop"), b"data: [DONE]\n\n"]
+
+
+def test_provider_stream_leaves_the_event_loop_free(fixture_server, monkeypatch):
+    pytest.importorskip("openai")
+    monkeypatch.setattr(query_func, "OPENROUTER_BASE_URL", f"{fixture_server.url}/api/v1")
+    monkeypatch.setattr(query_func, "client_pool", ClientPool())
+    tokens = [f"token{i} " for i in range(20)]
+    fixture_server.streams["/api/v1/chat/completions"] = ("text/event-stream", openai_chunks(tokens), 0.02)
+
+    async def main():
+        ticks = []
+        streaming = True
+
+        async def ticker():
+            # Runs next to the stream, a blocking read would starve it
+            while streaming:
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.005)
+
+        request = chat_request()
+        request.model.provider = "openrouter"
+        request.model.key = "fixture-key"
+        ticking = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        frames = [frame async for frame in await query_func.chat_openrouter(request, RequestState("request"))]
+        elapsed = time.perf_counter() - started
+        streaming = False
+        await ticking
+        await query_func.client_pool.aclose()
+        return frames, elapsed, ticks
+
+    frames, elapsed, ticks = asyncio.run(main())
+
+    text = "".join(frames)
+    assert all(f'token{i} ' in text for i in range(20))
+    assert '"error"' not in text
+    # 20 tokens 20 ms apart: the stream really took that long, and the loop kept ticking throughout
+    assert elapsed >= 0.35
+    assert max(later - earlier for earlier, later in zip(ticks, ticks[1:])) < 0.05
+    assert len(ticks) >= elapsed / 0.005 * 0.5
@@ -8,24 +8,77 @@ import sys
 if sys.platform.startswith('win'):
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
-import shutil
+if not __package__:
+    # Running as a standalone script from inside utils/
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import timedelta
+from functools import lru_cache
+from typing import AsyncIterator
 from crawl4ai import AsyncWebCrawler, BrowserConfig, CacheMode, CrawlerRunConfig
 from crawl4ai.content_filter_strategy import BM25ContentFilter
 from crawl4ai.markdown_generation_strategy import DefaultMarkdownGenerator
 from crawl4ai.models import CrawlResult
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
-from langchain_chroma import Chroma
-from chromadb.api.client import SharedSystemClient
-from get_embedding_function import hf_local_embeddings
+from utils.get_embedding_function import hf_local_embeddings
+from utils.vector_index import VectorIndex
+from utils.hybrid_retrieval import hybrid_search
+from utils.context_compression import compress_context
+from utils.context_window import approx_tokens
+from utils.embedding_cache import EmbeddingCache
+from utils.embedding_batcher import EmbeddingBatcher
+from utils.page_cache import PageCache
+from utils.page_fetcher import PageFetcher
+from utils.admission import admission
+from utils.ttl_cache import AsyncTTLCache
+from utils.search_engines import HedgedSearch, SearchEngine, normalize_query, url_identity
+from utils.metrics import context_compression_ratio, span
 from duckduckgo_search import DDGS
 from googlesearch import search
 
 
-CHROMA_PATH = os.path.join(os.getcwd(), 'python-backend', "web-search-llm-db")
-
 num_result = 10
 
+EMBEDDING_MODEL = 'intfloat/e5-small-v2'
+
+SEARCH_TOP_K = 5
+# Seconds a search may spend crawling and embedding before retrieval runs on what it has
+SEARCH_TIME_BUDGET = float(os.environ.get("SEARCH_TIME_BUDGET", "15"))
+# Cosine similarity above which a chunk counts towards finishing the search early
+SEARCH_GOOD_SCORE = float(os.environ.get("SEARCH_GOOD_SCORE", "0.82"))
+
+text_splitter = RecursiveCharacterTextSplitter(
+    chunk_size=800,
+    chunk_overlap=80,
+    length_function=len,
+    separators=["\n\n", "\n", ".", "?", "!", " ", ""],
+    # Context compression puts kept sentences back in page order by this offset
+    add_start_index=True,
+)
+
+@lru_cache(maxsize=None)
+def get_embedding_model(model_name: str = EMBEDDING_MODEL):
+    # Loaded once per process and shared by every search
+    return hf_local_embeddings(model_name)
+
+@lru_cache(maxsize=None)
+def get_embedding_batcher(model_name: str = EMBEDDING_MODEL) -> EmbeddingBatcher:
+    # One batcher per model so concurrent searches share forward passes
+    return EmbeddingBatcher(get_embedding_model(model_name).embed_documents)
+
+@lru_cache(maxsize=None)
+def get_page_cache() -> PageCache:
+    return PageCache()
+
+@lru_cache(maxsize=None)
+def get_page_fetcher() -> PageFetcher:
+    return PageFetcher()
+
+@lru_cache(maxsize=None)
+def get_embedding_cache(model_name: str = EMBEDDING_MODEL) -> EmbeddingCache:
+    return EmbeddingCache(model_name)
+
 def google_search(search_term : str , num_results : int = num_result) -> list[str]:
     print("using Google Search", file=sys.stderr)
     return [urls for urls in search(search_term, num_results=num_results)]
@@ -35,50 +88,60 @@ def DDGS_search(search_term : str , num_results : int = num_result) -> list[str]
     results = DDGS().text(search_term, max_results=num_results)
     return [result["href"] for result in results]
 
-def get_web_urls(search_term: str, num_results: int = num_result) -> list[str]:
+DISCARD_URLS = ["youtube.com", "britannica.com", "vimeo.com", "accuweather.com"]
 
-    discard_urls = ["youtube.com", "britannica.com", "vimeo.com", "accuweather.com"]
+# Seconds a query's URL list is reused, and how long a failed lookup is remembered
+URL_CACHE_TTL = float(os.environ.get("URL_CACHE_TTL", "3600"))
+URL_CACHE_NEGATIVE_TTL = float(os.environ.get("URL_CACHE_NEGATIVE_TTL", "60"))
 
-    for url in discard_urls:
-        search_term += f" -site:{url}"
+class WebSearchFailed(Exception):
+    """Every search engine failed or returned nothing"""
 
-    search_engines = [DDGS_search, google_search]
+@lru_cache(maxsize=None)
+def get_url_cache() -> AsyncTTLCache:
+    return AsyncTTLCache(ttl=URL_CACHE_TTL, negative_ttl=URL_CACHE_NEGATIVE_TTL, max_entries=1024)
 
-    for i , func in enumerate(search_engines):
+@lru_cache(maxsize=None)
+def get_search_engines() -> HedgedSearch:
+    return HedgedSearch([SearchEngine("duckduckgo", DDGS_search), SearchEngine("google", google_search)])
 
-        try:
+async def get_web_urls(search_term: str, num_results: int = num_result) -> list[str] | None:
 
-            return func(search_term=search_term, num_results=num_results)
-        
-        except Exception as e:
+    for url in DISCARD_URLS:
+        search_term += f" -site:{url}"
 
-            print(f"Attempt {i + 1} ({func.__name__}) Failed: {e}")
+    urls = await get_search_engines().search(search_term, num_results, discard_domains=DISCARD_URLS)
+    if not urls:
+        print("Web Search failed")
+    return urls
 
-    print("Web Search failed")
-    return None
- 
-def normalize_url(url):
+async def search_web_urls(search_term: str, num_results: int = num_result) -> list[str] | None:
+    """
+    `get_web_urls` behind a cache keyed by the normalized query.
 
-    normalized_url = (
-        url.replace("https://", "")
-        .replace("www.", "")
-        .replace("/", "_")
-        .replace("-", "_")
-        .replace(".", "_")
-    )
-    # print("Normalized URL", normalized_url)
-    return normalized_url
+    Concurrent identical queries share one engine round trip, and a query for
+    which every engine failed is answered with None until URL_CACHE_NEGATIVE_TTL passes.
+    """
+
+    async def load():
+        urls = await get_web_urls(search_term, num_results=num_results)
+        if not urls:
+            raise WebSearchFailed(search_term)
+        return urls
+
+    try:
+        return await get_url_cache().get((normalize_query(search_term), num_results), load)
+    except WebSearchFailed:
+        return None
 
 def split_documents(documents: list[Document]):
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=800,
-        chunk_overlap=80,
-        length_function=len,
-        separators=["\n\n", "\n", ".", "?", "!", " ", ""]
-    )
     return text_splitter.split_documents(documents)
 
-async def crawl_webpages(urls: list[str], prompt: str) -> CrawlResult:
+def get_browser_config() -> BrowserConfig:
+    return BrowserConfig(headless=True, text_mode=True, light_mode=True)
+
+async def crawl_webpages(urls: list[str], prompt: str, crawler: AsyncWebCrawler | None = None) -> AsyncIterator[CrawlResult]:
+    """Crawl `urls` and yield each result as soon as its page is done"""
 
     bm25_filter = BM25ContentFilter(user_query=prompt, bm25_threshold=1.2)
     md_generator = DefaultMarkdownGenerator(content_filter=bm25_filter)
@@ -97,112 +160,215 @@ async def crawl_webpages(urls: list[str], prompt: str) -> CrawlResult:
         verbose=False,
         scan_full_page=True,
         magic=True,
+        stream=True,
 
     )
         # user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/132.0.0.0 Safari/537.36",
-    browser_config = BrowserConfig(headless=True, text_mode=True, light_mode=True)
+    browser_config = get_browser_config()
+
+    async def stream_results(crawler: AsyncWebCrawler):
+        results = await crawler.arun_many(urls=urls, config=crawler_config)
+        try:
+            async for result in results:
+                yield result
+        finally:
+            # Stops pages still in flight when the caller stops early
+            await results.aclose()
 
-    results = []
     try:
-        async with AsyncWebCrawler(config=browser_config) as crawler:
-            results = await crawler.arun_many(urls=urls, config=crawler_config)
+        if crawler is not None:
+            # Reuse the already running browser of the search service
+            async for result in stream_results(crawler):
+                yield result
+        else:
+            async with AsyncWebCrawler(config=browser_config) as crawler:
+                async for result in stream_results(crawler):
+                    yield result
     except Exception as e:
         print(f"Error during crawling: {e}", file=sys.stderr)
         # Optionally re-raise or handle differently
-    finally:
-        return results
-    
-async def web_search(prompt: str):
 
-    urls = get_web_urls(search_term=prompt, num_results=num_result)
+def crawl_seconds(result: CrawlResult) -> float | None:
+    """How long the browser spent on this URL, from the dispatcher's per-task timing when it reports one"""
+    dispatch = getattr(result, "dispatch_result", None)
+    if dispatch is None:
+        return None
+    elapsed = dispatch.end_time - dispatch.start_time
+    return elapsed.total_seconds() if isinstance(elapsed, timedelta) else float(elapsed)
+
+class RetrievalState:
+    """Chunks indexed so far for one search, filled page by page as crawls complete"""
+
+    def __init__(self, prompt: str, query_embedding):
+        self.prompt = prompt
+        self.query_embedding = query_embedding
+        self.index = VectorIndex()
+        self.pages: list[str] = []
+
+    async def add_page(self, document: Document):
+        with span("search.split"):
+            splits = await asyncio.to_thread(split_documents, [document])
+        if not splits:
+            return
+
+        embedding_batcher = get_embedding_batcher()
+        chunk_texts = [doc.page_content for doc in splits]
+        async with admission.limiter("embedding").acquire():
+            with span("search.embedding"):
+                chunk_embeddings = await get_embedding_cache().embed_documents(chunk_texts, embedding_batcher.embed)
+
+        self.index.add(splits, chunk_embeddings)
+        self.pages.append(document.metadata['source'])
+
+    def good_chunks(self, min_score: float = SEARCH_GOOD_SCORE) -> int:
+        return int((self.index.scores(self.query_embedding) >= min_score).sum())
+
+    def enough(self) -> bool:
+        return self.good_chunks() >= SEARCH_TOP_K
+
+async def web_search(prompt: str, crawler: AsyncWebCrawler | None = None, time_budget: float | None = None):
+    """
+    Search the web for `prompt` and return (context, sources).
+
+    Pages are split and embedded as they finish crawling. Retrieval runs once
+    `time_budget` seconds have passed since the search started or enough chunks
+    score above SEARCH_GOOD_SCORE; pages still crawling at that point are dropped.
+    """
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + (time_budget or SEARCH_TIME_BUDGET)
+
+    embedding_batcher = await asyncio.to_thread(get_embedding_batcher)
+    query_task = asyncio.create_task(embedding_batcher.embed([prompt]))
+
+    with span("search.urls"):
+        urls = await search_web_urls(prompt, num_results=num_result)
     if not urls:
         print("Could not retrieve URLs for crawling.", file=sys.stderr)
-        if os.path.exists(CHROMA_PATH):
-             delete_database()
-        return ""
-
-    print("URLs to crawl:", urls, file=sys.stderr)
-    results = await crawl_webpages(urls=urls, prompt=prompt)
-
-    docs = ""
-    markdown_data = []
-    successful_urls = []
-
-    if not results:
-        print("Failed to get crawl results", file=sys.stderr)
-        return ""
-
-    for i , result in enumerate(results):
-
-        source_url = urls[i]
-        norm_url = normalize_url(source_url)
-
-        if result and result.markdown and result.markdown.fit_markdown:
-                            markdown_result = result.markdown.fit_markdown
-                            # Create a separate doc for each successful crawl
-                            new_doc = Document(metadata={'id': norm_url, 'source': source_url},
-                                            page_content=markdown_result)
-                            markdown_data.append(new_doc)
-                            successful_urls.append(source_url)
-        else: 
-            print(f"No valid markdown content found for URL: {source_url}", file=sys.stderr)
-       
-    if not markdown_data:
-        print("No documents generated after crawling.", file=sys.stderr)
-        if os.path.exists(CHROMA_PATH):
-             delete_database()
-        return ""
-            
-    # context_text_str = [doc.page_content for doc in markdown_data]
-    # context_text_str = "\n".join(context_text_str)
-    all_splits = split_documents(markdown_data)
-
-    if not all_splits:
-        print("No text splits generated from documents.", file=sys.stderr)
-        # Clean up DB path
-        if os.path.exists(CHROMA_PATH):
-             delete_database()
-        return ""
-    
-    db = None
-    context_text_str = ""
+        query_task.cancel()
+        return "", []
 
-    try:
-    
-        embedding_function = hf_local_embeddings('intfloat/e5-small-v2')
+    with span("search.query_embedding"):
+        [query_embedding] = await query_task
+    retrieval = RetrievalState(prompt, query_embedding)
 
-        db = Chroma(persist_directory=CHROMA_PATH, embedding_function=embedding_function, collection_name="web-search-llm")
+    page_cache = get_page_cache()
+    page_fetcher = get_page_fetcher()
+    urls_to_fetch = []
+    urls_to_crawl = []
 
-        db.add_documents(all_splits)
+    # Stale entries may need a conditional request, check all pages at once
+    with span("search.page_cache"):
+        cached_pages = await asyncio.gather(*(page_cache.get(url_identity(url), url) for url in urls))
 
-        search_docs = db.similarity_search_with_score(prompt, k=5)
+    async def consume():
 
-        context_text = [doc.page_content for doc, _score in search_docs]
-        sources = [doc.metadata['source'] for doc, _score in search_docs]
+        for source_url, cached_markdown in zip(urls, cached_pages):
+            norm_url = url_identity(source_url)
+            if cached_markdown:
+                await retrieval.add_page(Document(metadata={'id': norm_url, 'source': source_url},
+                                                  page_content=cached_markdown))
+            else:
+                urls_to_fetch.append(source_url)
 
-        context_text_str = "\n".join(map(str, context_text))
+        print(f"Page cache: {len(urls) - len(urls_to_fetch)}/{len(urls)} hits", file=sys.stderr)
 
-    except Exception as e:
-        print(f"An error occurred during DB operations or LLM query: {e}", file=sys.stderr)
-        delete_database(db=db)
+        if retrieval.enough() or not urls_to_fetch:
+            return
 
-    delete_database(db=db)
+        # Plain HTTP first, only pages it cannot handle go to the headless browser
+        if await consume_fetched(urls_to_fetch):
+            return
 
-    return context_text_str
+        if not urls_to_crawl:
+            return
 
-def delete_database(db = None):
+        print("URLs to crawl:", urls_to_crawl, file=sys.stderr)
+        pages = crawl_webpages(urls=urls_to_crawl, prompt=prompt, crawler=crawler)
+        try:
+            await consume_crawled(pages)
+        finally:
+            await pages.aclose()
 
-    try:
+    async def fetch_page(url: str):
+        return url, await page_fetcher.fetch(url)
 
-        if db is not None:
-                db._client._system.stop()
-                SharedSystemClient._identifier_to_system.pop(db._client._identifier, None)
-                db = None
-            
-        shutil.rmtree(CHROMA_PATH)
+    async def consume_fetched(urls_to_fetch: list[str]) -> bool:
+        tasks = [asyncio.create_task(fetch_page(url)) for url in urls_to_fetch]
+        try:
+            for completed in asyncio.as_completed(tasks):
+                source_url, page = await completed
+                if page is None:
+                    urls_to_crawl.append(source_url)
+                    continue
+
+                norm_url = url_identity(source_url)
+                await page_cache.put(norm_url, source_url, page.markdown, headers=page.headers)
+                await retrieval.add_page(Document(metadata={'id': norm_url, 'source': source_url},
+                                                  page_content=page.markdown))
+                if retrieval.enough():
+                    print("Enough relevant chunks found, skipping remaining pages", file=sys.stderr)
+                    return True
+        finally:
+            for task in tasks:
+                task.cancel()
+        return False
+
+    async def consume_crawled(pages: AsyncIterator[CrawlResult]):
+        async for result in pages:
+            page_fetcher.record("browser", crawl_seconds(result))
+
+            source_url = result.url
+            norm_url = url_identity(source_url)
+
+            if result and result.markdown and result.markdown.fit_markdown:
+                markdown_result = result.markdown.fit_markdown
+                # Create a separate doc for each successful crawl
+                new_doc = Document(metadata={'id': norm_url, 'source': source_url},
+                                   page_content=markdown_result)
+
+                # The cache keeps the unfiltered page, the filtered markdown is specific to this query
+                await page_cache.put(norm_url, source_url,
+                                     result.markdown.raw_markdown or markdown_result,
+                                     headers=result.response_headers)
+
+                await retrieval.add_page(new_doc)
+                if retrieval.enough():
+                    print("Enough relevant chunks found, skipping remaining pages", file=sys.stderr)
+                    return
+            else:
+                print(f"No valid markdown content found for URL: {source_url}", file=sys.stderr)
 
+    try:
+        with span("search.pages"):
+            await asyncio.wait_for(consume(), timeout=max(0.0, deadline - loop.time()))
+    except asyncio.TimeoutError:
+        print(f"Search time budget reached with {len(retrieval.pages)} page(s) indexed, cancelled the rest", file=sys.stderr)
     except Exception as e:
-            print(f"Error removing directory {CHROMA_PATH}: {e}", file=sys.stderr)
+        print(f"An error occurred during crawling or embedding: {e}", file=sys.stderr)
+
+    if not len(retrieval.index):
+        print("No text splits generated from documents.", file=sys.stderr)
+        return "", []
+
+    with span("search.retrieval"):
+        # Dense and BM25 fused, then near-duplicate chunks dropped under the context token budget
+        search_docs = hybrid_search(retrieval.index, prompt, query_embedding, k=SEARCH_TOP_K)
+
+    chunks = [doc for doc, _score in search_docs]
+    sources = list(dict.fromkeys(doc.metadata['source'] for doc in chunks))
+    print(f"Sources used: {sources} (indexed {len(retrieval.pages)}/{len(urls)} pages)", file=sys.stderr)
+
+    with span("search.compression"):
+        # Only the sentences that answer the query go to the prompt, scored with the chunk vectors retrieval computed
+        context_text_str = compress_context(chunks, prompt, query_embedding, retrieval.index.vectors(chunks))
+
+    retrieved_tokens = sum(approx_tokens(doc.page_content) for doc in chunks)
+    ratio = approx_tokens(context_text_str) / max(retrieved_tokens, 1)
+    context_compression_ratio.observe(ratio)
+    print(f"Context compressed to {ratio:.0%} of {retrieved_tokens} tokens", file=sys.stderr)
+
+    return context_text_str, sources
    
 if __name__ == "__main__":
 
@@ -210,7 +376,7 @@ if __name__ == "__main__":
     parser.add_argument("prompt", type=str, help="The search prompt to use for finding and filtering web pages.")
     args = parser.parse_args()
 
-    returned_context = asyncio.run(web_search(prompt=args.prompt))
+    returned_context, _sources = asyncio.run(web_search(prompt=args.prompt))
     print(returned_context)
 
 
@@ -0,0 +1,208 @@
+import sys
+sys.dont_write_bytecode = True
+
+import asyncio
+import os
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "60"))  # seconds
+# How often a queued request is told its position
+ADMISSION_POSITION_INTERVAL = 0.5
+
+# Concurrent requests allowed per pipeline stage and per provider, e.g.
+# ADMISSION_LIMITS="chat=16,search=2,embedding=4,provider:ollama=1"
+DEFAULT_LIMITS = {
+    "chat": 16,
+    "search": 2,
+    # Speculative searches from /api/search/prefetch, kept from crowding out real ones
+    "prefetch": 1,
+    "embedding": 4,
+    "provider:ollama": 1,
+    "provider:huggingface": 4,
+    "provider:openrouter": 8,
+    "provider:groq": 8,
+    "provider:gemini": 8,
+}
+DEFAULT_PROVIDER_LIMIT = 4
+
+
+def parse_limits(value: str) -> dict[str, int]:
+    limits = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, limit = item.split("=", 1)
+            limits[name.strip()] = int(limit)
+    return limits
+
+
+ADMISSION_LIMITS = {**DEFAULT_LIMITS, **parse_limits(os.environ.get("ADMISSION_LIMITS", ""))}
+
+
+class AdmissionRejected(Exception):
+    """The queue for a limiter is full, the caller should back off (429)"""
+
+    def __init__(self, name: str):
+        super().__init__(f"Too many queued requests for {name}, try again shortly")
+        self.name = name
+
+
+class AdmissionTimeout(Exception):
+    """A request waited longer than the queue time limit (503)"""
+
+    def __init__(self, name: str, waited: float):
+        super().__init__(f"Timed out after {waited:.0f}s waiting for {name}")
+        self.name = name
+
+
+class Ticket:
+    def __init__(self, limiter: "ConcurrencyLimiter"):
+        self.limiter = limiter
+        self.granted = asyncio.get_running_loop().create_future()
+        self.released = False
+
+
+class ConcurrencyLimiter:
+    """
+    Semaphore with a bounded FIFO queue.
+
+    Slots are handed out strictly in arrival order. Enqueueing fails fast with
+    AdmissionRejected when `max_queue` requests are already waiting, and a queued
+    request gives up with AdmissionTimeout after `queue_timeout` seconds.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int = ADMISSION_MAX_QUEUE, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiters: deque[Ticket] = deque()
+        self._stats = {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0}
+
+    def enqueue(self) -> Ticket:
+        ticket = Ticket(self)
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            self._stats["admitted"] += 1
+            ticket.granted.set_result(True)
+        elif len(self.waiters) >= self.max_queue:
+            self._stats["rejected"] += 1
+            raise AdmissionRejected(self.name)
+        else:
+            self._stats["queued"] += 1
+            self.waiters.append(ticket)
+        return ticket
+
+    def check(self):
+        """Raise AdmissionRejected now if a request enqueued later would be rejected"""
+        if len(self.waiters) >= self.max_queue:
+            self._stats["rejected"] += 1
+            raise AdmissionRejected(self.name)
+
+    def position(self, ticket: Ticket) -> int:
+        """1-based place in the queue, 0 once the ticket holds a slot"""
+        if ticket.granted.done():
+            return 0
+        try:
+            return self.waiters.index(ticket) + 1
+        except ValueError:
+            return 0
+
+    async def wait(self, ticket: Ticket, stop: asyncio.Event | None = None) -> AsyncIterator[int]:
+        """
+        Wait for a slot, yielding the queue position whenever it changes.
+
+        Setting `stop` gives up the place in the queue at once and returns
+        without a slot; the caller checks its own cancellation afterwards.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.queue_timeout
+        last_position = None
+        stopped = asyncio.ensure_future(stop.wait()) if stop is not None else None
+
+        try:
+            while not ticket.granted.done():
+                if stopped is not None and stopped.done():
+                    self.release(ticket)
+                    return
+
+                position = self.position(ticket)
+                if position != last_position:
+                    last_position = position
+                    yield position
+
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self._stats["timed_out"] += 1
+                    self.release(ticket)
+                    raise AdmissionTimeout(self.name, self.queue_timeout)
+
+                waiters = {ticket.granted} if stopped is None else {ticket.granted, stopped}
+                await asyncio.wait(waiters, timeout=min(remaining, ADMISSION_POSITION_INTERVAL), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if stopped is not None and not stopped.done():
+                stopped.cancel()
+
+    def release(self, ticket: Ticket):
+        if ticket.released:
+            return
+        ticket.released = True
+
+        if ticket.granted.done() and not ticket.granted.cancelled():
+            self.active -= 1
+        else:
+            # Gave up while still queued
+            ticket.granted.cancel()
+            try:
+                self.waiters.remove(ticket)
+            except ValueError:
+                pass
+        self._grant_next()
+
+    def _grant_next(self):
+        while self.waiters and self.active < self.limit:
+            ticket = self.waiters.popleft()
+            if ticket.granted.done():
+                continue
+            self.active += 1
+            self._stats["admitted"] += 1
+            ticket.granted.set_result(True)
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Hold a slot for the duration of the block"""
+        ticket = self.enqueue()
+        try:
+            async for _position in self.wait(ticket):
+                pass
+            yield
+        finally:
+            self.release(ticket)
+
+    def stats(self) -> dict:
+        return {**self._stats, "limit": self.limit, "active": self.active, "waiting": len(self.waiters)}
+
+
+class AdmissionController:
+    """Named limiters for pipeline stages ("chat", "search", "embedding") and providers ("provider:<name>")"""
+
+    def __init__(self, limits: dict[str, int] = ADMISSION_LIMITS):
+        self.limits = limits
+        self.limiters: dict[str, ConcurrencyLimiter] = {}
+
+    def limiter(self, name: str) -> ConcurrencyLimiter:
+        limiter = self.limiters.get(name)
+        if limiter is None:
+            default = DEFAULT_PROVIDER_LIMIT if name.startswith("provider:") else DEFAULT_LIMITS["chat"]
+            limiter = ConcurrencyLimiter(name, self.limits.get(name, default))
+            self.limiters[name] = limiter
+        return limiter
+
+    def stats(self) -> dict:
+        return {name: limiter.stats() for name, limiter in self.limiters.items()}
+
+
+admission = AdmissionController()
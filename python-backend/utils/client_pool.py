@@ -0,0 +1,161 @@
+import sys
+sys.dont_write_bytecode = True
+
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Tuple
+
+import httpx
+
+CLIENT_POOL_MAX_SIZE = int(os.environ.get("CLIENT_POOL_MAX_SIZE", "32"))
+CLIENT_POOL_TTL = float(os.environ.get("CLIENT_POOL_TTL", "900"))  # seconds a client may sit idle
+CLIENT_KEEPALIVE_CONNECTIONS = int(os.environ.get("CLIENT_KEEPALIVE_CONNECTIONS", "20"))
+CLIENT_KEEPALIVE_EXPIRY = float(os.environ.get("CLIENT_KEEPALIVE_EXPIRY", "120"))  # seconds
+
+# factory(transport) -> (client, async close function)
+ClientFactory = Callable[[httpx.AsyncBaseTransport], Tuple[object, Callable[[], Awaitable[None]]]]
+
+
+class CountingTransport(httpx.AsyncHTTPTransport):
+    """Keep-alive transport that counts requests and newly opened TCP connections"""
+
+    def __init__(self, stats: dict, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats["requests"] += 1
+        inner_trace = request.extensions.get("trace")
+
+        async def trace(event_name, info):
+            if event_name == "connection.connect_tcp.complete":
+                self.stats["connections_opened"] += 1
+            if inner_trace is not None:
+                await inner_trace(event_name, info)
+
+        request.extensions["trace"] = trace
+        return await super().handle_async_request(request)
+
+
+class PooledClient:
+    def __init__(self, client, close: Callable[[], Awaitable[None]]):
+        self.client = client
+        self.close = close
+        self.last_used = time.monotonic()
+        self.leases = 0
+        self.evicted = False
+
+
+class ClientPool:
+    """
+    Registry of provider SDK clients keyed by (provider, api key hash, base URL).
+
+    Clients are created once, in a worker thread since SDK imports and TLS
+    setup take tens of milliseconds, and reused across requests so their HTTP
+    connection pools stay warm. Idle clients expire after `ttl` seconds and the least recently
+    used one is dropped when more than `max_size` are held. A client is only closed
+    once no request is leasing it.
+    """
+
+    def __init__(self, max_size: int = CLIENT_POOL_MAX_SIZE, ttl: float = CLIENT_POOL_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clients: "OrderedDict[tuple, PooledClient]" = OrderedDict()
+        self._lock = asyncio.Lock()
+        self._stats = {
+            "lookups": 0,
+            "clients_created": 0,
+            "clients_evicted": 0,
+            "requests": 0,
+            "connections_opened": 0,
+        }
+
+    @staticmethod
+    def make_key(provider: str, api_key: str | None, base_url: str | None) -> tuple:
+        key_hash = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+        return (provider, key_hash, base_url or "")
+
+    def make_transport(self) -> httpx.AsyncBaseTransport:
+        limits = httpx.Limits(
+            max_keepalive_connections=CLIENT_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=CLIENT_KEEPALIVE_EXPIRY,
+        )
+        return CountingTransport(self._stats, limits=limits)
+
+    @asynccontextmanager
+    async def lease(self, provider: str, api_key: str | None, base_url: str | None, factory: ClientFactory):
+        """Borrow the pooled client for this key, creating it with `factory` on first use"""
+        key = self.make_key(provider, api_key, base_url)
+
+        async with self._lock:
+            self._stats["lookups"] += 1
+            await self._evict_expired()
+
+            entry = self._clients.get(key)
+            if entry is None:
+                client, close = await asyncio.to_thread(lambda: factory(self.make_transport()))
+                entry = PooledClient(client, close)
+                self._clients[key] = entry
+                self._stats["clients_created"] += 1
+                await self._evict_overflow()
+            else:
+                self._clients.move_to_end(key)
+
+            entry.leases += 1
+
+        try:
+            yield entry.client
+        finally:
+            entry.leases -= 1
+            entry.last_used = time.monotonic()
+            if entry.evicted and entry.leases == 0:
+                await self._close(entry)
+
+    async def _evict_expired(self):
+        now = time.monotonic()
+        expired = [key for key, entry in self._clients.items() if entry.leases == 0 and now - entry.last_used > self.ttl]
+        for key in expired:
+            await self._evict(key)
+
+    async def _evict_overflow(self):
+        while len(self._clients) > self.max_size:
+            key = next(iter(self._clients))
+            await self._evict(key)
+
+    async def _evict(self, key: tuple):
+        entry = self._clients.pop(key)
+        entry.evicted = True
+        self._stats["clients_evicted"] += 1
+        if entry.leases == 0:
+            await self._close(entry)
+
+    async def _close(self, entry: PooledClient):
+        try:
+            await entry.close()
+        except Exception as e:
+            print(f"Error closing pooled client: {e}", file=sys.stderr)
+
+    async def aclose(self):
+        """Close every pooled client, used on server shutdown"""
+        async with self._lock:
+            for key in list(self._clients):
+                entry = self._clients.pop(key)
+                entry.evicted = True
+                await self._close(entry)
+
+    def stats(self) -> dict:
+        lookups = self._stats["lookups"]
+        requests = self._stats["requests"]
+        return {
+            **self._stats,
+            "clients": len(self._clients),
+            "client_reuse_rate": (lookups - self._stats["clients_created"]) / lookups if lookups else 0.0,
+            "connection_reuse_rate": (requests - self._stats["connections_opened"]) / requests if requests else 0.0,
+        }
+
+
+client_pool = ClientPool()
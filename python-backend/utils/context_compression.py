@@ -0,0 +1,128 @@
+import sys
+sys.dont_write_bytecode = True
+
+import os
+import re
+
+import numpy as np
+from langchain_core.documents import Document
+
+from utils.context_window import approx_tokens
+from utils.hybrid_retrieval import bm25_scores, fused_scores
+from utils.vector_index import VectorIndex
+
+# Tokens of web context left after compression, 0 hands the retrieved chunks over unchanged
+CONTEXT_COMPRESSION_TOKENS = int(os.environ.get("CONTEXT_COMPRESSION_TOKENS", "600"))
+# Sentences shorter than this (navigation, buttons, stray markup) are never kept
+MIN_SENTENCE_CHARS = 20
+
+# A line break, or whitespace after sentence-ending punctuation
+SENTENCE_BOUNDARY = re.compile(r"\n+|(?<=[.!?])\s+")
+
+
+def split_sentences(text: str) -> list[tuple[int, str]]:
+    """(offset, sentence) pairs of `text`, stripped, without the too short ones"""
+    sentences = []
+    start = 0
+    for boundary in [*SENTENCE_BOUNDARY.finditer(text), None]:
+        end = boundary.start() if boundary else len(text)
+        sentence = text[start:end].strip()
+        if len(sentence) >= MIN_SENTENCE_CHARS:
+            sentences.append((start, sentence))
+        if boundary:
+            start = boundary.end()
+    return sentences
+
+
+def attributed_context(chunks: list[Document]) -> str:
+    """Whole chunks grouped by source in page order, each group headed by its URL like compressed context"""
+    groups: dict[str, list[Document]] = {}
+    for chunk in chunks:
+        groups.setdefault(chunk.metadata.get("source", ""), []).append(chunk)
+    return "\n\n".join(
+        f"Source: {source}\n" + "\n".join(chunk.page_content for chunk in sorted(kept, key=lambda chunk: chunk.metadata.get("start_index", 0)))
+        for source, kept in groups.items()
+    )
+
+
+def select_sentences(relevance: np.ndarray, token_counts: list[int], groups: list[int], header_tokens: list[int], token_budget: int) -> list[int]:
+    """
+    Most relevant sentences first until the budget is spent; ones too long for
+    what is left are skipped. The first sentence kept from a group also pays for
+    the group's header.
+    """
+    selected = []
+    opened = set()
+    budget = token_budget
+    for i in np.argsort(-relevance, kind="stable"):
+        cost = token_counts[i] + (0 if groups[i] in opened else header_tokens[groups[i]])
+        if cost <= budget:
+            selected.append(int(i))
+            opened.add(groups[i])
+            budget -= cost
+    return selected
+
+
+def compress_context(
+    chunks: list[Document],
+    query: str,
+    query_embedding,
+    chunk_embeddings,
+    token_budget: int = CONTEXT_COMPRESSION_TOKENS,
+) -> str:
+    """
+    Query-focused extractive compression of retrieved chunks.
+
+    Every sentence is scored against the query by the same dense + BM25
+    reciprocal rank fusion as retrieval, and the best ones are kept up to
+    `token_budget` tokens. The dense side reuses the chunk vectors retrieval
+    already has (`chunk_embeddings`, one per chunk): a sentence takes its
+    chunk's similarity to the query and BM25 ranks the sentences within it, so
+    compression embeds nothing. The kept sentences are grouped by source and put
+    back in page order (chunks carry their `start_index`), each group
+    headed by its URL. Context that already fits the budget keeps whole chunks
+    under the same headers.
+    """
+    context = attributed_context(chunks)
+    if token_budget <= 0 or approx_tokens(context) <= token_budget:
+        return context
+
+    chunk_scores = VectorIndex.normalize(chunk_embeddings) @ VectorIndex.normalize(query_embedding)[0]
+    sources: list[str] = []
+    positions = []
+    sentences = []
+    dense = []
+    seen = set()
+    for chunk, chunk_score in zip(chunks, chunk_scores):
+        source = chunk.metadata.get("source", "")
+        if source not in sources:
+            sources.append(source)
+        chunk_start = chunk.metadata.get("start_index", 0)
+        for offset, sentence in split_sentences(chunk.page_content):
+            # Neighbouring chunks of a page overlap, keep one copy of the shared sentences
+            if (source, sentence) in seen:
+                continue
+            seen.add((source, sentence))
+            positions.append((sources.index(source), chunk_start + offset))
+            sentences.append(sentence)
+            dense.append(chunk_score)
+
+    if not sentences:
+        return context
+
+    relevance = fused_scores(np.asarray(dense, dtype=np.float32), bm25_scores(query, sentences))
+
+    headers = [f"Source: {source}\n" for source in sources]
+    selected = select_sentences(
+        relevance,
+        [approx_tokens(sentence) for sentence in sentences],
+        [source for source, _offset in positions],
+        [approx_tokens(header) for header in headers],
+        token_budget,
+    )
+    selected.sort(key=lambda i: positions[i])
+
+    groups: dict[int, list[str]] = {}
+    for i in selected:
+        groups.setdefault(positions[i][0], []).append(sentences[i])
+    return "\n\n".join(headers[source] + " ".join(kept) for source, kept in groups.items())
@@ -0,0 +1,111 @@
+import sys
+sys.dont_write_bytecode = True
+
+import hashlib
+import os
+import re
+from collections import OrderedDict
+from typing import List
+
+from utils.schemas import Message
+
+# Upper bound on prompt tokens sent upstream, whatever the model could take
+CONTEXT_MAX_TOKENS = int(os.environ.get("CONTEXT_MAX_TOKENS", "16000"))
+# Tokens kept free for the model's answer
+CONTEXT_RESPONSE_RESERVE = int(os.environ.get("CONTEXT_RESPONSE_RESERVE", "1024"))
+# Per-message framing overhead (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Context windows by model name pattern, first match wins
+MODEL_CONTEXT_LIMITS = [
+    (r"gemini", 1_000_000),
+    (r"gemma-?3", 128_000),
+    (r"gemma", 8_192),
+    (r"llama-?3\.[1-3]|llama-4", 128_000),
+    (r"qwen", 32_768),
+    (r"mixtral|mistral", 32_768),
+    (r"deepseek", 64_000),
+]
+# Ollama runs models with its own default num_ctx unless told otherwise
+PROVIDER_DEFAULT_LIMITS = {
+    "ollama": int(os.environ.get("OLLAMA_NUM_CTX", "4096")),
+}
+DEFAULT_CONTEXT_LIMIT = 32_768
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def approx_tokens(text: str) -> int:
+    """Cheap token estimate: punctuation counts as one, words as one per ~4 characters"""
+    return sum((len(piece) + 3) // 4 for piece in TOKEN_PATTERN.findall(text))
+
+
+class TokenCounter:
+    """Token counts per message, cached by content hash so each turn only counts the new message"""
+
+    def __init__(self, max_entries: int = 20000):
+        self.max_entries = max_entries
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+
+    def count(self, message: Message) -> int:
+        key = hashlib.sha1(f"{message.role}\0{message.content}".encode("utf-8")).hexdigest()
+        count = self._counts.get(key)
+        if count is None:
+            count = approx_tokens(message.content) + MESSAGE_OVERHEAD_TOKENS
+            self._counts[key] = count
+            if len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        else:
+            self._counts.move_to_end(key)
+        return count
+
+
+token_counter = TokenCounter()
+
+
+def context_limit(provider: str, model: str) -> int:
+    name = model.lower()
+    for pattern, limit in MODEL_CONTEXT_LIMITS:
+        if provider != "ollama" and re.search(pattern, name):
+            return limit
+    return PROVIDER_DEFAULT_LIMITS.get(provider, DEFAULT_CONTEXT_LIMIT)
+
+
+def token_budget(provider: str, model: str) -> int:
+    return max(0, min(context_limit(provider, model), CONTEXT_MAX_TOKENS) - CONTEXT_RESPONSE_RESERVE)
+
+
+def fit_conversation(conversation: List[Message], provider: str, model: str) -> tuple[List[Message], dict]:
+    """
+    Trim the oldest history so the conversation fits the model's token budget.
+
+    The last message (the newest user turn, which carries any web search context)
+    is always kept. Earlier messages are added newest first while they fit, and
+    the kept history never starts with an assistant reply.
+    """
+    budget = token_budget(provider, model)
+    if not conversation:
+        return conversation, {"tokens": 0, "budget": budget, "messages": 0, "dropped": 0}
+
+    counts = [token_counter.count(message) for message in conversation]
+    total = counts[-1]
+    start = len(conversation) - 1
+
+    for i in range(len(conversation) - 2, -1, -1):
+        if total + counts[i] > budget:
+            break
+        total += counts[i]
+        start = i
+
+    while start < len(conversation) - 1 and conversation[start].role == "assistant":
+        total -= counts[start]
+        start += 1
+
+    kept = conversation[start:]
+    stats = {
+        "tokens": total,
+        "budget": budget,
+        "messages": len(kept),
+        "dropped": start,
+    }
+    return kept, stats
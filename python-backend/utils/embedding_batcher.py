@@ -0,0 +1,117 @@
+import sys
+sys.dont_write_bytecode = True
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from utils.metrics import embedding_batch_seconds, embedding_batch_size
+
+EMBEDDING_MAX_BATCH = int(os.environ.get("EMBEDDING_MAX_BATCH", "64"))
+EMBEDDING_MAX_WAIT = float(os.environ.get("EMBEDDING_MAX_WAIT_MS", "10")) / 1000
+# Threads torch may use for one forward pass, 0 keeps the torch default
+EMBEDDING_THREADS = int(os.environ.get("EMBEDDING_THREADS", "0"))
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batching front end for a local embedding model.
+
+    Texts from concurrent callers are queued and grouped until `max_batch` texts
+    are waiting or the oldest has waited `max_wait` seconds. Each group runs as a
+    single forward pass on a dedicated thread and the vectors are handed back to
+    the callers they came from.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[list[str]], list[list[float]]],
+        max_batch: int = EMBEDDING_MAX_BATCH,
+        max_wait: float = EMBEDDING_MAX_WAIT,
+        threads: int = EMBEDDING_THREADS,
+    ):
+        self.embed_fn = embed_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.threads = threads
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding", initializer=self._init_thread)
+        self._dispatcher: asyncio.Task | None = None
+        self._stats = {"texts": 0, "batches": 0, "batch_seconds": 0.0}
+
+    def _init_thread(self):
+        if self.threads > 0:
+            import torch
+            torch.set_num_threads(self.threads)
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        """Embed `texts` as part of whatever batch is being formed"""
+        if not texts:
+            return []
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self.queue.put_nowait((text, future))
+            futures.append(future)
+        return await asyncio.gather(*futures)
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0 and self.queue.empty():
+                    break
+                try:
+                    batch.append(self.queue.get_nowait() if remaining <= 0 else await asyncio.wait_for(self.queue.get(), remaining))
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+
+            # Drop texts whose caller has already given up
+            batch = [(text, future) for text, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            try:
+                vectors = await loop.run_in_executor(self._executor, self.embed_fn, [text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            elapsed = time.perf_counter() - started
+            self._stats["texts"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["batch_seconds"] += elapsed
+            embedding_batch_seconds.observe(elapsed)
+            embedding_batch_size.observe(len(batch))
+
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    async def stop(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        batches, seconds = self._stats["batches"], self._stats["batch_seconds"]
+        return {
+            **self._stats,
+            "mean_batch_size": self._stats["texts"] / batches if batches else 0.0,
+            "texts_per_second": self._stats["texts"] / seconds if seconds else 0.0,
+        }
@@ -0,0 +1,239 @@
+import sys
+sys.dont_write_bytecode = True
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+import numpy as np
+
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", os.path.join(os.getcwd(), "python-backend", "embedding-cache"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+# Persist the index after this many new entries, on top of the save at shutdown
+EMBEDDING_CACHE_SAVE_EVERY = 256
+# Index entries encoded per json.dumps call when saving
+EMBEDDING_CACHE_INDEX_CHUNK = 2048
+# sha256 of the text, stored with every slot
+KEY_BYTES = 32
+
+
+class EmbeddingCache:
+    """
+    Disk-backed cache of chunk embeddings keyed by (model name, sha256 of the text).
+
+    Vectors are stored as float16 rows of a memory-mapped file with a fixed number
+    of slots; a small JSON index maps text hashes to slots in least-recently-used
+    order. When the cache is full the least recently used slot is reused. Only the
+    texts that miss are sent to the embedding model.
+
+    The index is only saved every EMBEDDING_CACHE_SAVE_EVERY inserts, so after a
+    crash it may still map an evicted text to a slot that now holds another
+    vector. Each slot therefore also records the hash of the text it holds, in a
+    second memory-mapped file, and index entries that disagree with it are
+    dropped on load.
+    """
+
+    def __init__(self, model_name: str, directory: str = EMBEDDING_CACHE_DIR, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        self.data_path = os.path.join(directory, f"{safe_name}.f16")
+        self.keys_path = os.path.join(directory, f"{safe_name}.keys")
+        self.index_path = os.path.join(directory, f"{safe_name}.index.json")
+
+        # Guards slots and rows, held only for in-memory work since lookups take it on the event loop
+        self._lock = threading.Lock()
+        # Serializes index writes, which run outside `_lock`
+        self._save_lock = threading.Lock()
+        self._saved_version = 0
+        self._version = 0
+        self._slots: "OrderedDict[str, int]" = OrderedDict()
+        self._free: list[int] = []
+        self._vectors: np.memmap | None = None
+        self._keys: np.memmap | None = None
+        self._dim: int | None = None
+        self._unsaved = 0
+        self._stats = {"hits": 0, "misses": 0, "embed_seconds": 0.0}
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        if not all(os.path.exists(path) for path in (self.index_path, self.data_path, self.keys_path)):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("model") != self.model_name or index.get("max_entries") != self.max_entries:
+                # Layout changed, start over rather than read misaligned rows
+                return
+            self._open(index["dim"], mode="r+")
+            self._slots = OrderedDict(self._verified(index["entries"]))
+            used = set(self._slots.values())
+            self._free = [slot for slot in range(self.max_entries - 1, -1, -1) if slot not in used]
+        except Exception as e:
+            print(f"Error loading embedding cache, starting empty: {e}", file=sys.stderr)
+            self._vectors = None
+            self._keys = None
+            self._dim = None
+            self._slots = OrderedDict()
+
+    def _verified(self, entries: list) -> list:
+        """Index entries whose slot still holds their text, the others were overwritten after the last save"""
+        if not entries:
+            return []
+        slots = np.array([slot for _key, slot in entries], dtype=np.int64)
+        keys = np.frombuffer(b"".join(bytes.fromhex(key) for key, _slot in entries), dtype=np.uint8).reshape(-1, KEY_BYTES)
+        matches = (self._keys[slots] == keys).all(axis=1)
+        if not matches.all():
+            print(f"Embedding cache: dropped {int((~matches).sum())} entries overwritten since the last save", file=sys.stderr)
+        return [entry for entry, match in zip(entries, matches) if match]
+
+    def _open(self, dim: int, mode: str):
+        self._dim = dim
+        self._vectors = np.memmap(self.data_path, dtype=np.float16, mode=mode, shape=(self.max_entries, dim))
+        self._keys = np.memmap(self.keys_path, dtype=np.uint8, mode=mode, shape=(self.max_entries, KEY_BYTES))
+        if mode == "w+":
+            self._slots = OrderedDict()
+            self._free = list(range(self.max_entries - 1, -1, -1))
+
+    @staticmethod
+    def text_key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    async def embed_documents(self, texts: list[str], embed_fn: Callable[[list[str]], Awaitable[list[list[float]]]]) -> list[list[float]]:
+        """Embed `texts`, awaiting `embed_fn` only for texts not already cached"""
+        keys = [self.text_key(text) for text in texts]
+        results: list = [None] * len(texts)
+        missing: dict[str, list[int]] = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                slot = self._slots.get(key)
+                if slot is not None:
+                    self._slots.move_to_end(key)
+                    results[i] = self._vectors[slot].astype(np.float32)
+                else:
+                    missing.setdefault(key, []).append(i)
+            hits = len(texts) - sum(len(positions) for positions in missing.values())
+            self._stats["hits"] += hits
+
+        elapsed = 0.0
+        if missing:
+            miss_texts = [texts[positions[0]] for positions in missing.values()]
+            started = time.perf_counter()
+            embeddings = await embed_fn(miss_texts)
+            elapsed = time.perf_counter() - started
+
+            vectors = [np.asarray(embedding, dtype=np.float32) for embedding in embeddings]
+            for positions, vector in zip(missing.values(), vectors):
+                for i in positions:
+                    results[i] = vector
+            # Writing rows and saving the index touches the disk, keep it off the event loop
+            await asyncio.to_thread(self._insert, list(missing), vectors, elapsed)
+
+        misses = self._stats["misses"]
+        seconds_per_text = self._stats["embed_seconds"] / misses if misses else 0.0
+        print(f"Embedding cache: {hits}/{len(texts)} hits, embedded {len(missing)} in {elapsed:.2f}s, saved ~{hits * seconds_per_text:.2f}s", file=sys.stderr)
+
+        return [vector.tolist() for vector in results]
+
+    def _insert(self, keys: list[str], vectors: list[np.ndarray], elapsed: float):
+        with self._lock:
+            self._stats["misses"] += len(keys)
+            self._stats["embed_seconds"] += elapsed
+            for key, vector in zip(keys, vectors):
+                self._store(key, vector)
+            snapshot = self._snapshot() if self._unsaved >= EMBEDDING_CACHE_SAVE_EVERY else None
+        if snapshot is not None:
+            self._save(snapshot)
+
+    def _store(self, key: str, vector: np.ndarray):
+        if self._vectors is None:
+            self._open(vector.shape[0], mode="w+")
+        if vector.shape[0] != self._dim:
+            return
+
+        if key in self._slots:
+            slot = self._slots[key]
+            self._slots.move_to_end(key)
+        elif self._free:
+            slot = self._free.pop()
+            self._slots[key] = slot
+        else:
+            _evicted, slot = self._slots.popitem(last=False)
+            self._slots[key] = slot
+
+        # The key first, so an index saved before this eviction stops trusting the slot
+        self._keys[slot] = np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+        self._vectors[slot] = vector.astype(np.float16)
+        self._unsaved += 1
+
+    def _snapshot(self) -> tuple[int, dict] | None:
+        """Copy of the index to save, taken under `_lock`; serializing it happens after releasing the lock"""
+        if self._vectors is None:
+            return None
+        self._unsaved = 0
+        self._version += 1
+        return self._version, {
+            "model": self.model_name,
+            "dim": self._dim,
+            "max_entries": self.max_entries,
+            "entries": list(self._slots.items()),
+        }
+
+    def _save(self, snapshot: tuple[int, dict]):
+        version, index = snapshot
+        with self._save_lock:
+            # A newer snapshot may have been written while this one waited
+            if version <= self._saved_version:
+                return
+            self._vectors.flush()
+            self._keys.flush()
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                self._write_index(f, index)
+            os.replace(tmp_path, self.index_path)
+            self._saved_version = version
+
+    @staticmethod
+    def _write_index(f, index: dict):
+        """
+        json.dump(index, f), encoding the entries a chunk at a time. One dumps call
+        of the whole index holds the GIL for tens of milliseconds, stalling the
+        event loop, and json.dump is several times slower.
+        """
+        entries = index["entries"]
+        header = json.dumps({name: value for name, value in index.items() if name != "entries"})
+        f.write(header[:-1] + ', "entries": [')
+        for start in range(0, len(entries), EMBEDDING_CACHE_INDEX_CHUNK):
+            if start:
+                f.write(", ")
+            f.write(json.dumps(entries[start:start + EMBEDDING_CACHE_INDEX_CHUNK])[1:-1])
+        f.write("]}")
+
+    def save(self):
+        with self._lock:
+            snapshot = self._snapshot()
+        if snapshot is None:
+            return
+        try:
+            self._save(snapshot)
+        except Exception as e:
+            print(f"Error saving embedding cache: {e}", file=sys.stderr)
+
+    def stats(self) -> dict:
+        hits, misses = self._stats["hits"], self._stats["misses"]
+        seconds_per_text = self._stats["embed_seconds"] / misses if misses else 0.0
+        return {
+            **self._stats,
+            "entries": len(self._slots),
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "estimated_seconds_saved": hits * seconds_per_text,
+        }
@@ -1,20 +1,22 @@
-from langchain_ollama import OllamaEmbeddings
-from langchain_community.embeddings import HuggingFaceInferenceAPIEmbeddings
-from langchain_huggingface import HuggingFaceEmbeddings
-import torch
 import os
 
+# Each backend pulls in its own heavy stack (torch for the local model), imported only when used
+
 def hf_embeddings(model_name, token):    
+    from langchain_community.embeddings import HuggingFaceInferenceAPIEmbeddings
 
     embeddings = HuggingFaceInferenceAPIEmbeddings(model_name=model_name, api_key=token)
     return embeddings
 
 def ollama_embeddings(model_name):
+    from langchain_ollama import OllamaEmbeddings
 
     embeddings = OllamaEmbeddings(model=model_name)
     return embeddings
 
 def hf_local_embeddings(model_name):
+    import torch
+    from langchain_huggingface import HuggingFaceEmbeddings
 
     if torch.cuda.is_available():
         device = "cuda"
@@ -0,0 +1,151 @@
+import sys
+sys.dont_write_bytecode = True
+
+import math
+import os
+import re
+from collections import Counter
+
+import numpy as np
+from langchain_core.documents import Document
+
+from utils.context_window import approx_tokens
+from utils.vector_index import VectorIndex
+
+# Chunks considered for the final selection, taken from the top of the fused ranking
+RETRIEVAL_CANDIDATES = int(os.environ.get("RETRIEVAL_CANDIDATES", "20"))
+# Tokens of web context handed to the prompt
+RETRIEVAL_TOKEN_BUDGET = int(os.environ.get("RETRIEVAL_TOKEN_BUDGET", "1500"))
+# 1.0 ranks by relevance only, lower values favour chunks unlike those already picked
+RETRIEVAL_MMR_LAMBDA = float(os.environ.get("RETRIEVAL_MMR_LAMBDA", "0.7"))
+# Chunks at least this similar to a picked one are treated as duplicates and skipped
+RETRIEVAL_DUPLICATE_SIMILARITY = float(os.environ.get("RETRIEVAL_DUPLICATE_SIMILARITY", "0.95"))
+# Reciprocal rank fusion constant
+RRF_K = 60
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+TERM_PATTERN = re.compile(r"\w+(?:[.\-]\w+)*")
+
+
+def terms(text: str) -> list[str]:
+    # Keeps "3.11" or "gpt-4o" as single terms so exact versions and names match
+    return TERM_PATTERN.findall(text.lower())
+
+
+def bm25_scores(query: str, texts: list[str]) -> np.ndarray:
+    """Okapi BM25 of `query` against each text, with document frequencies from `texts` themselves"""
+    scores = np.zeros(len(texts), dtype=np.float32)
+    query_terms = set(terms(query))
+    if not texts or not query_terms:
+        return scores
+
+    counts = [Counter(terms(text)) for text in texts]
+    lengths = np.array([sum(count.values()) for count in counts], dtype=np.float32)
+    length_norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(lengths.mean(), 1.0))
+
+    for term in query_terms:
+        tf = np.array([count.get(term, 0) for count in counts], dtype=np.float32)
+        df = int(np.count_nonzero(tf))
+        if df == 0:
+            continue
+        idf = math.log(1 + (len(texts) - df + 0.5) / (df + 0.5))
+        scores += idf * tf * (BM25_K1 + 1) / (tf + length_norm)
+    return scores
+
+
+def rank_positions(scores: np.ndarray) -> np.ndarray:
+    """0-based rank of every entry, best score first"""
+    ranks = np.empty(scores.size, dtype=np.int64)
+    ranks[np.argsort(-scores, kind="stable")] = np.arange(scores.size)
+    return ranks
+
+
+def fused_scores(dense: np.ndarray, lexical: np.ndarray) -> np.ndarray:
+    """Reciprocal rank fusion of the dense and BM25 rankings; chunks without a query term get no lexical share"""
+    fused = 1.0 / (RRF_K + 1 + rank_positions(dense))
+    fused += np.where(lexical > 0, 1.0 / (RRF_K + 1 + rank_positions(lexical)), 0.0)
+    return fused
+
+
+def mmr_select(
+    relevance: np.ndarray,
+    embeddings: np.ndarray,
+    token_counts: list[int],
+    k: int,
+    token_budget: int,
+    mmr_lambda: float = RETRIEVAL_MMR_LAMBDA,
+    duplicate_similarity: float = RETRIEVAL_DUPLICATE_SIMILARITY,
+) -> list[int]:
+    """
+    Maximal Marginal Relevance over candidate chunks.
+
+    `relevance` is rescaled to [0, 1] and `embeddings` must be L2-normalized. The
+    similarity to the picked set is kept as one running maximum per candidate, so
+    each pick costs a single matrix-vector product.
+    """
+    n = relevance.size
+    if n == 0 or k <= 0:
+        return []
+
+    spread = relevance.max() - relevance.min()
+    relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones(n, dtype=np.float32)
+
+    max_similarity = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected = []
+    budget = token_budget
+
+    while len(selected) < k and available.any():
+        marginal = mmr_lambda * relevance - (1 - mmr_lambda) * max_similarity
+        marginal[~available] = -np.inf
+        best = int(np.argmax(marginal))
+        available[best] = False
+
+        if token_counts[best] > budget:
+            # Too long for what is left, a shorter chunk further down may still fit
+            continue
+        selected.append(best)
+        budget -= token_counts[best]
+
+        similarity = embeddings @ embeddings[best]
+        np.maximum(max_similarity, similarity, out=max_similarity)
+        available &= max_similarity < duplicate_similarity
+
+    return selected
+
+
+def hybrid_search(
+    index: VectorIndex,
+    query: str,
+    query_embedding,
+    k: int = 5,
+    token_budget: int = RETRIEVAL_TOKEN_BUDGET,
+    candidates: int = RETRIEVAL_CANDIDATES,
+    mmr_lambda: float = RETRIEVAL_MMR_LAMBDA,
+    duplicate_similarity: float = RETRIEVAL_DUPLICATE_SIMILARITY,
+) -> list[tuple[Document, float]]:
+    """
+    Pick up to k chunks for the prompt: dense and BM25 rankings fused by
+    reciprocal rank, then diversified with MMR under a token budget.
+
+    Returns (document, fused score) pairs in selection order.
+    """
+    if not len(index):
+        return []
+
+    dense = index.scores(query_embedding)
+    texts = [document.page_content for document in index.documents]
+    fused = fused_scores(dense, bm25_scores(query, texts))
+
+    top = np.argsort(-fused, kind="stable")[:max(candidates, k)]
+    picked = mmr_select(
+        fused[top],
+        index.matrix[top],
+        [approx_tokens(texts[i]) for i in top],
+        k,
+        token_budget,
+        mmr_lambda,
+        duplicate_similarity,
+    )
+    return [(index.documents[top[i]], float(fused[top[i]])) for i in picked]
@@ -0,0 +1,150 @@
+import sys
+sys.dont_write_bytecode = True
+
+import re
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable
+
+# Seconds, from a fast cache lookup up to a slow crawl
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+THROUGHPUT_BUCKETS = (1, 5, 10, 25, 50, 100, 200, 500, 1000)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+RATIO_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+METRIC_PREFIX = "chat_backend_"
+INVALID_NAME_CHARS = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def format_labels(label_names: tuple, label_values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus text format, one series per label set"""
+
+    def __init__(self, name: str, help: str, buckets: tuple = LATENCY_BUCKETS, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labels = labels
+        # label values -> [count per bucket..., +Inf count, sum]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, series in self._series.items():
+            cumulative = 0
+            bounds = [*self.buckets, "+Inf"]
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                bucket_labels = format_labels(self.labels, label_values, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            labels = format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def flatten_stats(stats: dict, prefix: str) -> list[tuple[str, float]]:
+    """Numeric leaves of a nested stats dict as (metric name, value) pairs"""
+    values = []
+    for key, value in stats.items():
+        name = INVALID_NAME_CHARS.sub("_", f"{prefix}_{key}")
+        if isinstance(value, dict):
+            values.extend(flatten_stats(value, name))
+        elif isinstance(value, bool):
+            values.append((name, float(value)))
+        elif isinstance(value, (int, float)):
+            values.append((name, value))
+    return values
+
+
+class MetricsRegistry:
+    """Histograms recorded by the pipeline plus the components' stats() dicts, rendered for /metrics"""
+
+    def __init__(self):
+        self.histograms: dict[str, Histogram] = {}
+        self.collectors: list[tuple[str, Callable[[], dict]]] = []
+
+    def histogram(self, name: str, help: str, buckets: tuple = LATENCY_BUCKETS, labels: tuple = ()) -> Histogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(METRIC_PREFIX + name, help, buckets, labels)
+        return histogram
+
+    def register_stats(self, prefix: str, collect: Callable[[], dict]):
+        """Export the numeric values of `collect()` as gauges named <prefix>_<key path>"""
+        self.collectors.append((prefix, collect))
+
+    def render(self) -> str:
+        lines = []
+        for histogram in self.histograms.values():
+            lines.extend(histogram.render())
+        for prefix, collect in self.collectors:
+            for name, value in flatten_stats(collect(), METRIC_PREFIX + prefix):
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+stage_seconds = metrics.histogram("stage_seconds", "Time spent in each stage of a chat request or web search", labels=("stage",))
+time_to_first_token = metrics.histogram("time_to_first_token_seconds", "Time from request arrival to the first streamed token", labels=("provider",))
+tokens_per_second = metrics.histogram("tokens_per_second", "Approximate output tokens per second after the first token", THROUGHPUT_BUCKETS, labels=("provider",))
+page_fetch_seconds = metrics.histogram("page_fetch_seconds", "Time to fetch or crawl one URL", labels=("tier",))
+embedding_batch_seconds = metrics.histogram("embedding_batch_seconds", "Time for one embedding forward pass")
+embedding_batch_size = metrics.histogram("embedding_batch_size", "Texts per embedding forward pass", SIZE_BUCKETS)
+search_prefetch_saved_seconds = metrics.histogram("search_prefetch_saved_seconds", "Search time a chat skipped by claiming a prefetched search")
+context_compression_ratio = metrics.histogram("context_compression_ratio", "Web context tokens kept by compression, as a share of the retrieved ones", RATIO_BUCKETS)
+
+
+class RequestTimings:
+    """Seconds spent per stage of one request, for the optional timing event at the end of a chat stream"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def as_dict(self) -> dict:
+        return {stage: round(seconds, 4) for stage, seconds in self.stages.items()}
+
+
+# Timings of the request the current task works for, inherited by tasks it starts
+current_timings: ContextVar[RequestTimings | None] = ContextVar("current_timings", default=None)
+
+
+def record_stage(stage: str, seconds: float, timings: RequestTimings | None = None):
+    stage_seconds.observe(seconds, stage)
+    timings = timings or current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def span(stage: str, timings: RequestTimings | None = None):
+    """Time the block as `stage`, also when it is left by an exception or cancellation"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started, timings)
@@ -0,0 +1,47 @@
+import sys
+sys.dont_write_bytecode = True
+
+import hashlib
+import os
+
+from utils.model_list import get_gemini_models_list, get_groq_models_list, get_ollama_models_list
+from utils.ttl_cache import AsyncTTLCache
+
+MODEL_CATALOG_TTL = float(os.environ.get("MODEL_CATALOG_TTL", "600"))  # seconds a list is served as fresh
+# Seconds past the TTL during which the old list is served while it refreshes in the background
+MODEL_CATALOG_STALE_TTL = float(os.environ.get("MODEL_CATALOG_STALE_TTL", "86400"))
+# The local Ollama list changes whenever a model is pulled, keep it short
+OLLAMA_CATALOG_TTL = float(os.environ.get("OLLAMA_CATALOG_TTL", "10"))
+
+
+class ModelCatalog:
+    """
+    Cached model lists per (provider, api key hash).
+
+    Lists are fetched without blocking the event loop, concurrent requests for the
+    same list share one upstream call, and an expired list keeps being served while
+    a background refresh replaces it.
+    """
+
+    def __init__(self):
+        self.remote = AsyncTTLCache(ttl=MODEL_CATALOG_TTL, stale_ttl=MODEL_CATALOG_STALE_TTL)
+        self.local = AsyncTTLCache(ttl=OLLAMA_CATALOG_TTL, stale_ttl=MODEL_CATALOG_STALE_TTL)
+
+    @staticmethod
+    def key(provider: str, api_key: str | None = None) -> tuple:
+        return (provider, hashlib.sha256((api_key or "").encode("utf-8")).hexdigest())
+
+    async def gemini(self, api_key: str) -> list[str]:
+        return await self.remote.get(self.key("gemini", api_key), lambda: get_gemini_models_list(api_key))
+
+    async def groq(self, api_key: str) -> list[dict]:
+        return await self.remote.get(self.key("groq", api_key), lambda: get_groq_models_list(api_key))
+
+    async def ollama(self) -> list[str]:
+        return await self.local.get(self.key("ollama"), get_ollama_models_list)
+
+    def stats(self) -> dict:
+        return {"remote": self.remote.stats(), "ollama": self.local.stats()}
+
+
+model_catalog = ModelCatalog()
@@ -1,7 +1,14 @@
 import re
-from google import genai
+import httpx
 from packaging import version
-import requests
+from utils.client_pool import client_pool
+from utils.query_func import GROQ_BASE_URL, OLLAMA_HOST, gemini_client_factory, ollama_client_factory
+
+def http_client_factory():
+    def factory(transport):
+        client = httpx.AsyncClient(transport=transport)
+        return client, client.aclose
+    return factory
 
 def extract_version(model_name):
     """Extracts the version object (e.g., '1.5', '2.0') from the model name."""
@@ -28,14 +35,18 @@ def get_sort_priority(model_name):
         # Base names (like gemini-2.0-flash, gemini-1.5-pro) get lower priority
         return 3
 
-def get_gemini_models_list(api_key):
+async def get_gemini_models_list(api_key):
+    async with client_pool.lease("gemini", api_key, None, gemini_client_factory(api_key)) as client:
+        models = [m async for m in await client.aio.models.list()]
+
+    return filter_gemini_models(models)
+
+def filter_gemini_models(models):
     gemma_models_list = []
     gemini_models_list = []
     filtered_models_data = []
 
-    client = genai.Client(api_key=api_key)
-
-    for m in client.models.list():
+    for m in models:
 
         if 'generateContent' not in m.supported_actions:
             continue
@@ -78,19 +89,29 @@ def get_gemini_models_list(api_key):
     
     return models_list
 
-def get_groq_models_list(api_key):
+async def get_groq_models_list(api_key):
 
         
-        url = "https://api.groq.com/openai/v1/models"
+        url = f"{GROQ_BASE_URL or 'https://api.groq.com'}/openai/v1/models"
         
         headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
 
-        models = requests.get(url, headers=headers).json()
+        async with client_pool.lease("groq-http", api_key, url, http_client_factory()) as client:
+            response = await client.get(url, headers=headers)
+
+        # An error page must not be cached as an empty model list
+        response.raise_for_status()
+        models = response.json()
         model_list = models.get("data", [])
 
         return model_list
 
+async def get_ollama_models_list():
+
+        async with client_pool.lease("ollama", None, OLLAMA_HOST, ollama_client_factory(OLLAMA_HOST)) as client:
+            response = await client.list()
 
+        return [model.get('model') or model.get('name') for model in response.get('models', [])]
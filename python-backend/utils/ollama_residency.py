@@ -0,0 +1,246 @@
+import sys
+sys.dont_write_bytecode = True
+
+import asyncio
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+
+from utils.client_pool import client_pool
+
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+# Models loaded in the background at startup, e.g. "llama3.2,qwen2.5:7b"
+OLLAMA_PRELOAD_MODELS = os.environ.get("OLLAMA_PRELOAD_MODELS", "")
+# How long Ollama keeps a model loaded after its last request: a duration ("30m") or seconds, negative for ever
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+# Per-model overrides, e.g. "llama3.2=-1,qwen2.5:7b=5m"
+OLLAMA_MODEL_KEEP_ALIVE = os.environ.get("OLLAMA_MODEL_KEEP_ALIVE", "")
+# Memory the loaded models may take together, 0 leaves eviction to Ollama
+OLLAMA_MEMORY_BUDGET_GB = float(os.environ.get("OLLAMA_MEMORY_BUDGET_GB", "0"))
+# Seconds a /api/ps snapshot is trusted before a request checks again
+OLLAMA_PS_TTL = float(os.environ.get("OLLAMA_PS_TTL", "2"))
+# Seconds allowed for the ps, tags and unload calls made while chats wait on the lock; loads are unbounded
+OLLAMA_REQUEST_TIMEOUT = float(os.environ.get("OLLAMA_REQUEST_TIMEOUT", "10"))
+
+NUMBER_PATTERN = re.compile(r"-?\d+(\.\d+)?")
+
+
+def model_key(name: str) -> str:
+    # Ollama reports "llama3.2" as "llama3.2:latest"
+    return name if ":" in name else f"{name}:latest"
+
+
+def parse_keep_alive(value: str) -> int | float | str:
+    """Plain numbers are seconds and must be sent as JSON numbers, Ollama rejects durations without a unit"""
+    value = value.strip()
+    if NUMBER_PATTERN.fullmatch(value):
+        return float(value) if "." in value else int(value)
+    return value
+
+
+def parse_keep_alive_overrides(spec: str) -> dict[str, int | float | str]:
+    overrides = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            overrides[model_key(name.strip())] = parse_keep_alive(value)
+    return overrides
+
+
+def http_client_factory():
+    def factory(transport):
+        client = httpx.AsyncClient(transport=transport)
+        return client, client.aclose
+    return factory
+
+
+class ResidentModel:
+    def __init__(self, name: str, size: int = 0, size_vram: int = 0, expires_at: str | None = None):
+        self.name = name
+        self.size = size
+        self.size_vram = size_vram
+        self.expires_at = expires_at
+
+
+class OllamaResidency:
+    """
+    Keeps the models we chat with loaded in the local Ollama server.
+
+    Every chat leases its model: the loaded set is read from /api/ps, and when
+    the model is not resident and would not fit in `memory_budget` bytes the
+    least recently used idle models are unloaded first (keep_alive=0), instead
+    of letting Ollama thrash between models on its own. Chats send the model's
+    keep_alive so it stays loaded between requests. Configured models are
+    loaded at startup so the first request does not pay for the load.
+    """
+
+    def __init__(
+        self,
+        host: str = OLLAMA_HOST,
+        memory_budget: float = OLLAMA_MEMORY_BUDGET_GB * 2**30,
+        keep_alive: str = OLLAMA_KEEP_ALIVE,
+        keep_alive_overrides: str = OLLAMA_MODEL_KEEP_ALIVE,
+        ps_ttl: float = OLLAMA_PS_TTL,
+        request_timeout: float = OLLAMA_REQUEST_TIMEOUT,
+    ):
+        self.host = host.rstrip("/")
+        self.memory_budget = int(memory_budget)
+        self.default_keep_alive = parse_keep_alive(keep_alive)
+        self.keep_alive_overrides = parse_keep_alive_overrides(keep_alive_overrides)
+        self.ps_ttl = ps_ttl
+        self.request_timeout = request_timeout
+
+        self.resident: dict[str, ResidentModel] = {}
+        self.refreshed_at = float("-inf")
+        # Installed model sizes from /api/tags, the estimate for models not loaded yet
+        self.model_sizes: dict[str, int] = {}
+        self.last_used: dict[str, float] = {}
+        self.in_flight: dict[str, int] = {}
+        self._lock = asyncio.Lock()
+        self._stats = {"hits": 0, "misses": 0, "loads": 0, "evictions": 0, "errors": 0}
+
+    def keep_alive(self, model: str) -> int | float | str:
+        return self.keep_alive_overrides.get(model_key(model), self.default_keep_alive)
+
+    async def _request(self, method: str, path: str, bounded: bool = True, **kwargs) -> dict:
+        """Call the Ollama API, within `request_timeout` unless `bounded` is False"""
+        timeout = self.request_timeout if bounded else None
+        async with client_pool.lease("ollama-http", None, self.host, http_client_factory()) as client:
+            response = await client.request(method, f"{self.host}{path}", timeout=timeout, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def refresh(self, max_age: float = 0.0):
+        """Re-read the loaded models from /api/ps unless the last snapshot is younger than `max_age`"""
+        if time.monotonic() - self.refreshed_at < max_age:
+            return
+        data = await self._request("GET", "/api/ps")
+        self.resident = {
+            model_key(item.get("model") or item["name"]): ResidentModel(
+                model_key(item.get("model") or item["name"]),
+                item.get("size", 0),
+                item.get("size_vram", 0),
+                item.get("expires_at"),
+            )
+            for item in data.get("models", [])
+        }
+        self.refreshed_at = time.monotonic()
+
+    async def estimated_size(self, model: str) -> int:
+        if model not in self.model_sizes:
+            data = await self._request("GET", "/api/tags")
+            for item in data.get("models", []):
+                self.model_sizes[model_key(item.get("model") or item["name"])] = item.get("size", 0)
+        return self.model_sizes.get(model, 0)
+
+    def used_memory(self) -> int:
+        return sum(resident.size for resident in self.resident.values())
+
+    async def load(self, model: str):
+        """Load `model` now, a generate request without a prompt only loads it"""
+        key = model_key(model)
+        # Loading a large model from disk can take minutes, and no chat waits on it
+        await self._request("POST", "/api/generate", bounded=False, json={"model": model, "keep_alive": self.keep_alive(model)})
+        self._stats["loads"] += 1
+        self.last_used[key] = time.monotonic()
+        self.refreshed_at = float("-inf")
+
+    async def unload(self, model: str):
+        await self._request("POST", "/api/generate", json={"model": model, "keep_alive": 0})
+        self.resident.pop(model_key(model), None)
+
+    async def make_room(self, model: str):
+        """Unload least recently used idle models until `model` fits in the budget"""
+        needed = await self.estimated_size(model)
+        idle = sorted(
+            (name for name in self.resident if name != model and not self.in_flight.get(name)),
+            key=lambda name: self.last_used.get(name, 0.0),
+        )
+        for name in idle:
+            if self.used_memory() + needed <= self.memory_budget:
+                break
+            print(f"Unloading Ollama model {name} to make room for {model}", file=sys.stderr)
+            await self.unload(name)
+            self._stats["evictions"] += 1
+
+    async def prepare(self, model: str):
+        """Record whether `model` is resident and evict others if it has to be loaded over budget"""
+        key = model_key(model)
+        async with self._lock:
+            await self.refresh(self.ps_ttl)
+            if key in self.resident:
+                self._stats["hits"] += 1
+                return
+            self._stats["misses"] += 1
+            if self.memory_budget > 0:
+                await self.make_room(key)
+            # The chat request loads it, the next lease sees it in a fresh snapshot
+            self.refreshed_at = float("-inf")
+
+    @asynccontextmanager
+    async def lease(self, model: str):
+        """Hold `model` for the duration of a chat so it is never evicted mid-stream"""
+        key = model_key(model)
+        self.in_flight[key] = self.in_flight.get(key, 0) + 1
+        try:
+            try:
+                await self.prepare(model)
+            except httpx.HTTPError as e:
+                # Residency is an optimization, the chat itself reports Ollama being down
+                self._stats["errors"] += 1
+                print(f"Ollama residency check failed: {e}", file=sys.stderr)
+            yield self.keep_alive(model)
+        finally:
+            self.in_flight[key] -= 1
+            if not self.in_flight[key]:
+                del self.in_flight[key]
+            self.last_used[key] = time.monotonic()
+
+    async def preload(self, models: list[str]) -> dict[str, float]:
+        """Load `models` one after the other, returning seconds spent on each"""
+        timings = {}
+        for model in (model.strip() for model in models):
+            if not model:
+                continue
+            started = time.perf_counter()
+            async with self.lease(model):
+                await self.load(model)
+            timings[model] = round(time.perf_counter() - started, 3)
+        return timings
+
+    async def state(self) -> dict:
+        """Loaded models as Ollama reports them, with our usage bookkeeping"""
+        async with self._lock:
+            await self.refresh()
+        now = time.monotonic()
+        return {
+            "memory_budget": self.memory_budget,
+            "memory_used": self.used_memory(),
+            "models": [
+                {
+                    "name": resident.name,
+                    "size": resident.size,
+                    "size_vram": resident.size_vram,
+                    "expires_at": resident.expires_at,
+                    "keep_alive": self.keep_alive(resident.name),
+                    "idle_seconds": round(now - self.last_used[resident.name], 1) if resident.name in self.last_used else None,
+                    "in_flight": self.in_flight.get(resident.name, 0),
+                }
+                for resident in sorted(self.resident.values(), key=lambda resident: -self.last_used.get(resident.name, 0.0))
+            ],
+            "stats": self.stats(),
+        }
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "loaded_models": len(self.resident),
+            "memory_used": self.used_memory(),
+            "memory_budget": self.memory_budget,
+        }
+
+
+ollama_residency = OllamaResidency()
@@ -0,0 +1,183 @@
+import sys
+sys.dont_write_bytecode = True
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+
+import httpx
+
+from utils.page_fetcher import FETCH_MIN_TEXT_CHARS, FetchedPage, extract_markdown, looks_js_rendered, read_html
+
+PAGE_CACHE_DIR = os.environ.get("PAGE_CACHE_DIR", os.path.join(os.getcwd(), "python-backend", "page-cache"))
+PAGE_CACHE_TTL = float(os.environ.get("PAGE_CACHE_TTL", "3600"))  # seconds a page is served without revalidation
+PAGE_CACHE_MAX_BYTES = int(os.environ.get("PAGE_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+PAGE_CACHE_REVALIDATE_TIMEOUT = 5.0
+
+
+class PageCache:
+    """
+    Disk-backed cache of extracted page markdown keyed by URL identity.
+
+    Fresh entries (younger than `ttl`) are served straight from disk. Stale entries
+    that carry an ETag or Last-Modified header are revalidated with a conditional
+    GET; a 304 renews them and a 200 with readable HTML replaces them, anything
+    else sends the URL back to the crawler. Stored bytes are capped at
+    `max_bytes`, evicting the least recently used pages first.
+    """
+
+    def __init__(self, directory: str = PAGE_CACHE_DIR, ttl: float = PAGE_CACHE_TTL, max_bytes: int = PAGE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(directory, "index.json")
+        self._entries: dict[str, dict] = {}
+        self._http: httpx.AsyncClient | None = None
+        self._stats = {"hits": 0, "revalidated": 0, "replaced": 0, "misses": 0, "stored": 0, "evicted": 0}
+
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading page cache index, starting empty: {e}", file=sys.stderr)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".md")
+
+    @property
+    def size(self) -> int:
+        return sum(entry["size"] for entry in self._entries.values())
+
+    async def get(self, key: str, url: str) -> str | None:
+        """Return the cached markdown for `url`, revalidating it first if it is stale"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+
+        if time.time() - entry["fetched_at"] > self.ttl:
+            not_modified, page = await self._revalidate(url, entry)
+            if page is not None:
+                # The page changed and the 200 carried it, store it rather than crawl it again
+                await self.put(key, url, page.markdown, headers=page.headers)
+                self._stats["replaced"] += 1
+                self._stats["hits"] += 1
+                return page.markdown
+            if not not_modified:
+                self._stats["misses"] += 1
+                return None
+            entry["fetched_at"] = time.time()
+            self._stats["revalidated"] += 1
+
+        try:
+            markdown = await asyncio.to_thread(self._read, self._path(key))
+        except OSError:
+            self._entries.pop(key, None)
+            self._stats["misses"] += 1
+            return None
+
+        entry["last_access"] = time.time()
+        self._stats["hits"] += 1
+        return markdown
+
+    async def _revalidate(self, url: str, entry: dict) -> tuple[bool, FetchedPage | None]:
+        """Conditional GET: whether the page is unchanged, and the new page when a 200 brought one"""
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        if not headers:
+            return False, None
+
+        if self._http is None:
+            self._http = httpx.AsyncClient(follow_redirects=True, timeout=PAGE_CACHE_REVALIDATE_TIMEOUT)
+        try:
+            async with self._http.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304:
+                    return True, None
+                html = await read_html(response)
+        except Exception as e:
+            print(f"Error revalidating {url}: {e}", file=sys.stderr)
+            return False, None
+
+        if html is None or looks_js_rendered(html):
+            return False, None
+        markdown = await asyncio.to_thread(extract_markdown, html)
+        if len(markdown) < FETCH_MIN_TEXT_CHARS:
+            return False, None
+        return False, FetchedPage(url=url, markdown=markdown, headers=dict(response.headers))
+
+    async def put(self, key: str, url: str, markdown: str, headers: dict | None = None):
+        headers = {name.lower(): value for name, value in (headers or {}).items()}
+        data = markdown.encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+
+        await asyncio.to_thread(self._write, self._path(key), data)
+        now = time.time()
+        self._entries[key] = {
+            "url": url,
+            "size": len(data),
+            "fetched_at": now,
+            "last_access": now,
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+        }
+        self._stats["stored"] += 1
+        await self._evict()
+        await asyncio.to_thread(self._save_index, json.dumps(self._entries))
+
+    async def _evict(self):
+        total = self.size
+        if total <= self.max_bytes:
+            return
+        for key in sorted(self._entries, key=lambda k: self._entries[k]["last_access"]):
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                continue
+            total -= entry["size"]
+            self._stats["evicted"] += 1
+            try:
+                await asyncio.to_thread(os.remove, self._path(key))
+            except OSError:
+                pass
+            if total <= self.max_bytes:
+                break
+
+    @staticmethod
+    def _read(path: str) -> str:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    @staticmethod
+    def _write(path: str, data: bytes):
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def _save_index(self, serialized: str):
+        tmp_path = f"{self.index_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(serialized)
+        os.replace(tmp_path, self.index_path)
+
+    async def aclose(self):
+        await asyncio.to_thread(self._save_index, json.dumps(self._entries))
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def stats(self) -> dict:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,207 @@
+import sys
+sys.dont_write_bytecode = True
+
+import asyncio
+import os
+import re
+import time
+from dataclasses import dataclass
+from html.parser import HTMLParser
+
+import httpx
+
+from utils.metrics import page_fetch_seconds
+
+FETCH_TIMEOUT = float(os.environ.get("FETCH_TIMEOUT", "6"))  # seconds for the plain HTTP tier
+# Pages whose extracted text is shorter than this are handed to the headless browser
+FETCH_MIN_TEXT_CHARS = int(os.environ.get("FETCH_MIN_TEXT_CHARS", "600"))
+# HTML read per page, the rest of a longer body is left unread
+FETCH_MAX_BYTES = int(os.environ.get("FETCH_MAX_BYTES", str(2 * 1024 * 1024)))
+FETCH_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36"
+
+SKIP_TAGS = {"script", "style", "noscript", "nav", "footer", "header", "form", "aside", "svg", "iframe", "button", "select", "template"}
+BLOCK_TAGS = {"p", "li", "pre", "blockquote", "td", "th", "dd", "dt", "h1", "h2", "h3", "h4", "h5", "h6"}
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+# Markers of client-side rendered shells that have no useful server HTML
+JS_SHELL_PATTERNS = [
+    re.compile(r'<div[^>]+id="(?:root|app|__next|__nuxt)"[^>]*>\s*</div>', re.IGNORECASE),
+    re.compile(r"<noscript>[^<]*(?:enable|requires?) javascript", re.IGNORECASE),
+]
+
+
+class ReadableTextParser(HTMLParser):
+    """
+    Readability-style extraction of the main text of a page into markdown.
+
+    Text is collected per block element, chrome such as navigation, headers,
+    footers, forms and scripts is skipped, and blocks that are mostly link text
+    (menus, tag clouds, related-article lists) are dropped.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: list[str] = []
+        self._skip_depth = 0
+        self._block_tag: str | None = None
+        self._text: list[str] = []
+        self._link_chars = 0
+        self._in_link = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            return
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self._flush()
+            self._block_tag = tag
+        elif tag == "a":
+            self._in_link += 1
+        elif tag in ("div", "section", "article", "tr"):
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in BLOCK_TAGS or tag in ("div", "section", "article", "tr"):
+            self._flush()
+        elif tag == "a":
+            self._in_link = max(0, self._in_link - 1)
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        self._text.append(data)
+        if self._in_link:
+            self._link_chars += len(data.strip())
+
+    def _flush(self):
+        text = " ".join("".join(self._text).split())
+        tag = self._block_tag or "p"
+        link_chars = self._link_chars
+        self._text, self._link_chars, self._block_tag = [], 0, None
+
+        if not text:
+            return
+        if link_chars > 0.5 * len(text):
+            return
+        if tag[0] == "h" and tag[1:].isdigit():
+            self.blocks.append("#" * int(tag[1:]) + " " + text)
+        elif tag == "li":
+            self.blocks.append("- " + text)
+        elif tag == "pre":
+            self.blocks.append("```\n" + text + "\n```")
+        elif len(text) >= 25 or tag in ("td", "th", "dd", "dt"):
+            self.blocks.append(text)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def extract_markdown(html: str) -> str:
+    parser = ReadableTextParser()
+    parser.feed(html)
+    parser.close()
+    return "\n\n".join(parser.blocks)
+
+
+def looks_js_rendered(html: str) -> bool:
+    return any(pattern.search(html) for pattern in JS_SHELL_PATTERNS)
+
+
+async def read_html(response: httpx.Response, max_bytes: int = FETCH_MAX_BYTES) -> str | None:
+    """
+    Body of a streamed 200 HTML response, at most `max_bytes` of it. Anything
+    else returns None from the headers alone, before the body is downloaded.
+    """
+    if response.status_code != 200 or "html" not in response.headers.get("content-type", ""):
+        return None
+    body = bytearray()
+    async for chunk in response.aiter_bytes():
+        body += chunk
+        if len(body) >= max_bytes:
+            del body[max_bytes:]
+            break
+    return body.decode(response.charset_encoding or "utf-8", errors="replace")
+
+
+@dataclass
+class FetchedPage:
+    url: str
+    markdown: str
+    headers: dict
+
+
+class PageFetcher:
+    """
+    First, cheap tier of the crawler: a pooled HTTP GET plus text extraction.
+
+    `fetch` returns None when the page needs the headless browser instead: the
+    request failed, the response is not HTML, the page is a JavaScript shell or
+    the extracted text is nearly empty. Only the first `max_bytes` of a page are
+    read. Counts and latency are tracked per tier.
+    """
+
+    def __init__(self, timeout: float = FETCH_TIMEOUT, min_text_chars: int = FETCH_MIN_TEXT_CHARS, max_bytes: int = FETCH_MAX_BYTES):
+        self.min_text_chars = min_text_chars
+        self.max_bytes = max_bytes
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            follow_redirects=True,
+            headers={"User-Agent": FETCH_USER_AGENT, "Accept": "text/html,application/xhtml+xml"},
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+        )
+        self._stats = {
+            "http": {"pages": 0, "timed": 0, "seconds": 0.0},
+            "browser": {"pages": 0, "timed": 0, "seconds": 0.0},
+            "escalated": 0,
+        }
+
+    async def fetch(self, url: str) -> FetchedPage | None:
+        started = time.perf_counter()
+        try:
+            async with self._client.stream("GET", url) as response:
+                html = await read_html(response, self.max_bytes)
+        except Exception as e:
+            print(f"HTTP fetch failed for {url}, escalating to browser: {e}", file=sys.stderr)
+            self._stats["escalated"] += 1
+            return None
+
+        if html is None:
+            self._stats["escalated"] += 1
+            return None
+
+        # Parsing a large page takes a few milliseconds, keep it off the event loop
+        markdown = "" if looks_js_rendered(html) else await asyncio.to_thread(extract_markdown, html)
+        if len(markdown) < self.min_text_chars:
+            self._stats["escalated"] += 1
+            return None
+
+        self.record("http", time.perf_counter() - started)
+        return FetchedPage(url=url, markdown=markdown, headers=dict(response.headers))
+
+    def record(self, tier: str, seconds: float | None):
+        """Count a page served by `tier`, with its fetch time when known"""
+        self._stats[tier]["pages"] += 1
+        if seconds is None:
+            return
+        page_fetch_seconds.observe(seconds, tier)
+        self._stats[tier]["timed"] += 1
+        self._stats[tier]["seconds"] += seconds
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    def stats(self) -> dict:
+        served = self._stats["http"]["pages"] + self._stats["browser"]["pages"]
+        stats = {"escalated": self._stats["escalated"]}
+        for tier in ("http", "browser"):
+            pages, timed, seconds = self._stats[tier]["pages"], self._stats[tier]["timed"], self._stats[tier]["seconds"]
+            stats[tier] = {
+                "pages": pages,
+                "share": pages / served if served else 0.0,
+                "mean_latency": seconds / timed if timed else 0.0,
+            }
+        return stats
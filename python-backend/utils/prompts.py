@@ -2,7 +2,6 @@ import sys
 sys.dont_write_bytecode = True
 
 import re
-from google.genai import types
 
 def prompt_with_context(context: str, query: str):
 
@@ -56,6 +55,7 @@ def base_prompt(query_text: str):
     return prompt
 
 def gemini_prompt_format(prompt: list):
+    from google.genai import types
 
     content = []
 
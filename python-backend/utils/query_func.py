@@ -1,165 +1,218 @@
 import sys
 sys.dont_write_bytecode = True
 
-from fastapi.responses import StreamingResponse
 import asyncio
-import json
-import ollama
-from groq import Groq
-from openai import OpenAI
-from huggingface_hub import InferenceClient
-from google import genai
-from google.genai import types
+import importlib
+import os
+import time
+import httpx
+from typing import AsyncIterator
 from utils.prompts import gemini_prompt_format
 from utils.schemas import ChatRequest, RequestState
+from utils.sse import format_chunk, format_error, coalesce_deltas
+from utils.client_pool import client_pool
+from utils.context_window import approx_tokens
+from utils.metrics import record_stage, time_to_first_token, tokens_per_second
+from utils.ollama_residency import OLLAMA_HOST, ollama_residency
 
-async def format_chunk(content: str, model: str) -> str:
-    """Format a chunk for SSE streaming"""
-    data = {
-        "content": content,
-        "model": model
-    }
-    return f"data: {json.dumps(data)}\n\n"
+OPENROUTER_BASE_URL = os.environ.get("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+# Unset means the SDK default; overridden to point at local stand-ins (see benchmarks/)
+GROQ_BASE_URL = os.environ.get("GROQ_BASE_URL")
+GEMINI_BASE_URL = os.environ.get("GEMINI_BASE_URL")
 
-async def chat_ollama(request: ChatRequest, state: RequestState):
-    async def generate():
+# SDKs are imported on first use so startup only pays for the providers actually used
+PROVIDER_MODULES = {
+    "ollama": "ollama",
+    "huggingface": "huggingface_hub",
+    "openrouter": "openai",
+    "groq": "groq",
+    "gemini": "google.genai",
+}
+
+def ollama_client_factory(host: str):
+    def factory(transport):
+        from ollama import AsyncClient as AsyncOllama
+
+        client = AsyncOllama(host=host, transport=transport)
+        return client, client._client.aclose
+    return factory
+
+def openai_client_factory(module: str, class_name: str, api_key: str, base_url: str | None = None):
+    # Groq and OpenRouter (through the OpenAI SDK) both accept a custom httpx client
+    def factory(transport):
+        client_cls = getattr(importlib.import_module(module), class_name)
+        http_client = httpx.AsyncClient(transport=transport)
+        kwargs = {"base_url": base_url} if base_url else {}
+        client = client_cls(api_key=api_key, http_client=http_client, **kwargs)
+        # The chat resource is imported on first access, resolve it while off the event loop
+        client.chat.completions
+        return client, client.close
+    return factory
+
+def huggingface_client_factory(token: str):
+    # The HF async client runs on aiohttp, so the shared transport is not used
+    def factory(transport):
+        from huggingface_hub import AsyncInferenceClient
+
+        client = AsyncInferenceClient(token=token)
+        return client, client.close
+    return factory
+
+def gemini_client_factory(api_key: str):
+    def factory(transport):
+        from google import genai
+        from google.genai import types
+
+        http_options = types.HttpOptions(base_url=GEMINI_BASE_URL) if GEMINI_BASE_URL else None
+        client = genai.Client(api_key=api_key, http_options=http_options)
+
+        async def close():
+            aclose = getattr(client.aio, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+        return client, close
+    return factory
+
+async def stream_deltas(deltas: AsyncIterator[str], request: ChatRequest, state: RequestState) -> AsyncIterator[str]:
+    """Turn a provider's text deltas into SSE frames, stopping as soon as the request is cancelled"""
+    provider = request.model.provider.lower()
+    started = time.perf_counter()
+    first_token_at = None
+    try:
+        async for content in coalesce_deltas(deltas, stop=state.cancelled):
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+                record_stage("chat.first_token", first_token_at - started, state.timings)
+                time_to_first_token.observe(state.timings.elapsed(), provider)
+            state.response.append(content)
+            yield await format_chunk(content, request.model.name)
+        state.completed = not state.is_disconnected()
+
+    except Exception as e:
+        yield format_error(str(e))
+    finally:
+        if first_token_at is not None:
+            # Measured once per stream, nothing is added to the per-token path
+            generation = time.perf_counter() - first_token_at
+            record_stage("chat.generation", generation, state.timings)
+            if generation > 0:
+                tokens_per_second.observe(approx_tokens("".join(state.response)) / generation, provider)
+        # Closes the upstream stream right away when the request was cancelled
+        await deltas.aclose()
+
+def openai_style_deltas(stream) -> AsyncIterator[str]:
+    """Extract the text deltas from an OpenAI-compatible chat completion stream"""
+    async def deltas():
         try:
-            messages = [{"role": msg.role, "content": msg.content} for msg in request.conversation]
-            stream = ollama.chat(
+            async for chunk in stream:
+                if chunk and chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await close_stream(stream)
+
+    return deltas()
+
+async def close_stream(stream):
+    """Release the HTTP response behind an SDK stream"""
+    close = getattr(stream, "close", None) or getattr(stream, "aclose", None)
+    if close is not None:
+        result = close()
+        if asyncio.iscoroutine(result):
+            await result
+
+async def chat_ollama(request: ChatRequest, state: RequestState):
+    async def deltas():
+        messages = [{"role": msg.role, "content": msg.content} for msg in request.conversation]
+
+        async with ollama_residency.lease(request.model.name) as keep_alive, \
+                client_pool.lease("ollama", None, OLLAMA_HOST, ollama_client_factory(OLLAMA_HOST)) as client:
+            stream = await client.chat(
                 model=request.model.name,
                 messages=messages,
                 stream=True,
+                keep_alive=keep_alive,
             )
-            
-            for chunk in stream:
-                if state.is_disconnected():
-                    # Client disconnected, stop streaming
-                    break
-                    
-                if chunk and chunk.get('message', {}).get('content'):
-                    content = chunk['message']['content']
-                    yield await format_chunk(content, request.model.name)
-                    await asyncio.sleep(0.01)  # Small delay to ensure proper streaming
-                    
-        except Exception as e:
-            error_data = {"error": str(e)}
-            yield f"data: {json.dumps(error_data)}\n\n"
-    
-    return StreamingResponse(generate(), media_type="text/event-stream")
+
+            try:
+                async for chunk in stream:
+                    if chunk and chunk.get('message', {}).get('content'):
+                        yield chunk['message']['content']
+            finally:
+                await close_stream(stream)
+
+    return stream_deltas(deltas(), request, state)
 
 async def chat_huggingface(request: ChatRequest, state: RequestState):
-    async def generate():
-        try:
-            client = InferenceClient(request.model.name, token=request.model.key)
-            messages = [{"role": msg.role, "content": msg.content} for msg in request.conversation]
-            
-            stream = client.chat.completions.create(
+    async def deltas():
+        messages = [{"role": msg.role, "content": msg.content} for msg in request.conversation]
+
+        async with client_pool.lease("huggingface", request.model.key, None, huggingface_client_factory(request.model.key)) as client:
+            stream = await client.chat.completions.create(
                 model=request.model.name,
                 messages=messages,
                 stream=True,
             )
-            
-            for chunk in stream:
-                if state.is_disconnected():
-                    # Client disconnected, stop streaming
-                    break
-                    
-                if chunk and chunk.choices[0].delta.content:
-                    content = chunk.choices[0].delta.content
-                    yield await format_chunk(content, request.model.name)
-                    await asyncio.sleep(0.01)  # Small delay to ensure proper streaming
-                    
-        except Exception as e:
-            error_data = {"error": str(e)}
-            yield f"data: {json.dumps(error_data)}\n\n"
-    
-    return StreamingResponse(generate(), media_type="text/event-stream")
+
+            async for content in openai_style_deltas(stream):
+                yield content
+
+    return stream_deltas(deltas(), request, state)
 
 async def chat_openrouter(request: ChatRequest, state: RequestState):
-    async def generate():
-        try:
-            client = OpenAI(
-                api_key=request.model.key,
-                base_url='https://openrouter.ai/api/v1'
-            )
-            
-            messages = [{"role": msg.role, "content": msg.content} for msg in request.conversation]
-            stream = client.chat.completions.create(
+    async def deltas():
+        factory = openai_client_factory("openai", "AsyncOpenAI", request.model.key, OPENROUTER_BASE_URL)
+
+        messages = [{"role": msg.role, "content": msg.content} for msg in request.conversation]
+
+        async with client_pool.lease("openrouter", request.model.key, OPENROUTER_BASE_URL, factory) as client:
+            stream = await client.chat.completions.create(
                 model=request.model.name,
                 messages=messages,
                 stream=True,
             )
-            
-            for chunk in stream:
-                if state.is_disconnected():
-                    # Client disconnected, stop streaming
-                    break
-                    
-                if chunk and chunk.choices[0].delta.content:
-                    content = chunk.choices[0].delta.content
-                    yield await format_chunk(content, request.model.name)
-                    await asyncio.sleep(0.01)  # Small delay to ensure proper streaming
-                    
-        except Exception as e:
-            error_data = {"error": str(e)}
-            yield f"data: {json.dumps(error_data)}\n\n"
-    
-    return StreamingResponse(generate(), media_type="text/event-stream")
+
+            async for content in openai_style_deltas(stream):
+                yield content
+
+    return stream_deltas(deltas(), request, state)
 
 async def chat_groq(request: ChatRequest, state: RequestState):
-    async def generate():
-        try:
-            client = Groq(api_key=request.model.key)
-            
-            messages = [{"role": msg.role, "content": msg.content} for msg in request.conversation]
-            stream = client.chat.completions.create(
+    async def deltas():
+        factory = openai_client_factory("groq", "AsyncGroq", request.model.key, GROQ_BASE_URL)
+
+        messages = [{"role": msg.role, "content": msg.content} for msg in request.conversation]
+
+        async with client_pool.lease("groq", request.model.key, GROQ_BASE_URL, factory) as client:
+            stream = await client.chat.completions.create(
                 model=request.model.name,
                 messages=messages,
                 stream=True,
             )
-            
-            for chunk in stream:
-                if state.is_disconnected():
-                    # Client disconnected, stop streaming
-                    break
-                    
-                if chunk and chunk.choices[0].delta.content:
-                    content = chunk.choices[0].delta.content
-                    yield await format_chunk(content, request.model.name)
-                    await asyncio.sleep(0.01)  # Small delay to ensure proper streaming
-                    
-        except Exception as e:
-            error_data = {"error": str(e)}
-            yield f"data: {json.dumps(error_data)}\n\n"
-    
-    return StreamingResponse(generate(), media_type="text/event-stream")
 
-async def chat_gemini(request: ChatRequest, state: RequestState):
-    async def generate():
-        try:
-            
-            gen_config = types.GenerateContentConfig(
-                response_mime_type="text/plain",
-            )
+            async for content in openai_style_deltas(stream):
+                yield content
 
-            client = genai.Client(api_key=request.model.key)
+    return stream_deltas(deltas(), request, state)
+
+async def chat_gemini(request: ChatRequest, state: RequestState):
+    async def deltas():
+        from google.genai import types
 
-            gemini_prompt = gemini_prompt_format(request.conversation)
+        gen_config = types.GenerateContentConfig(
+            response_mime_type="text/plain",
+        )
 
-            chunks = client.models.generate_content_stream(model=request.model.name,contents=gemini_prompt,config=gen_config)
+        gemini_prompt = gemini_prompt_format(request.conversation)
 
+        async with client_pool.lease("gemini", request.model.key, None, gemini_client_factory(request.model.key)) as client:
+            chunks = await client.aio.models.generate_content_stream(model=request.model.name,contents=gemini_prompt,config=gen_config)
 
-            for chunk in chunks:
+            try:
+                async for chunk in chunks:
+                    if chunk.text:
+                        yield chunk.text
+            finally:
+                await close_stream(chunks)
 
-                if state.is_disconnected():
-                    # Client disconnected, stop streaming
-                    break
-                    
-                if chunk.text:
-                    yield await format_chunk(chunk.text, request.model.name)
-                    await asyncio.sleep(0.01)  # Small delay to ensure proper streaming
-        except Exception as e:
-            error_data = {"error": str(e)}
-            yield f"data: {json.dumps(error_data)}\n\n"
-    
-    return StreamingResponse(generate(), media_type="text/event-stream")
\ No newline at end of file
+    return stream_deltas(deltas(), request, state)
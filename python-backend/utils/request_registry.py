@@ -0,0 +1,72 @@
+import sys
+sys.dont_write_bytecode = True
+
+import asyncio
+import uuid
+
+from starlette.requests import Request
+
+from utils.schemas import RequestState
+
+
+class RequestRegistry:
+    """
+    Live /api/chat requests by unique id.
+
+    Each request gets a watcher that waits for the client's `http.disconnect`
+    message and cancels the request the moment it arrives, which stops the
+    upstream stream and any pending web search without waiting for the next token.
+    """
+
+    def __init__(self):
+        self._requests: dict[str, RequestState] = {}
+
+    def create(self) -> RequestState:
+        """A request with a fresh id, live only once `register` runs"""
+        return RequestState(uuid.uuid4().hex, registry=self)
+
+    def register(self, request: Request, state: RequestState):
+        """
+        Make `state` live and watch for the client going away. Called from the
+        response body, so a client that disconnects before the body starts
+        leaves nothing behind that only the body's cleanup would remove.
+        """
+        self._requests[state.request_id] = state
+        self.watch_disconnect(request, state)
+
+    def get(self, request_id: str) -> RequestState | None:
+        return self._requests.get(request_id)
+
+    def cancel(self, request_id: str, reason: str) -> bool:
+        state = self._requests.get(request_id)
+        if state is None:
+            return False
+        print(f"Cancelling request {request_id}: {reason}")
+        state.cancel(reason)
+        return True
+
+    def release(self, request_id: str):
+        self._requests.pop(request_id, None)
+
+    def watch_disconnect(self, request: Request, state: RequestState) -> asyncio.Task:
+        async def watch():
+            while True:
+                message = await request.receive()
+                if message["type"] == "http.disconnect":
+                    self.cancel(state.request_id, "client disconnected")
+                    return
+
+        # Tracked so the watcher stops when the request finishes
+        task = asyncio.create_task(watch())
+        state.track(task)
+        return task
+
+    def cancel_all(self, reason: str):
+        for request_id in list(self._requests):
+            self.cancel(request_id, reason)
+
+    def __len__(self):
+        return len(self._requests)
+
+
+request_registry = RequestRegistry()
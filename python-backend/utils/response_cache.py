@@ -0,0 +1,172 @@
+import sys
+sys.dont_write_bytecode = True
+
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import List
+
+from utils.schemas import Message
+
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "3600"))  # seconds, 0 disables the cache
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Cosine similarity between two questions above which the semantic tier reuses an answer
+RESPONSE_CACHE_SIMILARITY = float(os.environ.get("RESPONSE_CACHE_SIMILARITY", "0.95"))
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    return WHITESPACE.sub(" ", text).strip().lower()
+
+
+def conversation_hash(conversation: List[Message], web_search: bool = False) -> str:
+    normalized = [(message.role, normalize_text(message.content)) for message in conversation]
+    payload = json.dumps([web_search, normalized], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def api_key_hash(api_key: str | None) -> str:
+    # Answers paid for with one key are never replayed to a caller with another
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+
+
+def unit_vector(embedding):
+    import numpy as np
+
+    vector = np.asarray(embedding, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+class CachedResponse:
+    def __init__(self, pieces: List[str], sources: List[str], scope: tuple, embedding=None):
+        self.pieces = pieces
+        self.sources = sources
+        self.scope = scope
+        self.embedding = embedding
+        self.size = sum(len(piece.encode("utf-8")) for piece in pieces)
+        self.created = time.monotonic()
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.created
+
+
+class ResponseCache:
+    """
+    Finished chat answers, replayed instead of calling the provider again.
+
+    The exact tier is keyed by (provider, model, API key hash, normalized
+    conversation hash). The semantic tier is opt-in per request: it compares the
+    embedding of the new question with earlier questions that had the same model,
+    API key and history, and reuses the answer of the closest one above `similarity`.
+
+    Entries expire after `ttl` seconds; beyond `max_entries` or `max_bytes` the
+    least recently used answers are dropped first.
+    """
+
+    def __init__(
+        self,
+        ttl: float = RESPONSE_CACHE_TTL,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+        similarity: float = RESPONSE_CACHE_SIMILARITY,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.similarity = similarity
+        self.total_bytes = 0
+        self._entries: "OrderedDict[tuple, CachedResponse]" = OrderedDict()
+        self._stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    @staticmethod
+    def keys(provider: str, model: str, api_key: str | None, conversation: List[Message], web_search: bool) -> tuple[tuple, tuple]:
+        """Exact key for the whole conversation, and semantic scope for everything but the last message"""
+        key_hash = api_key_hash(api_key)
+        exact = (provider, model, key_hash, conversation_hash(conversation, web_search))
+        scope = (provider, model, key_hash, conversation_hash(conversation[:-1], web_search))
+        return exact, scope
+
+    def get(self, key: tuple) -> CachedResponse | None:
+        entry = self._entries.get(key)
+        if entry is not None and entry.age >= self.ttl:
+            self._stats["expired"] += 1
+            self._remove(key)
+            entry = None
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def lookup(self, key: tuple, scope: tuple, query_embedding=None) -> tuple[CachedResponse | None, str | None]:
+        """Return the cached answer and the tier it came from ("exact" or "semantic")"""
+        if not self.enabled:
+            return None, None
+
+        entry = self.get(key)
+        if entry is not None:
+            self._stats["exact_hits"] += 1
+            return entry, "exact"
+
+        if query_embedding is not None:
+            best_key, best_score = None, self.similarity
+            query = unit_vector(query_embedding)
+            for other_key, other in self._entries.items():
+                if other.scope != scope or other.embedding is None:
+                    continue
+                score = float(other.embedding @ query)
+                if score >= best_score:
+                    best_key, best_score = other_key, score
+            if best_key is not None:
+                entry = self.get(best_key)
+                if entry is not None:
+                    self._stats["semantic_hits"] += 1
+                    return entry, "semantic"
+
+        self._stats["misses"] += 1
+        return None, None
+
+    def put(self, key: tuple, scope: tuple, pieces: List[str], sources: List[str], query_embedding=None):
+        if not self.enabled or not pieces:
+            return
+        embedding = unit_vector(query_embedding) if query_embedding is not None else None
+        entry = CachedResponse(list(pieces), list(sources), scope, embedding)
+        if entry.size > self.max_bytes:
+            return
+
+        self._remove(key)
+        self._entries[key] = entry
+        self.total_bytes += entry.size
+        self._stats["stores"] += 1
+
+        while self._entries and (len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats["evictions"] += 1
+
+    def _remove(self, key: tuple):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+
+    def stats(self) -> dict:
+        hits = self._stats["exact_hits"] + self._stats["semantic_hits"]
+        lookups = hits + self._stats["misses"]
+        return {
+            **self._stats,
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache()
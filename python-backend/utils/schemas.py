@@ -1,9 +1,10 @@
 import sys
 sys.dont_write_bytecode = True
 
-from fastapi import FastAPI
+import asyncio
 from pydantic import BaseModel
-from typing import List
+from utils.metrics import RequestTimings
+from typing import List, Optional, Set
 
 
 class ModelInfo(BaseModel):
@@ -19,6 +20,10 @@ class ChatRequest(BaseModel):
     conversation: List[Message]
     model: ModelInfo
     web_search: bool = False
+    search_time_budget: Optional[float] = None  # seconds, server default when unset
+    semantic_cache: bool = False  # also reuse cached answers to similar questions
+    timings: bool = False  # end the stream with a per-stage timing event
+    session_id: Optional[str] = None  # ties the chat to the /api/search/prefetch calls of the same input box
 
 class SourcePath(BaseModel):
     path: str
@@ -38,10 +43,52 @@ class ModelRequest(BaseModel):
 class ModelResponse(BaseModel):
     data: List[ModelID]
 
+class WarmupRequest(BaseModel):
+    components: List[str] = ["all"]  # "search", provider names, or "all"
+
+class SearchPrefetchRequest(BaseModel):
+    prompt: str  # the draft as typed so far
+    session_id: Optional[str] = None  # a newer draft from the same session replaces the older prefetch
+    search_time_budget: Optional[float] = None
+
 class RequestState:
-    def __init__(self, request_id: int, app: FastAPI):
+    """Lifecycle of one /api/chat call, cancelled on client disconnect or explicit cancel"""
+
+    def __init__(self, request_id: str, registry=None):
         self.request_id = request_id
-        self.app = app
+        self.registry = registry
+        self.cancelled = asyncio.Event()
+        self.cancel_reason: Optional[str] = None
+        self.sources: List[str] = []
+        # Text pieces streamed to the client, complete once the provider finished without error
+        self.response: List[str] = []
+        self.completed = False
+        self.timings = RequestTimings()
+        self._tasks: Set[asyncio.Task] = set()
 
     def is_disconnected(self) -> bool:
-        return not hasattr(self.app.state, 'active_requests') or self.request_id not in self.app.state.active_requests
\ No newline at end of file
+        return self.cancelled.is_set()
+
+    def track(self, task: asyncio.Task) -> asyncio.Task:
+        """Cancel `task` together with the request, right away if it is already cancelled"""
+        if self.cancelled.is_set():
+            task.cancel()
+            return task
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def cancel(self, reason: str):
+        if self.cancelled.is_set():
+            return
+        self.cancel_reason = reason
+        self.cancelled.set()
+        for task in list(self._tasks):
+            task.cancel()
+
+    def finish(self):
+        """Stop background work of the request and drop it from the registry"""
+        for task in list(self._tasks):
+            task.cancel()
+        if self.registry is not None:
+            self.registry.release(self.request_id)
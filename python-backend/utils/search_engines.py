@@ -0,0 +1,190 @@
+import sys
+sys.dont_write_bytecode = True
+
+import asyncio
+import functools
+import os
+import time
+from typing import Callable
+from urllib.parse import urlsplit
+
+# Seconds to wait on the preferred engine before the next one is started as well, 0 starts all at once
+SEARCH_HEDGE_DELAY = float(os.environ.get("SEARCH_HEDGE_DELAY", "1.0"))
+# Once one engine answered, seconds the engines still running get to add their results
+SEARCH_MERGE_WAIT = float(os.environ.get("SEARCH_MERGE_WAIT", "0.3"))
+# Seconds an engine that just failed (e.g. rate limited) is skipped
+SEARCH_ENGINE_COOLDOWN = float(os.environ.get("SEARCH_ENGINE_COOLDOWN", "120"))
+# Weight of the newest sample in the moving latency average
+LATENCY_SMOOTHING = 0.3
+# Reciprocal rank fusion constant, larger values flatten the rank differences
+RRF_K = 60
+
+
+def url_identity(url: str) -> str:
+    """Scheme, www., fragment and trailing slash do not make a different page"""
+    parts = urlsplit(url)
+    host = parts.netloc.lower().removeprefix("www.")
+    path = parts.path.rstrip("/")
+    query = f"?{parts.query}" if parts.query else ""
+    return f"{host}{path}{query}"
+
+
+def normalize_query(search_term: str) -> str:
+    # Case, spacing and -site: exclusions do not change which pages we want
+    terms = [term for term in search_term.lower().split() if not term.startswith("-site:")]
+    return " ".join(terms)
+
+
+def is_discarded(url: str, discard_domains: list[str]) -> bool:
+    host = urlsplit(url).netloc.lower()
+    return any(host == domain or host.endswith(f".{domain}") for domain in discard_domains)
+
+
+class SearchEngine:
+    """A blocking search function with its latency and error history"""
+
+    def __init__(self, name: str, search: Callable[..., list[str]]):
+        self.name = name
+        self.search = search
+        self.latency: float | None = None
+        self.failed_at: float | None = None
+        self._stats = {"calls": 0, "errors": 0, "wins": 0, "cancelled": 0}
+
+    def cooling_down(self) -> bool:
+        return self.failed_at is not None and time.monotonic() - self.failed_at < SEARCH_ENGINE_COOLDOWN
+
+    def expected_cost(self) -> float:
+        """Moving average latency scaled up by the error rate, unknown engines cost nothing"""
+        if self.latency is None:
+            return 0.0
+        success_rate = 1 - self._stats["errors"] / self._stats["calls"] if self._stats["calls"] else 1.0
+        return self.latency / max(success_rate, 0.05)
+
+    async def run(self, search_term: str, num_results: int) -> list[str]:
+        self._stats["calls"] += 1
+        started = time.perf_counter()
+        call = asyncio.get_running_loop().run_in_executor(None, functools.partial(self.search, search_term=search_term, num_results=num_results))
+        try:
+            urls = await asyncio.shield(call)
+        except asyncio.CancelledError:
+            # Lost the race, but the call still finishes in its thread: only a
+            # completed call is a latency sample, the time so far would bias it low
+            self._stats["cancelled"] += 1
+            call.add_done_callback(lambda call: self._finished_late(call, started))
+            raise
+        except Exception:
+            self._stats["errors"] += 1
+            self.failed_at = time.monotonic()
+            raise
+        self.failed_at = None
+        self.record_latency(time.perf_counter() - started)
+        return urls or []
+
+    def _finished_late(self, call: asyncio.Future, started: float):
+        if not call.cancelled() and call.exception() is None:
+            self.record_latency(time.perf_counter() - started)
+
+    def record_latency(self, elapsed: float):
+        self.latency = elapsed if self.latency is None else (1 - LATENCY_SMOOTHING) * self.latency + LATENCY_SMOOTHING * elapsed
+
+    def stats(self) -> dict:
+        return {**self._stats, "latency": self.latency, "cooling_down": self.cooling_down()}
+
+
+class HedgedSearch:
+    """
+    Fan a query out over several search engines.
+
+    Engines are tried cheapest first by their expected cost (moving average
+    latency over success rate); engines that failed recently are left for last.
+    The next engine starts when the previous one fails or after `hedge_delay`
+    seconds without an answer. After the first answer, engines still running get
+    `merge_wait` seconds more, then the result lists are merged by reciprocal
+    rank, deduplicated and stripped of discarded domains.
+    """
+
+    def __init__(self, engines: list[SearchEngine], hedge_delay: float = SEARCH_HEDGE_DELAY, merge_wait: float = SEARCH_MERGE_WAIT):
+        self.engines = engines
+        self.hedge_delay = hedge_delay
+        self.merge_wait = merge_wait
+        self._stats = {"searches": 0, "hedged": 0, "failed": 0}
+
+    def ranked_engines(self) -> list[SearchEngine]:
+        return sorted(self.engines, key=lambda engine: (engine.cooling_down(), engine.expected_cost()))
+
+    async def search(self, search_term: str, num_results: int, discard_domains: list[str] = ()) -> list[str] | None:
+        self._stats["searches"] += 1
+        loop = asyncio.get_running_loop()
+        waiting = self.ranked_engines()
+        running: dict[asyncio.Task, SearchEngine] = {}
+        results: dict[str, list[str]] = {}
+        merge_deadline = None
+
+        def start_next():
+            engine = waiting.pop(0)
+            if running or results:
+                self._stats["hedged"] += 1
+            running[asyncio.create_task(engine.run(search_term, num_results))] = engine
+
+        start_next()
+        try:
+            while running:
+                if merge_deadline is not None:
+                    timeout = max(0.0, merge_deadline - loop.time())
+                elif waiting:
+                    timeout = self.hedge_delay
+                else:
+                    timeout = None
+
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    if merge_deadline is not None:
+                        break
+                    # Preferred engine is slow, hedge with the next one
+                    start_next()
+                    continue
+
+                for task in done:
+                    engine = running.pop(task)
+                    try:
+                        urls = task.result()
+                    except Exception as e:
+                        print(f"Search engine {engine.name} failed: {e}")
+                        urls = None
+                    if urls:
+                        if not results:
+                            engine._stats["wins"] += 1
+                        results[engine.name] = urls
+                    elif waiting and not results:
+                        # No answer from this engine, fall back without waiting for the hedge delay
+                        start_next()
+
+                if results and merge_deadline is None:
+                    merge_deadline = loop.time() + self.merge_wait
+        finally:
+            for task in running:
+                task.cancel()
+
+        if not results:
+            self._stats["failed"] += 1
+            return None
+        return self.merge(results, discard_domains)[:num_results]
+
+    @staticmethod
+    def merge(results: dict[str, list[str]], discard_domains: list[str] = ()) -> list[str]:
+        """Reciprocal rank fusion of the engines' lists, one URL per page"""
+        scores: dict[str, float] = {}
+        first_seen: dict[str, str] = {}
+        for urls in results.values():
+            for rank, url in enumerate(urls):
+                if is_discarded(url, discard_domains):
+                    continue
+                identity = url_identity(url)
+                first_seen.setdefault(identity, url)
+                scores[identity] = scores.get(identity, 0.0) + 1.0 / (RRF_K + rank + 1)
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        return [first_seen[identity] for identity in ranked]
+
+    def stats(self) -> dict:
+        return {**self._stats, "engines": {engine.name: engine.stats() for engine in self.engines}}
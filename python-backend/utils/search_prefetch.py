@@ -0,0 +1,214 @@
+import sys
+sys.dont_write_bytecode = True
+
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from utils.metrics import search_prefetch_saved_seconds
+from utils.search_engines import normalize_query
+
+# Seconds a finished prefetch stays usable, and an unclaimed one may keep running
+SEARCH_PREFETCH_TTL = float(os.environ.get("SEARCH_PREFETCH_TTL", "120"))
+SEARCH_PREFETCH_MAX_ENTRIES = int(os.environ.get("SEARCH_PREFETCH_MAX_ENTRIES", "32"))
+# Unclaimed prefetches running at once; starting another cancels the oldest
+SEARCH_PREFETCH_MAX_RUNNING = int(os.environ.get("SEARCH_PREFETCH_MAX_RUNNING", "2"))
+# Share of common terms (Jaccard) at which a prefetched query answers the final one
+SEARCH_PREFETCH_SIMILARITY = float(os.environ.get("SEARCH_PREFETCH_SIMILARITY", "0.7"))
+# Drafts shorter than this are not worth a search
+SEARCH_PREFETCH_MIN_CHARS = int(os.environ.get("SEARCH_PREFETCH_MIN_CHARS", "12"))
+
+WORD_PATTERN = re.compile(r"\w+")
+
+SearchFn = Callable[[str], Awaitable[tuple[str, list[str]] | None]]
+
+
+def query_terms(query: str) -> frozenset[str]:
+    return frozenset(WORD_PATTERN.findall(query))
+
+
+def similarity(a: frozenset[str], b: frozenset[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class PrefetchEntry:
+    def __init__(self, key: str, session_id: str | None, task: asyncio.Task):
+        self.key = key
+        self.terms = query_terms(key)
+        self.session_id = session_id
+        self.task = task
+        self.started = time.monotonic()
+        self.finished: float | None = None
+        self.claims = 0
+
+    def head_start(self) -> float:
+        """Search time a chat claiming this entry now no longer waits for"""
+        return (self.finished or time.monotonic()) - self.started
+
+
+class SearchPrefetcher:
+    """
+    Web searches started from the draft prompt while the user is still typing.
+
+    Prefetches are keyed by the normalized query. /api/chat claims the entry
+    with the same key, or failing that the most similar one above
+    `min_similarity`, and waits for it instead of starting its own search. A
+    newer draft from the same session cancels the session's previous unclaimed
+    prefetch, at most `max_running` unclaimed prefetches run at once, and
+    unclaimed ones still running after `ttl` seconds are cancelled.
+    """
+
+    def __init__(
+        self,
+        ttl: float = SEARCH_PREFETCH_TTL,
+        max_entries: int = SEARCH_PREFETCH_MAX_ENTRIES,
+        max_running: int = SEARCH_PREFETCH_MAX_RUNNING,
+        min_similarity: float = SEARCH_PREFETCH_SIMILARITY,
+        min_chars: int = SEARCH_PREFETCH_MIN_CHARS,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_running = max_running
+        self.min_similarity = min_similarity
+        self.min_chars = min_chars
+        self._entries: "OrderedDict[str, PrefetchEntry]" = OrderedDict()
+        self._stats = {
+            "started": 0,
+            "reused": 0,
+            "abandoned": 0,
+            "expired": 0,
+            "failed": 0,
+            "hits": 0,
+            "similar_hits": 0,
+            "misses": 0,
+            "saved_seconds": 0.0,
+        }
+
+    def _cancel(self, entry: PrefetchEntry, reason: str):
+        self._entries.pop(entry.key, None)
+        if not entry.task.done():
+            entry.task.cancel()
+            self._stats[reason] += 1
+
+    def _sweep(self):
+        now = time.monotonic()
+        for entry in list(self._entries.values()):
+            if entry.finished is not None and now - entry.finished > self.ttl:
+                self._entries.pop(entry.key, None)
+            elif entry.finished is None and not entry.claims and now - entry.started > self.ttl:
+                self._cancel(entry, "expired")
+
+    def _abandon_session(self, session_id: str | None, keep: PrefetchEntry | None = None):
+        """Cancel the session's unclaimed prefetches other than `keep`, the user has moved on"""
+        if session_id is None:
+            return
+        for entry in list(self._entries.values()):
+            if entry.session_id == session_id and entry is not keep and not entry.claims and entry.finished is None:
+                self._cancel(entry, "abandoned")
+
+    def _finish(self, entry: PrefetchEntry, task: asyncio.Task):
+        entry.finished = time.monotonic()
+        if task.cancelled():
+            return
+        if task.exception() is not None or task.result() is None:
+            # A failed search is not worth reusing, the chat searches itself
+            self._stats["failed"] += 1
+            if self._entries.get(entry.key) is entry:
+                del self._entries[entry.key]
+
+    def start(self, prompt: str, search: SearchFn, session_id: str | None = None) -> dict:
+        """Start a speculative search for `prompt` unless one for the same query exists"""
+        self._sweep()
+        key = normalize_query(prompt)
+        if len(key) < self.min_chars:
+            return {"status": "skipped", "query": key}
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._stats["reused"] += 1
+            self._entries.move_to_end(key)
+            self._abandon_session(session_id, keep=entry)
+            return {"status": "ready" if entry.finished is not None else "running", "query": key}
+
+        self._abandon_session(session_id)
+        running = [other for other in self._entries.values() if other.finished is None and not other.claims]
+        for other in running[:max(0, len(running) - self.max_running + 1)]:
+            self._cancel(other, "abandoned")
+
+        entry = PrefetchEntry(key, session_id, asyncio.create_task(search(prompt)))
+        entry.task.add_done_callback(lambda task: self._finish(entry, task))
+        self._entries[key] = entry
+        self._stats["started"] += 1
+        evictable = [other for other in self._entries.values() if other.finished is not None or not other.claims]
+        for other in evictable[:max(0, len(self._entries) - self.max_entries)]:
+            self._cancel(other, "abandoned")
+        return {"status": "started", "query": key}
+
+    def match(self, prompt: str) -> PrefetchEntry | None:
+        """The prefetch for the same query, or the most similar one above the threshold"""
+        key = normalize_query(prompt)
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry
+
+        terms = query_terms(key)
+        best, best_similarity = None, self.min_similarity
+        for candidate in self._entries.values():
+            score = similarity(terms, candidate.terms)
+            if score >= best_similarity:
+                best, best_similarity = candidate, score
+        return best
+
+    async def take(self, prompt: str, session_id: str | None = None) -> tuple[str, list[str]] | None:
+        """
+        (context, sources) of a matching prefetch, waiting for it if it is still
+        running; None when there is none or it failed, and the caller searches itself.
+        """
+        self._sweep()
+        entry = self.match(prompt)
+        self._abandon_session(session_id, keep=entry)
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+
+        entry.claims += 1
+        head_start = entry.head_start()
+        try:
+            # Shielded, other chats may claim the same prefetch
+            result = await asyncio.shield(entry.task)
+        except asyncio.CancelledError:
+            if entry.task.cancelled() and not asyncio.current_task().cancelling():
+                # The prefetch itself was cancelled (server shutting down), not this chat
+                self._stats["misses"] += 1
+                return None
+            raise
+        except Exception:
+            result = None
+
+        if result is None:
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits" if entry.key == normalize_query(prompt) else "similar_hits"] += 1
+        self._stats["saved_seconds"] += head_start
+        search_prefetch_saved_seconds.observe(head_start)
+        return result
+
+    def cancel_all(self):
+        for entry in list(self._entries.values()):
+            self._cancel(entry, "abandoned")
+
+    def stats(self) -> dict:
+        hits = self._stats["hits"] + self._stats["similar_hits"]
+        claims = hits + self._stats["misses"]
+        return {
+            **self._stats,
+            "entries": len(self._entries),
+            "running": sum(entry.finished is None for entry in self._entries.values()),
+            "hit_rate": hits / claims if claims else 0.0,
+        }
+
+
+search_prefetcher = SearchPrefetcher()
@@ -0,0 +1,163 @@
+import sys
+sys.dont_write_bytecode = True
+
+import asyncio
+import contextvars
+import importlib
+import os
+import time
+
+SEARCH_WORKERS = int(os.environ.get("SEARCH_WORKERS", "2"))
+SEARCH_TIMEOUT = float(os.environ.get("SEARCH_TIMEOUT", "120"))  # seconds per query
+
+
+class SearchService:
+    """
+    Long-lived web search component owned by the server.
+
+    The search stack (crawl4ai, langchain, torch and the embedding model) and the
+    headless browser are loaded on the first search, or ahead of time through
+    `ready()`, and then kept warm. Queries are put on a queue and picked up by a
+    fixed number of worker tasks, each query bounded by its own timeout.
+    """
+
+    def __init__(self, workers: int = SEARCH_WORKERS, timeout: float = SEARCH_TIMEOUT):
+        self.num_workers = workers
+        self.timeout = timeout
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.workers: list[asyncio.Task] = []
+        self.crawler = None
+        self._warmup: asyncio.Task | None = None
+
+    async def start(self):
+        """Start the workers, the search stack itself is loaded on first use"""
+        if self.workers:
+            return
+        self.workers = [asyncio.create_task(self._worker(i)) for i in range(self.num_workers)]
+        print(f"Started web search service with {self.num_workers} worker(s)")
+
+    @staticmethod
+    async def load_module():
+        """Import the search stack off the event loop"""
+        return await asyncio.to_thread(importlib.import_module, "utils.C4AI_web_search")
+
+    async def embedding_batcher(self):
+        """The shared embedding batcher, without starting the browser"""
+        module = await self.load_module()
+        return await asyncio.to_thread(module.get_embedding_batcher)
+
+    async def _load(self):
+        started = time.perf_counter()
+        module = await self.load_module()
+        await asyncio.to_thread(module.get_embedding_batcher)
+
+        try:
+            crawler = module.AsyncWebCrawler(config=module.get_browser_config())
+            await crawler.start()
+            self.crawler = crawler
+        except Exception as e:
+            # Searches still work, each one launching its own browser
+            print(f"Error starting search browser: {e}", file=sys.stderr)
+        print(f"Web search stack ready in {time.perf_counter() - started:.2f}s")
+
+    async def ready(self):
+        """Load the search stack and browser if that has not happened yet"""
+        if not self.workers:
+            await self.start()
+        if self._warmup is None or self._warmup.cancelled() or (self._warmup.done() and self._warmup.exception()):
+            self._warmup = asyncio.create_task(self._load())
+        # Shielded so a caller giving up does not abort the shared load
+        await asyncio.shield(self._warmup)
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+        if self._warmup is not None and not self._warmup.done():
+            self._warmup.cancel()
+        if self.crawler is not None:
+            try:
+                await self.crawler.close()
+            except Exception as e:
+                print(f"Error closing search browser: {e}", file=sys.stderr)
+            self.crawler = None
+
+        if "utils.C4AI_web_search" in sys.modules:
+            from utils.C4AI_web_search import get_embedding_batcher, get_embedding_cache, get_page_cache, get_page_fetcher
+            if get_embedding_batcher.cache_info().currsize:
+                await get_embedding_batcher().stop()
+            await asyncio.to_thread(get_embedding_cache().save)
+            if get_page_cache.cache_info().currsize:
+                await get_page_cache().aclose()
+            if get_page_fetcher.cache_info().currsize:
+                await get_page_fetcher().aclose()
+        print("Stopped web search service")
+
+    def stats(self) -> dict:
+        stats = {"workers": len(self.workers), "queued": self.queue.qsize()}
+        if "utils.C4AI_web_search" in sys.modules:
+            from utils.C4AI_web_search import get_embedding_batcher, get_embedding_cache, get_page_cache, get_page_fetcher, get_search_engines, get_url_cache
+            stats["url_cache"] = get_url_cache().stats()
+            stats["search_engines"] = get_search_engines().stats()
+            stats["page_cache"] = get_page_cache().stats()
+            stats["fetch_tiers"] = get_page_fetcher().stats()
+            stats["embedding_cache"] = get_embedding_cache().stats()
+            if get_embedding_batcher.cache_info().currsize:
+                stats["embedding_batcher"] = get_embedding_batcher().stats()
+        return stats
+
+    async def search(self, prompt: str, timeout: float | None = None, time_budget: float | None = None) -> tuple[str, list[str]] | None:
+        """Queue a web search and wait for its (context, sources), None if it failed or timed out"""
+        if not self.workers:
+            await self.start()
+
+        future = asyncio.get_running_loop().create_future()
+        # The search runs in the caller's context so its spans land in the caller's request timings
+        context = contextvars.copy_context()
+        await self.queue.put((prompt, timeout or self.timeout, time_budget, context, future))
+        return await future
+
+    async def _worker(self, worker_id: int):
+        while True:
+            prompt, timeout, time_budget, context, future = await self.queue.get()
+            try:
+                if future.done():
+                    # The caller went away while the query was queued
+                    continue
+
+                await self.ready()
+                from utils.C4AI_web_search import web_search
+
+                task = asyncio.create_task(web_search(prompt, crawler=self.crawler, time_budget=time_budget), context=context)
+                # Abort the search if the caller stops waiting for it
+                future.add_done_callback(lambda f: task.cancel() if f.cancelled() else None)
+
+                started = time.perf_counter()
+                try:
+                    result = await asyncio.wait_for(task, timeout=timeout)
+                except asyncio.TimeoutError:
+                    print(f"Error: Web search timed out after {timeout} seconds.", file=sys.stderr)
+                    result = None
+                except asyncio.CancelledError:
+                    if not future.cancelled():
+                        raise
+                    result = None
+                print(f"Worker {worker_id} finished web search in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+
+                if not future.done():
+                    future.set_result(result)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                print(f"An unexpected error occurred during web search: {e}", file=sys.stderr)
+                if not future.done():
+                    future.set_result(None)
+            finally:
+                self.queue.task_done()
+
+
+search_service = SearchService()
@@ -0,0 +1,109 @@
+import sys
+sys.dont_write_bytecode = True
+
+import asyncio
+import json
+import os
+from typing import AsyncIterator
+
+# Deltas arriving closer together than this are batched into a single SSE frame
+SSE_FLUSH_INTERVAL = float(os.environ.get("SSE_FLUSH_INTERVAL_MS", "30")) / 1000
+# A batch is flushed as soon as it reaches this many bytes, whatever the interval
+SSE_MAX_CHUNK_BYTES = int(os.environ.get("SSE_MAX_CHUNK_BYTES", "2048"))
+
+async def format_chunk(content: str, model: str) -> str:
+    """Format a chunk for SSE streaming"""
+    data = {
+        "content": content,
+        "model": model
+    }
+    return f"data: {json.dumps(data)}\n\n"
+
+def format_event(model: str, **fields) -> str:
+    """Format a metadata event; the empty content keeps it harmless to the chat UI"""
+    data = {
+        "content": "",
+        "model": model,
+        **fields
+    }
+    return f"data: {json.dumps(data)}\n\n"
+
+def format_error(error: str, **fields) -> str:
+    """Format an error for SSE streaming"""
+    return f"data: {json.dumps({'error': error, **fields})}\n\n"
+
+async def coalesce_deltas(
+    deltas: AsyncIterator[str],
+    flush_interval: float = SSE_FLUSH_INTERVAL,
+    max_bytes: int = SSE_MAX_CHUNK_BYTES,
+    stop: asyncio.Event | None = None,
+) -> AsyncIterator[str]:
+    """
+    Merge text deltas from a provider stream into larger pieces.
+
+    A delta that arrives after a quiet period of at least `flush_interval` is
+    passed through straight away, so slow streams and the first token are never
+    delayed. Deltas that arrive faster than that are buffered and flushed together
+    once the interval has elapsed since the last flush or the buffer reaches
+    `max_bytes`.
+
+    Setting `stop` ends the stream at once, cancelling the pending read from the
+    provider instead of waiting for its next delta.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = deltas.__aiter__()
+    pending = None
+    buffer = []
+    buffered_bytes = 0
+    last_flush = loop.time() - flush_interval
+    stopped = asyncio.ensure_future(stop.wait()) if stop is not None else None
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+
+            timeout = None
+            if buffer:
+                timeout = max(0.0, last_flush + flush_interval - loop.time())
+
+            waiters = {pending} if stopped is None else {pending, stopped}
+            done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            if stopped is not None and stopped.done():
+                return
+
+            if not done:
+                # Flush interval elapsed while waiting for the next delta
+                yield "".join(buffer)
+                buffer, buffered_bytes = [], 0
+                last_flush = loop.time()
+                continue
+
+            try:
+                delta = pending.result()
+            except StopAsyncIteration:
+                pending = None
+                break
+            pending = None
+
+            if not delta:
+                continue
+
+            buffer.append(delta)
+            buffered_bytes += len(delta.encode("utf-8"))
+
+            now = loop.time()
+            if buffered_bytes >= max_bytes or now - last_flush >= flush_interval:
+                yield "".join(buffer)
+                buffer, buffered_bytes = [], 0
+                last_flush = now
+
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        if stopped is not None and not stopped.done():
+            stopped.cancel()
@@ -0,0 +1,114 @@
+import sys
+sys.dont_write_bytecode = True
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class CacheEntry:
+    def __init__(self, value: Any = None, error: BaseException | None = None):
+        self.value = value
+        self.error = error
+        self.created = time.monotonic()
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.created
+
+
+class AsyncTTLCache:
+    """
+    Async get-or-load cache with TTL, stale-while-revalidate and single-flight loads.
+
+    - A value younger than `ttl` is returned as is.
+    - A value older than `ttl` but younger than `ttl + stale_ttl` is returned
+      immediately while one background task refreshes it.
+    - Otherwise the caller waits for the loader. Concurrent callers for the same
+      key share a single in-flight load instead of each calling upstream.
+    - With `negative_ttl` set, a failed load is remembered and re-raised for that
+      long so a broken upstream is not retried on every request.
+
+    At most `max_entries` keys are kept, least recently used first out.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float = 0.0, negative_ttl: float = 0.0, max_entries: int = 256):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self._stats = {"hits": 0, "stale_hits": 0, "negative_hits": 0, "misses": 0, "loads": 0, "load_errors": 0}
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+
+            if entry.error is not None:
+                if entry.age < self.negative_ttl:
+                    self._stats["negative_hits"] += 1
+                    raise entry.error
+            elif entry.age < self.ttl:
+                self._stats["hits"] += 1
+                return entry.value
+            elif entry.age < self.ttl + self.stale_ttl:
+                self._stats["stale_hits"] += 1
+                self._load(key, loader)
+                return entry.value
+
+        self._stats["misses"] += 1
+        return await asyncio.shield(self._load(key, loader))
+
+    def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """Start loading `key` unless a load is already running, return the shared future"""
+        future = self._inflight.get(key)
+        if future is not None:
+            return future
+
+        async def run():
+            self._stats["loads"] += 1
+            try:
+                value = await loader()
+            except Exception as e:
+                self._stats["load_errors"] += 1
+                if self.negative_ttl > 0:
+                    self._store(key, CacheEntry(error=e))
+                raise
+            else:
+                self._store(key, CacheEntry(value=value))
+                return value
+            finally:
+                self._inflight.pop(key, None)
+
+        future = asyncio.ensure_future(run())
+        # Background refreshes may fail with nobody awaiting them
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        return future
+
+    def _store(self, key: Hashable, entry: CacheEntry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def peek(self, key: Hashable) -> Any:
+        """Return the cached value for `key` regardless of age, None if absent"""
+        entry = self._entries.get(key)
+        return entry.value if entry is not None and entry.error is None else None
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        lookups = self._stats["hits"] + self._stats["stale_hits"] + self._stats["negative_hits"] + self._stats["misses"]
+        served = self._stats["hits"] + self._stats["stale_hits"] + self._stats["negative_hits"]
+        return {
+            **self._stats,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hit_rate": served / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,76 @@
+import sys
+sys.dont_write_bytecode = True
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+class VectorIndex:
+    """
+    Memory-only similarity index for the chunks of a single web search.
+
+    Embeddings are L2-normalized on insert so a query is scored against every
+    chunk with one matrix-vector product, and the top k are picked with
+    argpartition instead of a full sort. Each request builds its own index, so
+    concurrent searches never share state.
+    """
+
+    def __init__(self):
+        self.documents: list[Document] = []
+        self._blocks: list[np.ndarray] = []
+        self._matrix: np.ndarray | None = None
+
+    def __len__(self):
+        return len(self.documents)
+
+    @staticmethod
+    def normalize(vectors) -> np.ndarray:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix[np.newaxis, :]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def add(self, documents: list[Document], embeddings):
+        if not documents:
+            return
+        if len(documents) != len(embeddings):
+            raise ValueError("Each document needs exactly one embedding")
+
+        self._blocks.append(self.normalize(embeddings))
+        self.documents.extend(documents)
+        self._matrix = None
+
+    @property
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            self._matrix = np.vstack(self._blocks) if self._blocks else np.empty((0, 0), dtype=np.float32)
+            self._blocks = [self._matrix] if self._blocks else []
+        return self._matrix
+
+    def vectors(self, documents: list[Document]) -> np.ndarray:
+        """Normalized embeddings of indexed `documents`, in the order given"""
+        rows = {id(document): i for i, document in enumerate(self.documents)}
+        return self.matrix[[rows[id(document)] for document in documents]]
+
+    def scores(self, query_embedding) -> np.ndarray:
+        """Cosine similarity of the query against every indexed chunk"""
+        if not self.documents:
+            return np.empty(0, dtype=np.float32)
+        return self.matrix @ self.normalize(query_embedding)[0]
+
+    def search(self, query_embedding, k: int = 5) -> list[tuple[Document, float]]:
+        """Return the k most similar chunks with their cosine similarity, best first"""
+        scores = self.scores(query_embedding)
+        if scores.size == 0 or k <= 0:
+            return []
+
+        k = min(k, scores.size)
+        if k < scores.size:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(scores.size)
+        top = top[np.argsort(-scores[top])]
+
+        return [(self.documents[i], float(scores[i])) for i in top]
@@ -0,0 +1,43 @@
+import sys
+sys.dont_write_bytecode = True
+
+import asyncio
+import importlib
+import os
+import time
+
+from utils.query_func import PROVIDER_MODULES
+from utils.search_service import search_service
+
+WARMUP_COMPONENTS = ("search", *PROVIDER_MODULES)
+# Components loaded in the background right after startup, e.g. PRELOAD="search,ollama" or "all"
+PRELOAD = os.environ.get("PRELOAD", "")
+
+
+def parse_components(components: list[str]) -> list[str]:
+    """Expand "all" and reject unknown names"""
+    names = []
+    for component in components:
+        component = component.strip().lower()
+        if not component:
+            continue
+        if component == "all":
+            names.extend(WARMUP_COMPONENTS)
+        elif component in WARMUP_COMPONENTS:
+            names.append(component)
+        else:
+            raise ValueError(f"Unknown component: {component} (expected one of {', '.join(WARMUP_COMPONENTS)}, all)")
+    return list(dict.fromkeys(names))
+
+
+async def warm_up(components: list[str]) -> dict[str, float]:
+    """Load the given components now instead of on first use, returning seconds spent on each"""
+    timings = {}
+    for component in parse_components(components):
+        started = time.perf_counter()
+        if component == "search":
+            await search_service.ready()
+        else:
+            await asyncio.to_thread(importlib.import_module, PROVIDER_MODULES[component])
+        timings[component] = round(time.perf_counter() - started, 3)
+    return timings